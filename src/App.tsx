@@ -15,6 +15,7 @@ function App() {
   const [userRole, setUserRole] = useState('');
   const [tiquetes, setTiquetes] = useState<TiquetesDocumentos[]>([]);
   const [filteredTiquetes, setFilteredTiquetes] = useState<TiquetesDocumentos[]>([]);
+  const [resultadosServidor, setResultadosServidor] = useState<TiquetesDocumentos[]>([]);
   const [notifications] = useState<Notification[]>([]);
   const [loading, setLoading] = useState(true);
   const [filters, setFilters] = useState<FilterState>({
@@ -37,6 +38,11 @@ function App() {
       setIsAuthenticated(true);
       setCurrentUser(savedUser);
       setUserRole(savedRole || '');
+      kontrolApi.verifySession(savedUser)
+        .then((sesion) => {
+          if (!sesion.valid) handleLogout();
+        })
+        .catch((error) => console.error('Error verificando sesión:', error));
     } else {
       setLoading(false);
     }
@@ -50,7 +56,25 @@ function App() {
 
   useEffect(() => {
     aplicarFiltros();
-  }, [tiquetes, filters]);
+  }, [tiquetes, filters, resultadosServidor]);
+
+  // Búsqueda en el índice del servidor para encontrar tiquetes fuera de los cargados
+  useEffect(() => {
+    const termino = filters.busqueda.trim();
+    if (!isAuthenticated || termino.length < 3) {
+      setResultadosServidor([]);
+      return;
+    }
+    const timer = setTimeout(() => {
+      kontrolApi.buscarTiquetes(termino, 50)
+        .then((response) => setResultadosServidor(response.tiquetes || []))
+        .catch((error) => {
+          console.error('Error en búsqueda del servidor:', error);
+          setResultadosServidor([]);
+        });
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [filters.busqueda, isAuthenticated]);
 
   const handleLogin = (correo: string, role: string) => {
     setIsAuthenticated(true);
@@ -61,6 +85,7 @@ function App() {
   };
 
   const handleLogout = () => {
+    kontrolApi.logout();
     setIsAuthenticated(false);
     setCurrentUser('');
     setUserRole('');
@@ -73,24 +98,19 @@ function App() {
   const cargarDatosIniciales = async () => {
     setLoading(true);
     try {
+      // El API ya devuelve un registro por tiquete con sus tramos IDA/REG
       const response = await kontrolApi.getTiquetesDocumentos({
         limit: 1000,
-        tipo_vuelo: filters.tipo_vuelo
+        tipo_vuelo: filters.tipo_vuelo,
+        unificado: true
       });
-      console.log('📊 Respuesta completa del API:', response);
+      console.log('📊 Total tiquetes recibidos:', response.total);
 
-      const tiquetesUnicos = response.tiquetes?.reduce((acc: TiquetesDocumentos[], current: TiquetesDocumentos) => {
-        const existe = acc.find(t => t.cd_tiquete === current.cd_tiquete);
-        if (!existe) {
-          acc.push(current);
-        }
-        return acc;
-      }, []) || [];
-
-      console.log('📊 Total tiquetes recibidos:', response.tiquetes?.length);
-      console.log('📊 Tiquetes únicos:', tiquetesUnicos.length);
-
-      setTiquetes(tiquetesUnicos);
+      // En la vista de regreso el estado visible es el del tramo REG, no el de la ida
+      const tiquetesVista = (response.tiquetes || []).map(t =>
+        filters.tipo_vuelo === 'REG' && t.estado_regreso ? { ...t, id_estado: t.estado_regreso } : t
+      );
+      setTiquetes(tiquetesVista);
     } catch (error) {
       console.error('Error cargando datos:', error);
       setTiquetes([]);
@@ -111,6 +131,9 @@ function App() {
         t.ds_records?.toLowerCase().includes(searchLower) ||
         t.ds_itinerario?.toLowerCase().includes(searchLower)
       );
+
+      const encontrados = new Set(filtered.map(t => t.cd_tiquete));
+      filtered = filtered.concat(resultadosServidor.filter(t => !encontrados.has(t.cd_tiquete)));
     }
 
     if (filters.fechaDesde && filters.fechaDesde.trim() !== '') {
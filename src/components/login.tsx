@@ -1,5 +1,6 @@
 import { useState } from 'react';
 import { Plane, Lock, Mail, Eye, EyeOff } from 'lucide-react';
+import kontrolApi from '../services/kontrolApi';
 
 interface LoginProps {
   onLogin: (correo: string, role: string) => void;
@@ -42,6 +43,8 @@ const login: React.FC<LoginProps> = ({ onLogin }) => {
       console.log('Response data:', data);
 
       if (response.ok && data.success) {
+        // Token firmado para validar la sesión sin volver a iniciar sesión
+        kontrolApi.setSessionToken(data.token);
         // Enviar correo y rol
         const userRole = data.user?.rol || 'usuario';
         onLogin(correo, userRole);
@@ -0,0 +1,161 @@
+"""
+Productividad de los asesores en memoria: tiquetes procesados por asesor y por
+hora (según id_hora) y profundidad de la cola a lo largo del día.
+
+Se alimenta de los eventos de escritura del propio worker (PUT .../estado y
+tiquetes nuevos) y se reconcilia periódicamente contra SQL Server, que corrige
+lo que procesaron otros workers o cambió por fuera de la API. Los días se toman
+por fecha de vuelo del tramo, igual que el resto de la API.
+"""
+import threading
+import time
+from collections import Counter
+
+
+def hora_de(id_hora) -> str:
+    """'06:45' o '6:45:10' -> '06'; None si no trae una hora válida"""
+    if not id_hora:
+        return None
+    hora = str(id_hora).strip().split(":")[0]
+    if not hora.isdigit() or int(hora) > 23:
+        return None
+    return f"{int(hora):02d}"
+
+
+class AnaliticaAsesores:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # (cd_tiquete, tipo_vuelo) -> (fecha, asesor, hora); asesor None = pendiente
+        self._tramos = {}
+        # fecha -> Counter{(asesor, hora): procesados}
+        self._procesados = {}
+        # fecha -> tramos del día (pendientes + procesados)
+        self._totales = Counter()
+        self.desde = None
+        self.hasta = None
+        self.reconciliado_en = None
+        self.eventos = 0
+        self.reconciliaciones = 0
+        # Tramos que la última reconciliación encontró distintos a lo que había en memoria
+        self.diferencias = 0
+        # Eventos llegados mientras corre la consulta de reconciliación; se reaplican al reemplazar
+        self._durante_reconciliacion = None
+
+    def _sumar(self, fecha, asesor, hora, signo: int):
+        if asesor is None:
+            return
+        conteo = self._procesados.setdefault(fecha, Counter())
+        conteo[(asesor, hora)] += signo
+        if conteo[(asesor, hora)] <= 0:
+            del conteo[(asesor, hora)]
+
+    def iniciar_reconciliacion(self):
+        """Llamar antes de consultar SQL: lo que llegue desde aquí no se pierde al reemplazar"""
+        with self._lock:
+            self._durante_reconciliacion = []
+
+    def terminar_reconciliacion(self):
+        """Llamar siempre al terminar (también si la consulta falló): deja de acumular eventos"""
+        with self._lock:
+            self._durante_reconciliacion = None
+
+    def reemplazar(self, filas: list, desde, hasta):
+        """filas: [(cd_tiquete, tipo_vuelo, fecha, id_asesor, id_hora)] de la ventana completa"""
+        tramos = {}
+        for cd_tiquete, tipo, fecha, asesor, id_hora in filas:
+            asesor = asesor.strip() if asesor and asesor.strip() else None
+            tramos[(cd_tiquete, tipo)] = (fecha, asesor, hora_de(id_hora) if asesor else None)
+        procesados, totales = {}, Counter()
+        for fecha, asesor, hora in tramos.values():
+            totales[fecha] += 1
+            if asesor is not None:
+                procesados.setdefault(fecha, Counter())[(asesor, hora)] += 1
+
+        with self._lock:
+            if self.reconciliado_en is not None:
+                self.diferencias = sum(
+                    1 for clave, estado in tramos.items()
+                    if clave in self._tramos and self._tramos[clave] != estado
+                )
+            self._tramos, self._procesados, self._totales = tramos, procesados, totales
+            self.desde, self.hasta = desde, hasta
+            self.reconciliado_en = time.time()
+            self.reconciliaciones += 1
+            pendientes, self._durante_reconciliacion = self._durante_reconciliacion or [], None
+            for metodo, argumentos in pendientes:
+                metodo(*argumentos)
+
+    def cubre(self, fecha) -> bool:
+        return self.reconciliado_en is not None and self.desde <= fecha <= self.hasta
+
+    def agregar(self, clave, fecha):
+        """Tramo nuevo (pendiente) dentro de la ventana"""
+        with self._lock:
+            if self._durante_reconciliacion is not None:
+                self._durante_reconciliacion.append((self.agregar, (clave, fecha)))
+            if fecha is None or not self.cubre(fecha) or clave in self._tramos:
+                return
+            self._tramos[clave] = (fecha, None, None)
+            self._totales[fecha] += 1
+            self.eventos += 1
+
+    def procesar(self, clave, asesor: str, id_hora) -> bool:
+        """Tramo marcado como procesado; un reproceso mueve el conteo al asesor y hora nuevos"""
+        with self._lock:
+            if self._durante_reconciliacion is not None:
+                self._durante_reconciliacion.append((self.procesar, (clave, asesor, id_hora)))
+            anterior = self._tramos.get(clave)
+            if anterior is None:
+                return False
+            fecha, asesor_anterior, hora_anterior = anterior
+            hora = hora_de(id_hora)
+            self._sumar(fecha, asesor_anterior, hora_anterior, -1)
+            self._sumar(fecha, asesor, hora, 1)
+            self._tramos[clave] = (fecha, asesor, hora)
+            self.eventos += 1
+            return True
+
+    def reporte(self, fecha) -> dict:
+        """Procesados por asesor y hora, y pendientes al cierre de cada hora del día"""
+        with self._lock:
+            conteo = dict(self._procesados.get(fecha, {}))
+            total = self._totales.get(fecha, 0)
+
+        asesores = {}
+        por_hora = Counter()
+        for (asesor, hora), n in conteo.items():
+            fila = asesores.setdefault(asesor, {"id_asesor": asesor, "procesados": 0, "por_hora": {}})
+            fila["procesados"] += n
+            clave_hora = hora or "sin_hora"
+            fila["por_hora"][clave_hora] = fila["por_hora"].get(clave_hora, 0) + n
+            por_hora[clave_hora] += n
+
+        procesados = sum(por_hora.values())
+        # Los procesados sin hora no se pueden ubicar: la cola arranca ya descontándolos
+        pendientes = total - por_hora.get("sin_hora", 0)
+        cola = []
+        for h in range(24):
+            hora = f"{h:02d}"
+            pendientes -= por_hora.get(hora, 0)
+            cola.append({"hora": hora, "procesados": por_hora.get(hora, 0), "pendientes": pendientes})
+
+        return {
+            "fecha": fecha.isoformat(),
+            "tiquetes": total,
+            "procesados": procesados,
+            "pendientes": total - procesados,
+            "asesores": sorted(asesores.values(), key=lambda a: a["procesados"], reverse=True),
+            "cola": cola,
+        }
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                "tramos": len(self._tramos),
+                "desde": self.desde.isoformat() if self.desde else None,
+                "hasta": self.hasta.isoformat() if self.hasta else None,
+                "reconciliado_en": self.reconciliado_en,
+                "reconciliaciones": self.reconciliaciones,
+                "eventos": self.eventos,
+                "diferencias": self.diferencias,
+            }
@@ -1,23 +1,135 @@
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Header, Depends, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 from typing import Optional
-from datetime import datetime
-import pyodbc
+from datetime import datetime, date, timedelta
+import hmac
+import logging
 import os
-import re
-import xml.etree.ElementTree as ET
-from contextlib import contextmanager
+import threading
+import time
+import uuid
+from contextlib import contextmanager, asynccontextmanager, ExitStack
 from dotenv import load_dotenv
+try:
+    import pyodbc
+except ImportError:
+    # Sin driver ODBC solo se puede usar el backend local (DB_BACKEND=sqlite)
+    pyodbc = None
+from starlette.background import BackgroundTask
+from query_stats import ConexionMedida, SLOW_QUERY_MS, estadisticas as estadisticas_sql
+from logging_config import configurar_logging, request_id_var
+from pnr import (
+    PoolPNR,
+    extraer_aerolinea_pnr,
+    extraer_telefono_pnr,
+    extraer_tiqueteador_pnr,
+    limpiar_nombre_pasajero,
+    normalize_date,
+)
+from tareas import TareaPeriodica
+from escritura_diferida import BufferEscritura
+from proteccion_db import CircuitoDB, LimiteConcurrencia
+import rollup
+import sesiones
+import enriquecimiento
+import archivo
+import captura_trafico
+import reclamos
+import db_local
+import exportacion
+from busqueda import IndiceTrigramas
+from vuelos import IndiceVuelos, fecha_de, normalizar_vuelo
+from analitica import AnaliticaAsesores
+from pool_conexiones import PoolConexiones
+from cache_compartida import CacheCompartida
+from coalescer import Coalescedor
+from conjunto_activo import ConjuntoActivo, ventana_actual
 
 load_dotenv()
+configurar_logging()
+
+logger = logging.getLogger("kontrol.api")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranque y parada de los jobs en segundo plano"""
+    # El calentamiento corre en un hilo: /health responde de inmediato y /ready
+    # devuelve 503 hasta que termine
+    threading.Thread(target=calentar, name="calentamiento", daemon=True).start()
+    tarea_chequeo_db.iniciar()
+    tarea_tiqueteadores.iniciar()
+    if ROLLUP_HABILITADO:
+        tarea_resumen.iniciar()
+    if ARCHIVO_HABILITADO:
+        tarea_archivo.iniciar()
+    if ENRIQUECIMIENTO_HABILITADO:
+        cola_enriquecimiento.iniciar()
+        tarea_escaneo_pnr.iniciar()
+    tarea_indice_busqueda.iniciar()
+    tarea_conjunto_activo.iniciar()
+    tarea_analitica.iniciar()
+    if ATENCION_DIFERIDA_HABILITADA:
+        tarea_atenciones.iniciar()
+    yield
+    # Lo que quede en el buffer se escribe antes de cerrar el pool
+    tarea_atenciones.detener()
+    if len(atenciones_pendientes):
+        tarea_atenciones.ejecutar_ahora()
+    tarea_conjunto_activo.detener()
+    tarea_analitica.detener()
+    tarea_indice_busqueda.detener()
+    tarea_tiqueteadores.detener()
+    tarea_chequeo_db.detener()
+    tarea_resumen.detener()
+    tarea_archivo.detener()
+    tarea_escaneo_pnr.detener()
+    cola_enriquecimiento.detener()
+    pool_pnr.cerrar()
+    pool_conexiones.cerrar()
+    if captura is not None:
+        captura.cerrar()
+
+
+# Listados, estadísticas y catálogos compartidos entre workers; las escrituras
+# invalidan el espacio "tiquetes"
+cache_compartida = CacheCompartida()
+lecturas_en_vuelo = Coalescedor()
+
+
+def lectura_compartida(espacio: str, clave: str, cargar):
+    """
+    Caché compartida + single-flight: en un fallo de caché, las peticiones
+    idénticas simultáneas del mismo worker comparten una sola consulta a SQL Server.
+    """
+    try:
+        return cache_compartida.obtener(
+            espacio, clave, lambda: lecturas_en_vuelo.ejecutar(f"{espacio}:{clave}", cargar)
+        )
+    except HTTPException as e:
+        # BD caída, saturada o lenta: se responde con el último resultado conocido si existe
+        if not CIRCUITO_SERVIR_CACHE or e.status_code not in (503, 504):
+            raise
+        valor = cache_compartida.obtener_vencido(espacio, clave)
+        if valor is None:
+            raise
+        circuito_db.contar_servida_cache()
+        logger.warning("Respuesta servida desde caché vencida", extra={"espacio": espacio, "clave": clave})
+        return valor
 
 app = FastAPI(
     title="KONTROL TIQUETES API",
-    version="3.1.0"
+    version="3.1.0",
+    lifespan=lifespan
 )
 
+# Respuestas grandes (listados de 1000 tiquetes) se comprimen si el cliente lo acepta
+COMPRESION_MIN_BYTES = int(os.getenv("COMPRESION_MIN_BYTES", "1024"))
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESION_MIN_BYTES)
+
 cors_origins = os.getenv("CORS_ORIGINS", "*").split(",")
 app.add_middleware(
     CORSMiddleware,
@@ -25,9 +137,46 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
 
+@app.middleware("http")
+async def asignar_request_id(request: Request, call_next):
+    """Correlaciona los logs de una petición con el header X-Request-ID"""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+captura = captura_trafico.CapturaTrafico() if captura_trafico.CAPTURA_TRAFICO_HABILITADA else None
+
+if captura is not None:
+    # Registrado después que asignar_request_id: queda por fuera de él y de GZip,
+    # así mide el tiempo total y los bytes que realmente salen
+    @app.middleware("http")
+    async def capturar_trafico(request: Request, call_next):
+        """Traza de la petición para reproducirla con benchmarks/replay.py"""
+        if not captura.capturar(request.url.path, request.method):
+            return await call_next(request)
+        inicio_ts, inicio = time.time(), time.perf_counter()
+        cuerpo = await request.body() if request.method in ("POST", "PUT", "PATCH") else b""
+        traza = captura_trafico.nueva_traza(request, inicio_ts, cuerpo)
+        response = await call_next(request)
+
+        def terminar(total_bytes: int):
+            ms = (time.perf_counter() - inicio) * 1000
+            captura.registrar(captura_trafico.completar_traza(traza, request, response, ms, total_bytes))
+
+        response.body_iterator = captura_trafico.contar_bytes(response.body_iterator, terminar)
+        return response
+
+
 
 class TiqueteEstadoUpdate(BaseModel):
     id_asesor: str
@@ -52,6 +201,57 @@ DB_CONFIG = {
     'use_windows_auth': os.getenv("USE_WINDOWS_AUTH", "true").lower() == "true"
 }
 
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Solo desarrollo: sin ADMIN_TOKEN los endpoints /admin quedan abiertos únicamente con este flag
+ADMIN_ABIERTO = os.getenv("ADMIN_ABIERTO", "false").lower() in ("true", "1")
+ROLLUP_HABILITADO = os.getenv("ROLLUP_HABILITADO", "false").lower() == "true"
+ROLLUP_INTERVALO_MIN = float(os.getenv("ROLLUP_INTERVALO_MIN", "60"))
+ENRIQUECIMIENTO_HABILITADO = os.getenv("ENRIQUECIMIENTO_HABILITADO", "false").lower() == "true"
+ENRIQUECIMIENTO_INTERVALO_SEG = float(os.getenv("ENRIQUECIMIENTO_INTERVALO_SEG", "120"))
+BUSQUEDA_DIAS_ATRAS = int(os.getenv("BUSQUEDA_DIAS_ATRAS", "7"))
+BUSQUEDA_RECARGA_MIN = float(os.getenv("BUSQUEDA_RECARGA_MIN", "10"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_POOL_VALIDAR_SEG = float(os.getenv("DB_POOL_VALIDAR_SEG", "60"))
+HEALTH_INTERVALO_SEG = float(os.getenv("HEALTH_INTERVALO_SEG", "15"))
+LOOKUPS_RECARGA_MIN = float(os.getenv("LOOKUPS_RECARGA_MIN", "30"))
+CONJUNTO_ACTIVO_HABILITADO = os.getenv("CONJUNTO_ACTIVO_HABILITADO", "true").lower() == "true"
+CONJUNTO_RECARGA_SEG = float(os.getenv("CONJUNTO_RECARGA_SEG", "60"))
+CONJUNTO_RECARGA_MIN_SEG = float(os.getenv("CONJUNTO_RECARGA_MIN_SEG", "5"))
+ARCHIVO_HABILITADO = os.getenv("ARCHIVO_HABILITADO", "false").lower() == "true"
+ARCHIVO_INTERVALO_MIN = float(os.getenv("ARCHIVO_INTERVALO_MIN", "360"))
+ATENCION_DIFERIDA_HABILITADA = os.getenv("ATENCION_DIFERIDA_HABILITADA", "false").lower() == "true"
+ATENCION_DIFERIDA_SEG = float(os.getenv("ATENCION_DIFERIDA_SEG", "2"))
+ANALITICA_RECONCILIAR_SEG = float(os.getenv("ANALITICA_RECONCILIAR_SEG", "120"))
+DB_BACKEND = os.getenv("DB_BACKEND", "sqlserver").lower()
+DB_SQLITE_RUTA = os.getenv("DB_SQLITE_RUTA", "kontrol_local.sqlite3")
+DB_LOGIN_TIMEOUT_SEG = int(os.getenv("DB_LOGIN_TIMEOUT_SEG", "5"))
+DB_MAX_CONCURRENTES = int(os.getenv("DB_MAX_CONCURRENTES", str(DB_POOL_SIZE * 2)))
+DB_ESPERA_ADMISION_SEG = float(os.getenv("DB_ESPERA_ADMISION_SEG", "0.5"))
+CIRCUITO_UMBRAL_FALLOS = int(os.getenv("CIRCUITO_UMBRAL_FALLOS", "5"))
+CIRCUITO_REAPERTURA_SEG = float(os.getenv("CIRCUITO_REAPERTURA_SEG", "30"))
+CIRCUITO_SERVIR_CACHE = os.getenv("CIRCUITO_SERVIR_CACHE", "true").lower() == "true"
+
+# Timeout de consulta (segundos, 0 = sin límite) por clase de uso de la conexión
+TIMEOUTS_CONSULTA = {
+    "lectura": int(os.getenv("DB_TIMEOUT_LECTURA_SEG", "15")),
+    "escritura": int(os.getenv("DB_TIMEOUT_ESCRITURA_SEG", "10")),
+    "reporte": int(os.getenv("DB_TIMEOUT_REPORTE_SEG", "120")),
+    "mantenimiento": int(os.getenv("DB_TIMEOUT_MANTENIMIENTO_SEG", "600")),
+    "chequeo": int(os.getenv("DB_TIMEOUT_CHEQUEO_SEG", "5")),
+}
+# Los jobs y el chequeo de salud no ocupan lugares de admisión de los requests
+CLASES_SIN_ADMISION = {"mantenimiento", "chequeo"}
+
+SUCURSALES = {
+    "I0W3": "Locales BOG",
+    "NT3H": "NEPS",
+    "MZ4C": "GRUPOS",
+    "7C0A": "VACACIONAL",
+    "7OMF": "Sucursal BAQ",
+    "W5AA": "Sucursal CLO",
+    "MANUAL": "REGISTRO MANUAL"
+}
+
 
 def get_connection_string():
     # Para Windows Auth no se requiere username
@@ -97,156 +297,323 @@ def get_connection_string():
         )
 
 
+def abrir_conexion():
+    """Conexión nueva al backend configurado (SQL Server vía pyodbc o SQLite local)"""
+    if DB_BACKEND == "sqlite":
+        return db_local.conectar(DB_SQLITE_RUTA)
+    if pyodbc is None:
+        raise ValueError("pyodbc no está instalado; use DB_BACKEND=sqlite para la base local")
+    return pyodbc.connect(get_connection_string(), timeout=DB_LOGIN_TIMEOUT_SEG)
+
+# Errores que indican una conexión rota (no vuelve al pool y cuenta para el circuito)
+ERRORES_CONEXION = (pyodbc.OperationalError, pyodbc.InterfaceError) if pyodbc is not None else ()
+
+pool_conexiones = PoolConexiones(
+    abrir_conexion,
+    tamano=DB_POOL_SIZE,
+    validar_despues=DB_POOL_VALIDAR_SEG
+)
+
+
+admision_db = LimiteConcurrencia(DB_MAX_CONCURRENTES, DB_ESPERA_ADMISION_SEG)
+circuito_db = CircuitoDB(CIRCUITO_UMBRAL_FALLOS, CIRCUITO_REAPERTURA_SEG)
+timeouts_excedidos = {clase: 0 for clase in TIMEOUTS_CONSULTA}
+
+def es_timeout(e: Exception) -> bool:
+    # pyodbc informa el timeout de consulta con SQLSTATE HYT00 (HYT01 el de conexión)
+    return bool(e.args) and e.args[0] in ("HYT00", "HYT01")
+
 @contextmanager
-def get_db_connection():
-    """Context manager para manejar conexiones a la base de datos"""
+def get_db_connection(clase: str = "lectura"):
+    """
+    Context manager para manejar conexiones a la base de datos (tomadas del pool).
+    `clase` define el timeout de consulta; los requests pasan además por el
+    límite de concurrencia y el circuito de BD (503 inmediato si no hay lugar).
+    """
+    limitada = clase not in CLASES_SIN_ADMISION
+    if limitada and not admision_db.adquirir():
+        raise HTTPException(status_code=503, detail="Servicio saturado, intente de nuevo",
+                            headers={"Retry-After": "1"})
+    # El chequeo de salud siempre llega a la BD: es la prueba que vuelve a cerrar el circuito
+    if clase != "chequeo" and not circuito_db.permitir():
+        if limitada:
+            admision_db.liberar()
+        raise HTTPException(status_code=503, detail="Base de datos no disponible",
+                            headers={"Retry-After": str(circuito_db.reintentar_en())})
+
+    raw = None
     conn = None
+    descartar = False
+    fallo_db = False
     try:
-        conn_str = get_connection_string()
-        
-        import re
-        # Mask password for logging
-        # log_conn_str = re.sub(r'PWD=.*?;', 'PWD=******;', conn_str)
-            
-        conn = pyodbc.connect(conn_str)
+        raw = pool_conexiones.obtener()
+        raw.timeout = TIMEOUTS_CONSULTA[clase]
+        conn = ConexionMedida(raw)
         yield conn
+    except HTTPException:
+        # Errores de negocio (404, 400...) pasan tal cual
+        if conn:
+            conn.rollback()
+        raise
     except ValueError as e:
         raise HTTPException(status_code=500, detail=f"Error de configuración: {str(e)}")
     except Exception as e:
+        # Una conexión rota no vuelve al pool
+        descartar = fallo_db = isinstance(e, ERRORES_CONEXION)
         if conn:
-            conn.rollback()
+            try:
+                conn.rollback()
+            except Exception:
+                descartar = True
+        if es_timeout(e):
+            timeouts_excedidos[clase] += 1
+            raise HTTPException(status_code=504, detail="La consulta excedió el tiempo límite")
         raise HTTPException(status_code=500, detail=f"Error de conexión: {str(e)}")
     finally:
         if conn:
-            conn.close()
-
+            conn.finalizar()
+        if raw is not None:
+            pool_conexiones.devolver(raw, descartar=descartar)
+        if fallo_db or raw is None:
+            circuito_db.fallo()
+        else:
+            circuito_db.exito()
+        if limitada:
+            admision_db.liberar()
 
-def extraer_aerolinea_pnr(ds_pnr: str) -> Optional[str]:
-    if not ds_pnr:
-        return None
 
-    match_operated = re.search(r'OPERATED BY[:/\s]+/?([A-Z][A-Z0-9\s]+?)(?:\s{2,}|$)', ds_pnr, re.IGNORECASE)
-    if match_operated:
-        aerolinea = match_operated.group(1).strip()
-        aerolinea = re.sub(r'\s+', ' ', aerolinea)
-        return aerolinea
+def determinar_tipo_gds(iden_gds: int) -> str:
+    gds_map = {
+        1: 'SABRE',
+        2: 'AMADEUS',
+        8: 'KONTROL'
+    }
+    return gds_map.get(iden_gds, f'GDS {iden_gds}')
 
-    match_a = re.search(r'A-([A-Z][A-Z0-9]+)', ds_pnr)
-    if match_a:
-        return match_a.group(1).strip()
+def mapear_sucursal(record: dict) -> dict:
+    """Agrega CodigoSucursal, NombreSucursal, Sucursal e id_cuenta_str al registro"""
+    cd = str(record.get("cd_sucursal") or "").strip().upper()
+    nombre_sucursal = SUCURSALES.get(cd, "OTRAS SUCURSALES")
+    record["CodigoSucursal"] = cd
+    record["NombreSucursal"] = nombre_sucursal
+    record["Sucursal"] = f"{cd} - {nombre_sucursal}"
+    record["id_cuenta_str"] = str(record.get("id_cuenta") or "SIN CUENTA")
+    return record
+
+def ejecutar_resumen_diario():
+    with get_db_connection("mantenimiento") as conn:
+        rollup.crear_tabla(conn)
+        rollup.actualizar_resumen(conn)
+
+tarea_resumen = TareaPeriodica("resumen-diario", ejecutar_resumen_diario, ROLLUP_INTERVALO_MIN * 60)
+
+def ejecutar_archivo():
+    with get_db_connection("mantenimiento") as conn:
+        archivo.crear_tablas(conn)
+        limite = archivo.limite_archivo()
+        if ROLLUP_HABILITADO:
+            # No se archiva lo que el resumen diario aún puede reprocesar desde las tablas vivas
+            rollup.crear_tabla(conn)
+            corte = rollup.fecha_corte(conn.cursor())
+            if corte is None:
+                logger.info("Resumen diario sin consolidar; se pospone el archivo")
+                return
+            limite = min(limite, corte - timedelta(days=rollup.ROLLUP_REPROCESO_DIAS))
+        movidas = archivo.archivar(conn, limite)
+
+    if any(movidas.values()):
+        cache_compartida.invalidar("tiquetes")
+        cache_compartida.invalidar("archivo")
+
+tarea_archivo = TareaPeriodica("archivo-vuelos", ejecutar_archivo, ARCHIVO_INTERVALO_MIN * 60, inmediata=False)
+
+pool_pnr = PoolPNR()
+
+cola_enriquecimiento = enriquecimiento.ColaEnriquecimiento(
+    lambda: get_db_connection("mantenimiento"), pool_pnr.extraer
+)
+tarea_escaneo_pnr = TareaPeriodica("escaneo-pnr", cola_enriquecimiento.escanear, ENRIQUECIMIENTO_INTERVALO_SEG)
 
-    match_amadeus = re.search(r';([A-Z]{2})\s+\d{4}\s+[A-Z]\s+[A-Z]', ds_pnr)
-    if match_amadeus:
-        return match_amadeus.group(1).strip()
+indice_busqueda = IndiceTrigramas()
+# Vuelo -> tiquetes (segmentos de ds_itinerario); se carga junto con el índice de búsqueda
+indice_vuelos = IndiceVuelos()
 
-    match_sabre_airline = re.search(r';([A-Z]{2})\s+\d+[A-Z]\s+', ds_pnr)
-    if match_sabre_airline:
-        return match_sabre_airline.group(1).strip()
+def resumen_busqueda(record: dict) -> dict:
+    """Registro liviano que devuelven /TiquetesDocumentos/buscar y el manifiesto de vuelo"""
+    return {
+        'cd_tiquete': record['cd_tiquete'],
+        'ds_paxname': limpiar_nombre_pasajero(record['ds_paxname']) if record.get('ds_paxname') else record.get('ds_paxname'),
+        'ds_paxape': limpiar_nombre_pasajero(record['ds_paxape']) if record.get('ds_paxape') else record.get('ds_paxape'),
+        'ds_itinerario': record.get('ds_itinerario'),
+        'ds_records': record.get('ds_records'),
+        'dt_salida': normalize_date(record.get('dt_salida')),
+        'dt_llegada': normalize_date(record.get('dt_llegada')),
+        'tipo_vuelo': record['tipo_vuelo'],
+        'id_asesor': record.get('id_asesor'),
+        'id_estado': 'Procesado' if (record.get('id_estado') == 'Procesado' or record.get('id_asesor')) else 'Pendiente',
+        'id_atencion': record.get('id_atencion'),
+        'id_silla': record.get('id_silla'),
+        'id_hora': record.get('id_hora')
+    }
 
-    try:
-        root = ET.fromstring(ds_pnr)
-        ds_aero_code = root.find('.//ds_aero_code')
-        if ds_aero_code is not None and ds_aero_code.text:
-            return ds_aero_code.text.strip()
-    except:
-        pass
+def consultar_tiquetes_indice(cursor, desde: date, hasta: date = None) -> list:
+    """Campos de los índices en memoria para los tramos con vuelo desde `desde` (hasta `hasta` si se indica)"""
+    query_ida = """
+            SELECT id_documento as cd_tiquete, ds_paxname, ds_paxape, ds_records, ds_itinerario,
+                   dt_salida, NULL as dt_llegada, 'IDA' as tipo_vuelo, id_asesor, id_estado, id_atencion,
+                   id_silla, id_hora, TRY_CONVERT(date, dt_salida) as fecha_vuelo
+            FROM dbo.VueloIDA
+    """
+    query_reg = """
+            SELECT id_documento as cd_tiquete, ds_paxname, ds_paxape, ds_records, ds_itinerario,
+                   NULL as dt_salida, dt_llegada, 'REG' as tipo_vuelo, id_asesor, id_estado, id_atencion,
+                   id_silla, id_hora, TRY_CONVERT(date, dt_llegada) as fecha_vuelo
+            FROM dbo.VueloREG
+    """
+    partes = [query_ida, query_reg]
+    if archivo.alcanza_archivo(desde) and archivo.hay_historico(cursor):
+        partes += [
+            query_ida.replace("dbo.VueloIDA", archivo.tabla_historica("dbo.VueloIDA")),
+            query_reg.replace("dbo.VueloREG", archivo.tabla_historica("dbo.VueloREG")),
+        ]
+
+    filtro_hasta = "AND fecha_vuelo <= ?" if hasta is not None else ""
+    cursor.execute(f"""
+        SELECT * FROM (
+            {" UNION ALL ".join(partes)}
+        ) AS Activos
+        WHERE fecha_vuelo >= ? {filtro_hasta}
+    """, (desde, hasta) if hasta is not None else (desde,))
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def indexar_vuelos(indice: IndiceVuelos, record: dict):
+    indice.agregar((record['cd_tiquete'], record['tipo_vuelo']), record.get('ds_itinerario'),
+                   record.get('fecha_vuelo') or record.get('dt_salida') or record.get('dt_llegada'),
+                   resumen_busqueda(record))
+
+def cargar_indice_busqueda():
+    """
+    Reconstruye los índices de búsqueda y de vuelos con los tiquetes activos
+    (vuelos desde hace BUSQUEDA_DIAS_ATRAS días) en una sola lectura.
+    """
+    global indice_busqueda, indice_vuelos
+    desde = date.fromordinal(date.today().toordinal() - BUSQUEDA_DIAS_ATRAS)
 
-    return None
+    with get_db_connection("mantenimiento") as conn:
+        records = consultar_tiquetes_indice(conn.cursor(), desde)
 
-def extraer_telefono_pnr(ds_pnr: str) -> Optional[str]:
-    if not ds_pnr:
-        return None
+    nuevo = IndiceTrigramas()
+    nuevo_vuelos = IndiceVuelos()
+    for record in records:
+        nuevo.agregar((record['cd_tiquete'], record['tipo_vuelo']), record, resumen_busqueda(record))
+        indexar_vuelos(nuevo_vuelos, record)
+    nuevo_vuelos.marcar_cargado(desde)
 
-    match_telepax = re.search(r'Telepax[:/\s]+(\d+)', ds_pnr, re.IGNORECASE)
-    if match_telepax:
-        return match_telepax.group(1).strip()
+    # Reemplazo atómico: las búsquedas en curso siguen sobre el índice anterior
+    indice_busqueda = nuevo
+    indice_vuelos = nuevo_vuelos
+    logger.info("Índice de búsqueda reconstruido", extra={"documentos": len(nuevo), "vuelos": len(nuevo_vuelos)})
 
-    match_digits_m = re.search(r'(\d{10,12})\s*-\s*M', ds_pnr, re.IGNORECASE)
-    if match_digits_m:
-        return match_digits_m.group(1).strip()
+def actualizar_indices(clave, **cambios):
+    """Cambios de estado/atención de un tramo en los índices en memoria"""
+    indice_busqueda.actualizar_resumen(clave, **cambios)
+    indice_vuelos.actualizar_resumen(clave, **cambios)
 
-    match_phone = re.search(r'(\d{10,12})\s+-B', ds_pnr)
-    if match_phone:
-        return match_phone.group(1).strip()
+# La primera carga la hace calentar(); la tarea solo recarga
+tarea_indice_busqueda = TareaPeriodica("indice-busqueda", cargar_indice_busqueda, BUSQUEDA_RECARGA_MIN * 60, inmediata=False)
 
-    match_ssrctcm = re.search(r'SSR\s+CTCM\s+[A-Z]{2}\s+HK\d+/(\d+)', ds_pnr)
-    if match_ssrctcm:
-        return match_ssrctcm.group(1).strip()
+tiqueteadores = {}
 
-    match_amadeus_phone = re.search(r'M-(\d{10,12})', ds_pnr)
-    if match_amadeus_phone:
-        return match_amadeus_phone.group(1).strip()
+def cargar_tiqueteadores():
+    """Catálogo cd_codigo -> ds_nombre de Tiqueteadores (evita una consulta por fila)"""
+    global tiqueteadores
 
-    try:
-        root = ET.fromstring(ds_pnr)
-        ds_pax_telefono = root.find('.//ds_pax_telefono')
-        if ds_pax_telefono is not None and ds_pax_telefono.text:
-            return ds_pax_telefono.text.strip()
-    except:
-        pass
+    def consultar():
+        with get_db_connection("mantenimiento") as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT cd_codigo, ds_nombre FROM Tiqueteadores")
+            return [[str(cd).strip(), nombre] for cd, nombre in cursor.fetchall() if cd is not None]
 
-    return None
+    # Un solo worker consulta SQL Server; el resto toma el catálogo de la caché compartida
+    filas = cache_compartida.obtener("catalogos", "tiqueteadores", consultar, ttl=LOOKUPS_RECARGA_MIN * 60)
+    tiqueteadores = dict(filas)
+    logger.info("Catálogo de tiqueteadores cargado", extra={"tiqueteadores": len(tiqueteadores)})
 
-def extraer_tiqueteador_pnr(ds_pnr: str) -> Optional[str]:
-    if not ds_pnr:
+def nombre_tiqueteador_catalogo(cd_codigo) -> Optional[str]:
+    if not cd_codigo:
         return None
+    return tiqueteadores.get(str(cd_codigo).strip())
 
-    match_rm_asesor = re.search(r'RM\s+ASESOR/([A-Z\s]+?)(?:\s+RM|\n|$)', ds_pnr, re.IGNORECASE)
-    if match_rm_asesor:
-        return match_rm_asesor.group(1).strip()
-
-    match_emisor = re.search(r'RM\s+XNET-EMISOR/([A-Z\s]+?)(?:\s+RM|\n|$)', ds_pnr, re.IGNORECASE)
-    if match_emisor:
-        return match_emisor.group(1).strip()
-
-    match_aitan = re.search(r'AITAN([A-Z0-9]+)', ds_pnr)
-    if match_aitan:
-        return match_aitan.group(1).strip()
+tarea_tiqueteadores = TareaPeriodica("tiqueteadores", cargar_tiqueteadores, LOOKUPS_RECARGA_MIN * 60, inmediata=False)
 
-    return None
-
-def limpiar_nombre_pasajero(nombre: str) -> str:
-    if not nombre:
-        return nombre
+ultimo_chequeo_db = {"status": "unknown", "database": "pending", "verificado": None, "error": None}
 
-    prefijos = ['MR', 'MRS', 'MS', 'MISS', 'DR', 'MSTR', 'CHD', 'INF', 'ADT']
-    nombre_limpio = nombre
+def chequear_db():
+    """Chequeo de conectividad en segundo plano; /health solo lee el resultado"""
+    global ultimo_chequeo_db
+    try:
+        with get_db_connection("chequeo") as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        ultimo_chequeo_db = {"status": "healthy", "database": "connected", "verificado": datetime.now().isoformat(), "error": None}
+    except Exception as e:
+        detalle = e.detail if isinstance(e, HTTPException) else str(e)
+        ultimo_chequeo_db = {"status": "unhealthy", "database": "disconnected", "verificado": datetime.now().isoformat(), "error": detalle}
 
-    for prefijo in prefijos:
-        nombre_limpio = re.sub(rf'\b{prefijo}\b', '', nombre_limpio, flags=re.IGNORECASE)
+tarea_chequeo_db = TareaPeriodica("chequeo-db", chequear_db, HEALTH_INTERVALO_SEG)
 
-    nombre_limpio = ' '.join(nombre_limpio.split())
+cola_reclamos = reclamos.ColaReclamos(sqlite=DB_BACKEND == "sqlite")
 
-    return nombre_limpio.strip()
+def preparar_reclamos():
+    with get_db_connection("mantenimiento") as conn:
+        reclamos.crear_columnas(conn)
 
-def determinar_tipo_gds(iden_gds: int) -> str:
-    gds_map = {
-        1: 'SABRE',
-        2: 'AMADEUS',
-        8: 'KONTROL'
-    }
-    return gds_map.get(iden_gds, f'GDS {iden_gds}')
+estado_arranque = {"listo": False, "inicio": None, "fin": None, "pasos": {}}
 
-def normalize_date(date_val):
-    if not date_val:
-        return None
-    if isinstance(date_val, datetime):
-        return date_val.isoformat()
-    # Try parsing custom format "Sep 30 2025 12:55PM"
-    try:
-        # Check if matches standard ISO first
+def calentar():
+    """
+    Deja el proceso listo antes de recibir tráfico: abre el pool de conexiones,
+    carga catálogos, construye el índice de búsqueda y arranca el pool de PNR.
+    Un paso que falla no bloquea el arranque (se reintenta en la próxima recarga).
+    """
+    estado_arranque["inicio"] = datetime.now().isoformat()
+    pasos = [
+        ("pool_conexiones", pool_conexiones.calentar),
+        ("tiqueteadores", cargar_tiqueteadores),
+        ("indice_busqueda", cargar_indice_busqueda),
+        ("conjunto_activo", cargar_conjunto_activo),
+        ("analitica_asesores", reconciliar_analitica),
+        ("pool_pnr", pool_pnr.calentar),
+    ]
+    if reclamos.RECLAMOS_HABILITADO:
+        pasos.append(("columnas_reclamo", preparar_reclamos))
+    for nombre, paso in pasos:
+        inicio = time.perf_counter()
+        error = None
         try:
-             return datetime.fromisoformat(str(date_val)).isoformat()
-        except:
-             pass
-        
-        # Parse custom format
-        # Example: Sep 30 2025 12:55PM
-        dt = datetime.strptime(str(date_val).strip(), "%b %d %Y %I:%M%p")
-        return dt.isoformat()
-    except Exception:
-        # Return original if parsing fails (fallback)
-        return date_val
+            paso()
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.warning("Paso de calentamiento fallido", extra={"paso": nombre, "error": error})
+        estado_arranque["pasos"][nombre] = {
+            "ms": round((time.perf_counter() - inicio) * 1000, 1),
+            "ok": error is None,
+            "error": error,
+        }
+    estado_arranque["fin"] = datetime.now().isoformat()
+    estado_arranque["listo"] = True
+    logger.info("Calentamiento completo", extra={"pasos": estado_arranque["pasos"]})
+
+def verificar_admin(x_admin_token: Optional[str] = Header(None)):
+    """Protege los endpoints /admin: exige ADMIN_TOKEN, salvo ADMIN_ABIERTO en desarrollo"""
+    if not ADMIN_TOKEN:
+        if ADMIN_ABIERTO:
+            return
+        raise HTTPException(status_code=403, detail="Acceso restringido: ADMIN_TOKEN no configurado")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Acceso restringido")
 
 # ============================================
 # ENDPOINTS
@@ -262,29 +629,33 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1")
-            return {
-                "status": "healthy",
-                "database": "connected",
-                "name": DB_CONFIG['database'],
-                "timestamp": datetime.now().isoformat()
-            }
-    except Exception as e:
-        return {
-            "status": "unhealthy",
-            "error": str(e),
+    """Devuelve el último chequeo de BD en segundo plano (no abre conexiones)"""
+    return {
+        **ultimo_chequeo_db,
+        "name": DB_CONFIG['database'],
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/ready")
+def readiness_check():
+    """200 cuando el calentamiento terminó y la BD responde; 503 mientras tanto"""
+    listo = estado_arranque["listo"] and ultimo_chequeo_db["status"] == "healthy"
+    return JSONResponse(
+        status_code=200 if listo else 503,
+        content={
+            "ready": listo,
+            "database": ultimo_chequeo_db["status"],
+            "arranque": estado_arranque,
             "timestamp": datetime.now().isoformat()
         }
+    )
 
 @app.post("/auth/login")
 def login(credentials: dict):
     usuario = credentials.get('correo', '').strip()
     password = credentials.get('password', '').strip()
 
-    print(f"\n🔐 Intento de login para: {usuario}")
+    logger.info("Intento de login", extra={"usuario": usuario})
     
     if not usuario or not password:
         return JSONResponse(status_code=400, content={"detail": "Usuario y contraseña requeridos"})
@@ -303,98 +674,157 @@ def login(credentials: dict):
         user = cursor.fetchone()
 
         if not user:
-            print(f"❌ Login fallido para: {usuario}")
+            logger.warning("Login fallido", extra={"usuario": usuario})
             return JSONResponse(status_code=401, content={"detail": "Usuario o contraseña incorrectos"})
         
-        print(f"✓ Login exitoso para: {user[1]}")
+        logger.info("Login exitoso", extra={"usuario": user[1]})
+
+        usuario_info = {
+            "id": user[0],
+            "email": user[1],
+            "nombre": user[2],
+            "rol": user[3]
+        }
+        token, sesion = sesiones.emitir_token(usuario_info)
 
         return {
             "success": True,
             "message": "Login exitoso",
-            "user": {
-                "id": user[0],
-                "email": user[1],
-                "nombre": user[2],
-                "rol": user[3]
-            }
+            "user": usuario_info,
+            "token": token,
+            "expira": datetime.fromtimestamp(sesion["exp"]).isoformat()
         }
 
-@app.post("/ReservasGDS")
-def get_reservas(fechas: Optional[Fechas] = None):
+def _token_de_peticion(authorization: Optional[str], token: Optional[str]) -> Optional[str]:
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:].strip()
+    return token
+
+@app.get("/auth/verify")
+def verify_session(
+    username: Optional[str] = Query(None),
+    token: Optional[str] = Query(None),
+    authorization: Optional[str] = Header(None)
+):
     """
-    Obtiene registros de VueloIDA y VueloREG para el dashboard administrativo.
+    Valida el token de sesión sin consultar la base de datos (firma + expiración + revocación).
     """
+    token_sesion = _token_de_peticion(authorization, token)
+    if not token_sesion:
+        return JSONResponse(status_code=401, content={"valid": False, "detail": "Token de sesión requerido"})
+
     try:
-        usar_filtro_fechas = fechas is not None and fechas.fecha_inicio and fechas.fecha_fin
-        
-        sucursales = {
-            "I0W3": "Locales BOG",
-            "NT3H": "NEPS",
-            "MZ4C": "GRUPOS",
-            "7C0A": "VACACIONAL",
-            "7OMF": "Sucursal BAQ",
-            "W5AA": "Sucursal CLO",
-            "MANUAL": "REGISTRO MANUAL"
-        }
+        sesion = sesiones.verificar_token(token_sesion)
+    except sesiones.TokenInvalido as e:
+        return JSONResponse(status_code=401, content={"valid": False, "detail": str(e)})
 
-        # Query base para IDA
-        query_ida = """
-            SELECT 
-                cd_sucursal,
-                id_documento as cd_codigo,
-                id_tiqueteador as cd_tiqueteador,
-                id_observacion as ds_observaciones,
-                id_cuenta,
-                id_hora,
-                dt_salida as fecha_vuelo
-            FROM dbo.VueloIDA
-        """
-        
-        # Query base para REG
-        query_reg = """
-            SELECT 
-                cd_sucursal,
-                id_documento as cd_codigo,
-                id_tiqueteador as cd_tiqueteador,
-                id_observacion as ds_observaciones,
-                id_cuenta,
-                id_hora,
-                dt_llegada as fecha_vuelo
-            FROM dbo.VueloREG
-        """
+    if username and username.strip().lower() != str(sesion["sub"]).lower():
+        return JSONResponse(status_code=401, content={"valid": False, "detail": "La sesión no corresponde al usuario"})
 
-        full_query = f"""
-            SELECT * FROM (
-                ({query_ida})
-                UNION ALL
-                ({query_reg})
-            ) as Combined
-        """
+    return {
+        "valid": True,
+        "username": sesion["sub"],
+        "rol": sesion.get("rol"),
+        "expira": datetime.fromtimestamp(sesion["exp"]).isoformat()
+    }
 
-        if usar_filtro_fechas:
-            full_query += f" WHERE fecha_vuelo >= '{fechas.fecha_inicio}' AND fecha_vuelo <= '{fechas.fecha_fin} 23:59:59'"
+@app.post("/auth/logout")
+def logout(token: Optional[str] = Query(None), authorization: Optional[str] = Header(None)):
+    token_sesion = _token_de_peticion(authorization, token)
+    try:
+        sesion = sesiones.verificar_token(token_sesion)
+    except sesiones.TokenInvalido:
+        return {"success": True, "message": "Sesión cerrada"}
+
+    sesiones.revocados.revocar(sesion["jti"], sesion["exp"])
+    logger.info("Logout", extra={"usuario": sesion["sub"]})
+    return {"success": True, "message": "Sesión cerrada"}
+
+def parsear_rango_fechas(fechas: Optional[Fechas]) -> tuple:
+    """(fecha_inicio, fecha_fin) como date, o (None, None) sin filtro; 400 si alguna es inválida"""
+    if fechas is None or not fechas.fecha_inicio or not fechas.fecha_fin:
+        return None, None
+    try:
+        return date.fromisoformat(fechas.fecha_inicio[:10]), date.fromisoformat(fechas.fecha_fin[:10])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido, use YYYY-MM-DD")
 
-        with get_db_connection() as conn:
+def consulta_reservas(cursor, fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> tuple:
+    """
+    (query, params) de reservas IDA + REG para el dashboard, con las tablas
+    históricas solo si el rango llega hasta el archivo.
+    """
+    # Query base para IDA
+    query_ida = """
+        SELECT 
+            cd_sucursal,
+            id_documento as cd_codigo,
+            id_tiqueteador as cd_tiqueteador,
+            id_observacion as ds_observaciones,
+            id_cuenta,
+            id_hora,
+            dt_salida as fecha_vuelo
+        FROM dbo.VueloIDA
+    """
+
+    # Query base para REG
+    query_reg = """
+        SELECT 
+            cd_sucursal,
+            id_documento as cd_codigo,
+            id_tiqueteador as cd_tiqueteador,
+            id_observacion as ds_observaciones,
+            id_cuenta,
+            id_hora,
+            dt_llegada as fecha_vuelo
+        FROM dbo.VueloREG
+    """
+
+    usar_filtro_fechas = bool(fecha_inicio and fecha_fin)
+    fecha_desde = date.fromisoformat(fecha_inicio[:10]) if usar_filtro_fechas else None
+
+    partes = [query_ida, query_reg]
+    if archivo.alcanza_archivo(fecha_desde) and archivo.hay_historico(cursor):
+        partes += [
+            query_ida.replace("dbo.VueloIDA", archivo.tabla_historica("dbo.VueloIDA")),
+            query_reg.replace("dbo.VueloREG", archivo.tabla_historica("dbo.VueloREG")),
+        ]
+
+    full_query = f"""
+        SELECT * FROM (
+            {" UNION ALL ".join(partes)}
+        ) as Combined
+    """
+
+    params = ()
+    if usar_filtro_fechas:
+        # Parametrizado: los tramos mensuales del dashboard reutilizan el mismo plan de ejecución
+        full_query += " WHERE fecha_vuelo >= ? AND fecha_vuelo <= ?"
+        params = (fecha_inicio, f"{fecha_fin} 23:59:59")
+    return full_query, params
+
+@app.post("/ReservasGDS")
+def get_reservas(fechas: Optional[Fechas] = None):
+    """
+    Obtiene registros de VueloIDA y VueloREG para el dashboard administrativo.
+    """
+    try:
+        # Ambas se validan antes de abrir la conexión (400 en vez de un error de SQL)
+        fecha_inicio, fecha_fin = parsear_rango_fechas(fechas)
+        usar_filtro_fechas = fecha_inicio is not None
+
+        with get_db_connection("reporte") as conn:
             cursor = conn.cursor()
-            cursor.execute(full_query)
+            query, params = consulta_reservas(
+                cursor,
+                fecha_inicio.isoformat() if usar_filtro_fechas else None,
+                fecha_fin.isoformat() if usar_filtro_fechas else None
+            )
+            cursor.execute(query, params)
             rows = cursor.fetchall()
             columns = [col[0] for col in cursor.description]
 
-        result = []
-        for row in rows:
-            record = dict(zip(columns, row))
-            
-            # Map Sucursal
-            cd = str(record.get("cd_sucursal", "")).strip().upper()
-            nombre_sucursal = sucursales.get(cd, "OTRAS SUCURSALES")
-            record["CodigoSucursal"] = cd
-            record["NombreSucursal"] = nombre_sucursal
-            record["Sucursal"] = f"{cd} - {nombre_sucursal}"
-            
-            # Map id_cuenta_str for the chart
-            record["id_cuenta_str"] = str(record.get("id_cuenta") or "SIN CUENTA")
-            
-            result.append(record)
+        result = [mapear_sucursal(dict(zip(columns, row))) for row in rows]
 
         return {
             "success": True,
@@ -403,11 +833,110 @@ def get_reservas(fechas: Optional[Fechas] = None):
             "filtrado_por_fechas": usar_filtro_fechas
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
-        import traceback
-        print(f"❌ ERROR en ReservasGDS: {traceback.format_exc()}")
+        logger.exception("Error en ReservasGDS")
         raise HTTPException(status_code=500, detail=f"Error al consultar reservas: {str(e)}")
 
+@app.get("/ReservasGDS/exportar")
+def exportar_reservas(
+    fecha_inicio: Optional[date] = Query(None, description="Fecha de vuelo inicial (YYYY-MM-DD)"),
+    fecha_fin: Optional[date] = Query(None, description="Fecha de vuelo final (YYYY-MM-DD)"),
+    formato: str = Query("csv", description="csv o xlsx")
+):
+    """
+    Exporta las reservas del rango en streaming (fetchmany por lotes) con el mapeo
+    de sucursal aplicado. El CSV empieza a descargarse de inmediato; el XLSX se
+    escribe en modo constant_memory (requiere xlsxwriter) y se envía al terminar.
+    Si el rango no cabe en una hoja de Excel responde 400 y hay que pedir CSV.
+    """
+    formato = formato.lower()
+    if formato not in ("csv", "xlsx"):
+        raise HTTPException(status_code=400, detail="Formato no soportado, use csv o xlsx")
+    if formato == "xlsx" and not exportacion.XLSX_DISPONIBLE:
+        raise HTTPException(status_code=501, detail="Exportación XLSX no disponible: falta instalar xlsxwriter")
+
+    # La conexión queda abierta mientras dura la descarga; se devuelve al pool al terminar
+    pila = ExitStack()
+    try:
+        conn = pila.enter_context(get_db_connection("reporte"))
+        cursor = conn.cursor()
+        query, params = consulta_reservas(
+            cursor,
+            fecha_inicio.isoformat() if fecha_inicio and fecha_fin else None,
+            fecha_fin.isoformat() if fecha_inicio and fecha_fin else None
+        )
+        if formato == "xlsx":
+            cursor.execute(f"SELECT COUNT(*) FROM ({query}) AS Conteo", params)
+            total = cursor.fetchone()[0]
+            if total > exportacion.XLSX_MAX_FILAS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"El rango tiene {total} filas y una hoja de Excel admite "
+                           f"{exportacion.XLSX_MAX_FILAS}; use formato csv o un rango más corto"
+                )
+        cursor.execute(query, params)
+    except HTTPException:
+        pila.close()
+        raise
+    except Exception as e:
+        pila.close()
+        logger.exception("Error exportando reservas")
+        raise HTTPException(status_code=500, detail=f"Error al exportar reservas: {str(e)}")
+
+    rango = f"{fecha_inicio}_{fecha_fin}" if fecha_inicio and fecha_fin else "completo"
+    generar = exportacion.generar_csv if formato == "csv" else exportacion.generar_xlsx
+    logger.info("Exportación de reservas iniciada", extra={"formato": formato, "rango": rango})
+
+    return StreamingResponse(
+        generar(cursor, mapear_sucursal, al_terminar=pila.close),
+        media_type=exportacion.TIPOS_MIME[formato],
+        headers={"Content-Disposition": f'attachment; filename="reservas_{rango}.{formato}"'},
+        background=BackgroundTask(pila.close)
+    )
+
+@app.post("/ReservasGDS/resumen")
+def get_reservas_resumen(fechas: Optional[Fechas] = None):
+    """
+    Conteos por fecha x sucursal x cuenta x tipo de vuelo. Con ROLLUP_HABILITADO los
+    días cerrados se leen de la tabla resumen diaria y solo los posteriores al corte
+    de las tablas vivas. Sin filtro de fechas, los tramos sin fecha van con fecha null.
+    """
+    try:
+        fecha_inicio, fecha_fin = parsear_rango_fechas(fechas)
+        usar_filtro_fechas = fecha_inicio is not None
+
+        with get_db_connection("reporte") as conn:
+            if ROLLUP_HABILITADO:
+                rollup.crear_tabla(conn)
+            filas, corte = rollup.consultar_resumen(conn.cursor(), fecha_inicio, fecha_fin, con_resumen=ROLLUP_HABILITADO)
+
+        result = []
+        for fecha, cd_sucursal, id_cuenta, tipo_vuelo, total in filas:
+            result.append(mapear_sucursal({
+                "fecha": fecha.isoformat() if hasattr(fecha, "isoformat") else fecha,
+                "cd_sucursal": cd_sucursal,
+                "id_cuenta": id_cuenta or None,
+                "tipo_vuelo": tipo_vuelo,
+                "total": total
+            }))
+
+        return {
+            "success": True,
+            "data": result,
+            "total": sum(r["total"] for r in result),
+            "sin_fecha": sum(r["total"] for r in result if r["fecha"] is None),
+            "corte_resumen": corte.isoformat() if corte else None,
+            "filtrado_por_fechas": usar_filtro_fechas
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error en ReservasGDS/resumen")
+        raise HTTPException(status_code=500, detail=f"Error al consultar resumen: {str(e)}")
+
 
 
 class TiqueteCreate(BaseModel):
@@ -452,7 +981,7 @@ def create_tiquete(tiquete: TiqueteCreate):
              except:
                  date_val = tiquete.dt_salida
 
-        with get_db_connection() as conn:
+        with get_db_connection("escritura") as conn:
             cursor = conn.cursor()
             
             # Check if exists
@@ -505,342 +1034,765 @@ def create_tiquete(tiquete: TiqueteCreate):
                 datetime.now().strftime("%H:%M:%S")
             ))
             conn.commit()
-            
+
+            tipo = "IDA" if target_table == "VueloIDA" else "REG"
+            registrar_escritura(cursor, tiquete.cd_tiquete, tipo)
+            if ENRIQUECIMIENTO_HABILITADO:
+                cola_enriquecimiento.encolar(tiquete.cd_tiquete, tipo)
+
+            record = {
+                'cd_tiquete': tiquete.cd_tiquete,
+                'ds_paxname': tiquete.ds_paxname,
+                'ds_records': tiquete.ds_records,
+                'ds_itinerario': tiquete.ds_itinerario,
+                col_date: date_val,
+                'tipo_vuelo': tipo,
+                'id_asesor': tiquete.id_asesor,
+                'id_estado': 'Pendiente',
+                'id_atencion': 'Presencial'
+            }
+            indice_busqueda.agregar((tiquete.cd_tiquete, tipo), record, resumen_busqueda(record))
+            indexar_vuelos(indice_vuelos, record)
+            analitica_asesores.agregar((tiquete.cd_tiquete, tipo), fecha_de(date_val))
+
             return {"success": True, "message": f"Tiquete creado en {target_table}", "cd_tiquete": tiquete.cd_tiquete}
 
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error creando tiquete", extra={"cd_tiquete": tiquete.cd_tiquete})
         raise HTTPException(status_code=500, detail=f"Error creando tiquete: {str(e)}")
 
+def normalizar_tipo_vuelo(tipo_vuelo: Optional[str]) -> Optional[str]:
+    """'IDA', 'REG' o None (ambos) a partir del filtro recibido"""
+    if not tipo_vuelo:
+        return None
+    val = tipo_vuelo.upper()
+    if val == 'IDA':
+        return 'IDA'
+    if val == 'REG' or 'DEVUELTA' in val:
+        return 'REG'
+    return None
+
+# Campo de la API -> columnas de sql_tiquetes que necesita para construirse
+COLUMNAS_POR_CAMPO = {
+    'cd_tiquete': (),
+    'ds_paxname': ('ds_paxname',),
+    'ds_paxprefix': ('ds_paxprefix',),
+    'ds_paxape': ('ds_paxape',),
+    'ds_itinerario': ('ds_itinerario',),
+    'dt_salida': (),
+    'dt_llegada': (),
+    'tipo_vuelo': (),
+    'ds_records': ('ds_records',),
+    'aerolinea': ('pnr_aerolinea', 'ds_PNR'),
+    'telefono': ('pnr_telefono', 'ds_PNR'),
+    'cd_tiqueteador': ('cd_tiqueteador',),
+    'nombre_tiqueteador': ('nombre_tiqueteador', 'cd_tiqueteador', 'pnr_tiqueteador', 'ds_PNR'),
+    'iden_gds': ('iden_gds',),
+    'tipo_reserva': ('iden_gds',),
+    'ds_observaciones': ('ds_observaciones',),
+    'id_asesor': ('id_asesor',),
+    'id_observacion': ('id_observacion',),
+    'id_estado': ('id_estado', 'id_asesor'),
+    'id_silla': ('id_silla',),
+    'id_cuenta': ('id_cuenta',),
+    'id_hora': ('id_hora',),
+    'id_atencion': ('id_atencion',),
+    'ds_pnr_text': ('ds_PNR',),
+}
+# Siempre se seleccionan: clave, orden, filtro por fecha y estado del enriquecimiento
+COLUMNAS_BASE = ('cd_tiquete', 'dt_salida', 'dt_llegada', 'tipo_vuelo', 'pnr_estado', 'fecha_vuelo')
+# Campos que pueden requerir parsear ds_PNR
+CAMPOS_PNR = frozenset({'aerolinea', 'telefono', 'nombre_tiqueteador'})
+CAMPOS_LISTADO = frozenset(COLUMNAS_POR_CAMPO) - {'ds_pnr_text'}
+CAMPOS_DETALLE = frozenset(COLUMNAS_POR_CAMPO)
+
+def parsear_campos(fields: Optional[str], permitidos: frozenset) -> Optional[frozenset]:
+    """fields=a,b,c -> conjunto validado (None = todos los campos)"""
+    if not fields:
+        return None
+    campos = frozenset(c.strip() for c in fields.split(",") if c.strip())
+    desconocidos = campos - permitidos
+    if desconocidos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos desconocidos: {', '.join(sorted(desconocidos))}. Disponibles: {', '.join(sorted(permitidos))}"
+        )
+    return campos or None
+
+def proyectar(tiquete: dict, campos: frozenset) -> dict:
+    """Deja solo los campos pedidos (cd_tiquete siempre se incluye)"""
+    return {k: v for k, v in tiquete.items() if k in campos or k == 'cd_tiquete'}
+
+def columnas_tiquete(tipo: str, pnr_completo: bool = False, campos: frozenset = None) -> dict:
+    """
+    alias -> expresión SQL de un tramo (v = tabla de vuelo, p = TiquetesPNR).
+    Sin pnr_completo, ds_PNR solo se trae si falta enriquecer la fila; sin
+    ENRIQUECIMIENTO_HABILITADO no hay TiquetesPNR y siempre se trae. Con
+    `campos`, solo las columnas que esos campos necesitan.
+    """
+    columna_fecha = "v.dt_salida" if tipo == "IDA" else "v.dt_llegada"
+    ds_pnr = "v.ds_PNR" if pnr_completo or not ENRIQUECIMIENTO_HABILITADO else "CASE WHEN p.estado IS NULL THEN v.ds_PNR END"
+
+    expresiones = {
+        'cd_tiquete': "v.id_documento",
+        'ds_paxname': "v.ds_paxname",
+        'ds_paxprefix': "v.ds_paxprefix",
+        'ds_paxape': "v.ds_paxape",
+        'ds_itinerario': "v.ds_itinerario",
+        'dt_salida': "v.dt_salida" if tipo == "IDA" else "NULL",
+        'dt_llegada': "v.dt_llegada" if tipo == "REG" else "NULL",
+        'tipo_vuelo': f"'{tipo}'",
+        'ds_records': "v.ds_records",
+        'ds_PNR': ds_pnr,
+        'nombre_tiqueteador': "v.id_tiqueteador",
+        'cd_tiqueteador': "v.id_asesor",
+        'iden_gds': "v.iden_gds",
+        'ds_observaciones': "v.id_observacion",
+        'id_asesor': "v.id_asesor",
+        'id_observacion': "v.id_observacion",
+        'id_estado': "v.id_estado",
+        'id_silla': "v.id_silla",
+        'id_cuenta': "v.id_cuenta",
+        'id_hora': "v.id_hora",
+        'id_atencion': "v.id_atencion",
+        'pnr_aerolinea': "p.aerolinea" if ENRIQUECIMIENTO_HABILITADO else "NULL",
+        'pnr_telefono': "p.telefono" if ENRIQUECIMIENTO_HABILITADO else "NULL",
+        'pnr_tiqueteador': "p.tiqueteador" if ENRIQUECIMIENTO_HABILITADO else "NULL",
+        'pnr_estado': "p.estado" if ENRIQUECIMIENTO_HABILITADO else "NULL",
+        'fecha_vuelo': f"TRY_CONVERT(date, {columna_fecha})",
+    }
+    if campos is not None:
+        necesarias = set(COLUMNAS_BASE)
+        for campo in campos:
+            necesarias.update(COLUMNAS_POR_CAMPO[campo])
+        expresiones = {alias: expr for alias, expr in expresiones.items() if alias in necesarias}
+    return expresiones
+
+def sql_tiquetes(tipo: str, pnr_completo: bool = False, historico: bool = False, campos: frozenset = None) -> str:
+    """SELECT de VueloIDA o VueloREG (o su tabla histórica) con los campos ya enriquecidos de TiquetesPNR"""
+    tabla = "VueloIDA" if tipo == "IDA" else "VueloREG"
+    if historico:
+        tabla = archivo.tabla_historica(tabla)
+    expresiones = columnas_tiquete(tipo, pnr_completo, campos)
+    columnas = ",\n            ".join(f"{expr} as {alias}" for alias, expr in expresiones.items())
+    union_pnr = (
+        f"LEFT JOIN dbo.TiquetesPNR p ON p.id_documento = v.id_documento AND p.tipo_vuelo = '{tipo}'"
+        if ENRIQUECIMIENTO_HABILITADO else ""
+    )
+    return f"""
+        SELECT
+            {columnas}
+        FROM dbo.{tabla} v
+        {union_pnr}
+    """
+
+def construir_tiquete(record: dict, campos_pnr: tuple = None, incluir_pnr: bool = False, campos: frozenset = None) -> dict:
+    """Fila de sql_tiquetes -> tiquete de la API (mapeo por nombre de columna)"""
+    aerolinea, telefono, tiqueteador_pnr = campos_pnr or (
+        record.get('pnr_aerolinea'), record.get('pnr_telefono'), record.get('pnr_tiqueteador')
+    )
+
+    # Nombre directo de la columna id_tiqueteador; si falta, catálogo y luego el PNR
+    nombre_tiqueteador = (
+        record.get('nombre_tiqueteador')
+        or nombre_tiqueteador_catalogo(record.get('cd_tiqueteador'))
+        or tiqueteador_pnr
+    )
+
+    iden_gds = record.get('iden_gds')
+    tipo_reserva = determinar_tipo_gds(int(iden_gds)) if iden_gds and str(iden_gds).isdigit() else None
+    estado = 'Procesado' if (record.get('id_estado') == 'Procesado' or record.get('id_asesor')) else 'Pendiente'
+    paxname = record.get('ds_paxname')
+    paxape = record.get('ds_paxape')
+
+    tiquete = {
+        'cd_tiquete': record['cd_tiquete'],
+        'ds_paxname': limpiar_nombre_pasajero(paxname) if paxname else paxname,
+        'ds_paxprefix': record.get('ds_paxprefix'),
+        'ds_paxape': limpiar_nombre_pasajero(paxape) if paxape else paxape,
+        'ds_itinerario': record.get('ds_itinerario'),
+        'dt_salida': normalize_date(record.get('dt_salida')),
+        'dt_llegada': normalize_date(record.get('dt_llegada')),
+        'tipo_vuelo': record.get('tipo_vuelo'),
+        'ds_records': record.get('ds_records'),
+        'aerolinea': aerolinea,
+        'telefono': telefono,
+        'cd_tiqueteador': record.get('cd_tiqueteador'),
+        'nombre_tiqueteador': nombre_tiqueteador,
+        'iden_gds': iden_gds,
+        'tipo_reserva': tipo_reserva,
+        'ds_observaciones': record.get('ds_observaciones'),
+        'id_asesor': record.get('id_asesor'),
+        'id_observacion': record.get('id_observacion'),
+        'id_estado': estado,
+        'id_silla': record.get('id_silla'),
+        'id_cuenta': record.get('id_cuenta'),
+        'id_hora': record.get('id_hora'),
+        'id_atencion': record.get('id_atencion')
+    }
+    if incluir_pnr:
+        tiquete['ds_pnr_text'] = record.get('ds_PNR')
+    return proyectar(tiquete, campos) if campos is not None else tiquete
+
+def filas_a_tiquetes(cursor, incluir_pnr: bool = False, campos: frozenset = None) -> list:
+    """Resultado de una consulta sobre sql_tiquetes -> [(fecha_vuelo, tiquete)]"""
+    columns = [col[0] for col in cursor.description]
+    records = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    # Solo se parsean las filas que el worker de enriquecimiento aún no procesó
+    # (en paralelo sobre el pool de procesos si son muchas), y solo si se pidió
+    # algún campo que salga del PNR
+    campos_pnr = {}
+    if campos is None or campos & CAMPOS_PNR:
+        sin_enriquecer = [i for i, record in enumerate(records) if record['pnr_estado'] is None]
+        campos_pnr = dict(zip(sin_enriquecer, pool_pnr.extraer([records[i].get('ds_PNR') for i in sin_enriquecer])))
+
+    resultado = []
+    for i, record in enumerate(records):
+        tiquete = construir_tiquete(record, campos_pnr.get(i), incluir_pnr, campos)
+        if 'estado_ida' in record:
+            # Fila de sql_tiquetes_unificados
+            tiquete['tramos'] = [t for t, e in (('IDA', record['estado_ida']), ('REG', record['estado_regreso'])) if e]
+            tiquete['estado_ida'] = record['estado_ida']
+            tiquete['estado_regreso'] = record['estado_regreso']
+        resultado.append((record['fecha_vuelo'], tiquete))
+    return resultado
+
+def leer_tiquete(cursor, cd_tiquete: str, tipo: str, historico: bool = False, campos: frozenset = None):
+    """(fecha_vuelo, tiquete con ds_pnr_text) desde SQL Server, o None"""
+    query = sql_tiquetes(tipo, pnr_completo=True, historico=historico, campos=campos)
+    cursor.execute(f"{query} WHERE v.id_documento = ?", (cd_tiquete,))
+    encontrados = filas_a_tiquetes(cursor, incluir_pnr=campos is None or 'ds_pnr_text' in campos, campos=campos)
+    return encontrados[0] if encontrados else None
+
+# Columnas que se toman de un tramo concreto en la vista unificada
+COLUMNAS_POR_TRAMO = ('dt_salida', 'dt_llegada', 'tipo_vuelo', 'fecha_vuelo')
+
+# Campos de gestión propios de cada tramo: en la vista unificada salen del tramo filtrado
+CAMPOS_DEL_TRAMO = ('id_estado', 'id_asesor', 'id_observacion', 'ds_observaciones',
+                    'id_silla', 'id_cuenta', 'id_hora', 'id_atencion')
+
+def sql_tiquetes_unificados(historico: bool = False, campos: frozenset = None, tramo: str = "IDA") -> str:
+    """
+    Un registro por tiquete: FULL OUTER JOIN de los tramos IDA y REG por
+    id_documento. Los datos generales salen del tramo IDA si existe (igual que el
+    detalle); los de gestión (CAMPOS_DEL_TRAMO) y tipo_vuelo, de `tramo` si existe
+    (el filtro tipo_vuelo). dt_salida viene del IDA, dt_llegada del REG y cada
+    tramo conserva su fecha y su estado.
+    """
+    campos_tramo = None if campos is None else campos | {'id_estado'}
+    aliases = columnas_tiquete("IDA", campos=campos_tramo).keys()
+    preferido, otro = ("r", "i") if tramo == "REG" else ("i", "r")
+    tipo_otro = "IDA" if tramo == "REG" else "REG"
+
+    columnas = []
+    for alias in aliases:
+        if alias in COLUMNAS_POR_TRAMO:
+            continue
+        primero, segundo = (preferido, otro) if alias in CAMPOS_DEL_TRAMO else ("i", "r")
+        columnas.append(f"CASE WHEN {primero}.cd_tiquete IS NOT NULL THEN {primero}.{alias} ELSE {segundo}.{alias} END as {alias}")
+    columnas += [
+        "i.dt_salida as dt_salida",
+        "r.dt_llegada as dt_llegada",
+        f"CASE WHEN {preferido}.cd_tiquete IS NOT NULL THEN '{tramo}' ELSE '{tipo_otro}' END as tipo_vuelo",
+        "COALESCE(i.fecha_vuelo, r.fecha_vuelo) as fecha_vuelo",
+        "i.fecha_vuelo as fecha_ida",
+        "r.fecha_vuelo as fecha_regreso",
+    ]
+    for prefijo, tramo in (("i", "ida"), ("r", "regreso")):
+        columnas.append(f"""CASE WHEN {prefijo}.cd_tiquete IS NULL THEN NULL
+                 WHEN {prefijo}.id_estado = 'Procesado' OR NULLIF({prefijo}.id_asesor, '') IS NOT NULL THEN 'Procesado'
+                 ELSE 'Pendiente' END as estado_{tramo}""")
+
+    separador = ",\n            "
+    return f"""
+        SELECT
+            {separador.join(columnas)}
+        FROM ({sql_tiquetes("IDA", historico=historico, campos=campos_tramo)}) i
+        FULL OUTER JOIN ({sql_tiquetes("REG", historico=historico, campos=campos_tramo)}) r
+            ON r.cd_tiquete = i.cd_tiquete
+    """
+
+def estado_tramo(tiquete: Optional[dict]) -> Optional[str]:
+    return tiquete['id_estado'] if tiquete is not None else None
+
+def unificar_tramos(tiquetes: list, tramo: str = "IDA") -> list:
+    """
+    Agrupa tramos IDA/REG del mismo tiquete (ruta en memoria; en SQL lo hace
+    sql_tiquetes_unificados, con el mismo criterio por `tramo`). Conserva el
+    orden de la primera aparición.
+    """
+    grupos = {}
+    for tiquete in tiquetes:
+        grupos.setdefault(tiquete['cd_tiquete'], {})[tiquete['tipo_vuelo']] = tiquete
+
+    unificados = []
+    for tramos in grupos.values():
+        ida, regreso = tramos.get('IDA'), tramos.get('REG')
+        tiquete = dict(ida or regreso)
+        del_tramo = tramos.get(tramo)
+        if del_tramo is not None:
+            tiquete.update({campo: del_tramo[campo] for campo in CAMPOS_DEL_TRAMO if campo in del_tramo})
+            tiquete['tipo_vuelo'] = tramo
+        tiquete['dt_salida'] = ida['dt_salida'] if ida else None
+        tiquete['dt_llegada'] = regreso['dt_llegada'] if regreso else None
+        tiquete['tramos'] = [t for t in ('IDA', 'REG') if t in tramos]
+        tiquete['estado_ida'] = estado_tramo(ida)
+        tiquete['estado_regreso'] = estado_tramo(regreso)
+        unificados.append(tiquete)
+    return unificados
+
+# ---------- conjunto activo (vuelos de hoy +/- N días) ----------
+
+conjunto_activo = ConjuntoActivo()
+_recarga_conjunto = threading.Lock()
+
+def cargar_conjunto_activo():
+    """Carga en memoria los tiquetes con vuelo dentro de la ventana actual"""
+    if not CONJUNTO_ACTIVO_HABILITADO or not _recarga_conjunto.acquire(blocking=False):
+        return
+    try:
+        desde, hasta = ventana_actual()
+        # Versión leída antes de consultar: una escritura durante la carga la deja vieja
+        version = cache_compartida.version_actual("tiquetes")
+        with get_db_connection("mantenimiento") as conn:
+            if ENRIQUECIMIENTO_HABILITADO:
+                enriquecimiento.crear_tabla(conn)
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT * FROM (
+                    {sql_tiquetes("IDA", pnr_completo=True)}
+                    UNION ALL
+                    {sql_tiquetes("REG", pnr_completo=True)}
+                ) AS Activos
+                WHERE fecha_vuelo >= ? AND fecha_vuelo <= ?
+            """, (desde, hasta))
+            tiquetes = filas_a_tiquetes(cursor, incluir_pnr=True)
+
+            # Regresos sin ida: el detalle en memoria puede responderlos con el REG
+            cursor.execute("""
+                SELECT r.id_documento FROM dbo.VueloREG r
+                WHERE TRY_CONVERT(date, r.dt_llegada) >= ? AND TRY_CONVERT(date, r.dt_llegada) <= ?
+                  AND NOT EXISTS (SELECT 1 FROM dbo.VueloIDA i WHERE i.id_documento = r.id_documento)
+            """, (desde, hasta))
+            sin_ida = [fila[0] for fila in cursor.fetchall()]
+
+        conjunto_activo.reemplazar(tiquetes, desde, hasta, version, sin_ida)
+        logger.info("Conjunto activo cargado", extra={
+            "tiquetes": len(tiquetes), "desde": desde.isoformat(), "hasta": hasta.isoformat()
+        })
+    finally:
+        _recarga_conjunto.release()
+
+tarea_conjunto_activo = TareaPeriodica("conjunto-activo", cargar_conjunto_activo, CONJUNTO_RECARGA_SEG, inmediata=False)
+
+def conjunto_vigente(desde: date = None, hasta: date = None) -> bool:
+    """
+    True si el conjunto activo puede responder: está cargado, cubre el rango
+    pedido y ningún otro worker escribió desde la última carga (versión de la
+    caché compartida). Si quedó viejo se recarga en segundo plano.
+    """
+    if not CONJUNTO_ACTIVO_HABILITADO or conjunto_activo.cargado_en is None:
+        return False
+    if (desde is not None or hasta is not None) and not conjunto_activo.cubre(desde, hasta):
+        return False
+
+    version = cache_compartida.version_actual("tiquetes")
+    if version is None or version != conjunto_activo.version or conjunto_activo.desde != ventana_actual()[0]:
+        if not _recarga_conjunto.locked() and time.time() - conjunto_activo.cargado_en >= CONJUNTO_RECARGA_MIN_SEG:
+            threading.Thread(target=tarea_conjunto_activo.ejecutar_ahora, name="recarga-conjunto", daemon=True).start()
+        return False
+    return True
+
+# ---------- analítica de asesores (procesados por hora y cola) ----------
+
+analitica_asesores = AnaliticaAsesores()
+
+def consultar_analitica(cursor, desde: date, hasta: date) -> list:
+    """(cd_tiquete, tipo_vuelo, fecha_vuelo, id_asesor, id_hora) de los tramos con vuelo en el rango"""
+    query_ida = """
+            SELECT id_documento, 'IDA' as tipo_vuelo, TRY_CONVERT(date, dt_salida) as fecha_vuelo, id_asesor, id_hora
+            FROM dbo.VueloIDA
+    """
+    query_reg = """
+            SELECT id_documento, 'REG' as tipo_vuelo, TRY_CONVERT(date, dt_llegada) as fecha_vuelo, id_asesor, id_hora
+            FROM dbo.VueloREG
+    """
+    partes = [query_ida, query_reg]
+    if archivo.alcanza_archivo(desde) and archivo.hay_historico(cursor):
+        partes += [
+            query_ida.replace("dbo.VueloIDA", archivo.tabla_historica("dbo.VueloIDA")),
+            query_reg.replace("dbo.VueloREG", archivo.tabla_historica("dbo.VueloREG")),
+        ]
+
+    cursor.execute(f"""
+        SELECT * FROM (
+            {" UNION ALL ".join(partes)}
+        ) AS Ventana
+        WHERE fecha_vuelo >= ? AND fecha_vuelo <= ?
+    """, (desde, hasta))
+    return [tuple(fila) for fila in cursor.fetchall()]
+
+def reconciliar_analitica():
+    """Recalcula la analítica de la ventana actual desde SQL (incluye lo escrito por otros workers)"""
+    desde, hasta = ventana_actual()
+    analitica_asesores.iniciar_reconciliacion()
+    try:
+        with get_db_connection("mantenimiento") as conn:
+            filas = consultar_analitica(conn.cursor(), desde, hasta)
+        analitica_asesores.reemplazar(filas, desde, hasta)
+    finally:
+        analitica_asesores.terminar_reconciliacion()
+    logger.info("Analítica de asesores reconciliada", extra={
+        "tramos": len(filas), "diferencias": analitica_asesores.diferencias
+    })
+
+tarea_analitica = TareaPeriodica("analitica-asesores", reconciliar_analitica, ANALITICA_RECONCILIAR_SEG, inmediata=False)
+
+def registrar_escritura(cursor, cd_tiquete: str, tipo: str):
+    """
+    Después de un commit: invalida la caché compartida (todos los workers) y
+    refresca el tiquete en el conjunto activo de este worker.
+    """
+    anterior = cache_compartida.version_actual("tiquetes")
+    cache_compartida.invalidar("tiquetes")
+    if conjunto_activo.cargado_en is None:
+        return
+    try:
+        leido = leer_tiquete(cursor, cd_tiquete, tipo)
+    except Exception:
+        logger.warning("No se pudo refrescar el tiquete en el conjunto activo", exc_info=True, extra={"cd_tiquete": cd_tiquete})
+        return
+    if leido is not None:
+        conjunto_activo.guardar(*leido)
+    sincronizar_version_conjunto(anterior)
+
+def sincronizar_version_conjunto(anterior):
+    """Si nadie más escribió entre medio, el conjunto sigue al día con la versión nueva"""
+    nueva = cache_compartida.version_actual("tiquetes")
+    if anterior is not None and anterior == conjunto_activo.version and nueva == anterior + 1:
+        conjunto_activo.version = nueva
+
+# ---------- atención diferida (write-behind)
+
+# Cambios de Presencial/Virtual: solo el último valor por (tiquete, tramo), escritos por lotes
+atenciones_pendientes = BufferEscritura("atencion")
+
+# 500 filas x 2 parámetros = 1000 por sentencia, bajo el límite de 2100 parámetros de SQL Server
+ATENCION_LOTE = 500
+
+def tramo_de_atencion(cd_tiquete: str) -> Optional[str]:
+    """Tramo que escribe un cambio de atención: IDA si existe, si no REG (como el UPDATE directo); None si no existe"""
+    tiquete = conjunto_activo.obtener(cd_tiquete)
+    if tiquete is not None and tiquete['tipo_vuelo'] == 'IDA':
+        return 'IDA'
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT CASE
+                WHEN EXISTS (SELECT 1 FROM dbo.VueloIDA WHERE id_documento = ?) THEN 'IDA'
+                WHEN EXISTS (SELECT 1 FROM dbo.VueloREG WHERE id_documento = ?) THEN 'REG'
+            END
+        """, (cd_tiquete, cd_tiquete))
+        return cursor.fetchone()[0]
+
+def vaciar_atenciones():
+    """Escribe las atenciones pendientes con un UPDATE ... FROM (VALUES ...) por tabla"""
+    lote = atenciones_pendientes.tomar()
+    if not lote:
+        return
+    items = list(lote.items())
+    try:
+        with get_db_connection("mantenimiento") as conn:
+            cursor = conn.cursor()
+            # El tramo se decidió al encolar (tramo_de_atencion): cada clave va a su tabla
+            for tipo in ("IDA", "REG"):
+                del_tramo = [(cd, valor) for (cd, t), (valor, _) in items if t == tipo]
+                for inicio in range(0, len(del_tramo), ATENCION_LOTE):
+                    parte = del_tramo[inicio:inicio + ATENCION_LOTE]
+                    valores = ", ".join("(?, ?)" for _ in parte)
+                    params = [x for fila in parte for x in fila]
+                    cursor.execute(f"""
+                        UPDATE v SET id_atencion = b.id_atencion
+                        FROM dbo.Vuelo{tipo} v
+                        JOIN (VALUES {valores}) AS b(id_documento, id_atencion) ON b.id_documento = v.id_documento
+                    """, params)
+            conn.commit()
+    except Exception:
+        atenciones_pendientes.devolver(lote)
+        raise
+
+    atenciones_pendientes.confirmar(lote)
+    anterior = cache_compartida.version_actual("tiquetes")
+    cache_compartida.invalidar("tiquetes")
+    for (cd, tipo), (valor, _) in items:
+        conjunto_activo.actualizar(cd, tipo, id_atencion=valor)
+    sincronizar_version_conjunto(anterior)
+    logger.info("Atenciones diferidas escritas", extra={"filas": len(items)})
+
+tarea_atenciones = TareaPeriodica("atenciones", vaciar_atenciones, ATENCION_DIFERIDA_SEG, inmediata=False)
+
+def campos_con_tramo(campos: Optional[frozenset]) -> Optional[frozenset]:
+    """La superposición de atenciones necesita el tramo de cada fila aunque no se haya pedido"""
+    if campos and 'id_atencion' in campos and 'tipo_vuelo' not in campos:
+        return campos | {'tipo_vuelo'}
+    return campos
+
+def superponer_atenciones(tiquetes: list, tipo: str = None, quitar_tramo: bool = False) -> list:
+    """
+    Las lecturas ven de inmediato la atención encolada aunque no esté en SQL
+    todavía, solo en el tramo que escribe el lote (tipo_vuelo de la fila o `tipo`).
+    Con quitar_tramo se devuelven copias sin tipo_vuelo (ver campos_con_tramo).
+    """
+    if len(atenciones_pendientes):
+        for tiquete in tiquetes:
+            if 'id_atencion' not in tiquete:
+                continue
+            valor = atenciones_pendientes.pendiente((tiquete['cd_tiquete'], tiquete.get('tipo_vuelo', tipo)))
+            if valor is not None:
+                tiquete['id_atencion'] = valor
+    if quitar_tramo:
+        return [{k: v for k, v in tiquete.items() if k != 'tipo_vuelo'} for tiquete in tiquetes]
+    return tiquetes
+
 @app.get("/TiquetesDocumentos")
 def get_tiquetes_documentos(
     limit: int = Query(1000, le=1000),
-    tipo_vuelo: Optional[str] = Query(None, description="Filtro por tipo de vuelo: 'IDA' o 'REG'")
+    tipo_vuelo: Optional[str] = Query(None, description="Filtro por tipo de vuelo: 'IDA' o 'REG'"),
+    fecha_desde: Optional[date] = Query(None, description="Fecha de vuelo inicial (YYYY-MM-DD)"),
+    fecha_hasta: Optional[date] = Query(None, description="Fecha de vuelo final (YYYY-MM-DD)"),
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (por defecto todos)"),
+    unificado: bool = Query(False, description="Un registro por tiquete con sus tramos IDA y REG")
 ):
+    tipo = normalizar_tipo_vuelo(tipo_vuelo)
+    campos = parsear_campos(fields, CAMPOS_LISTADO)
+    consulta = campos_con_tramo(campos)
+    quitar_tramo = consulta is not campos
+
+    # Rango dentro de la ventana activa: se responde desde memoria
+    if fecha_desde and fecha_hasta and conjunto_vigente(fecha_desde, fecha_hasta):
+        conjunto_activo.contar(acierto=True)
+        if unificado:
+            # Se agrupa antes de cortar en `limit` para no partir un tiquete
+            tramos = conjunto_activo.listar(fecha_desde, fecha_hasta)
+            tiquetes = [
+                t for t in unificar_tramos(tramos, tipo or "IDA")
+                if tipo is None or tipo in t['tramos']
+            ][:limit]
+            extras = {'tramos', 'estado_ida', 'estado_regreso'}
+            tiquetes = [proyectar(t, (consulta or CAMPOS_LISTADO) | extras) for t in tiquetes]
+        else:
+            tiquetes = [
+                proyectar(t, consulta or CAMPOS_LISTADO)
+                for t in conjunto_activo.listar(fecha_desde, fecha_hasta, tipo, limit)
+            ]
+        return {"total": len(tiquetes), "tiquetes": superponer_atenciones(tiquetes, quitar_tramo=quitar_tramo)}
+
+    if fecha_desde and fecha_hasta:
+        conjunto_activo.contar(acierto=False)
+    proyeccion = ",".join(sorted(consulta)) if consulta else "*"
+    clave = f"listado:{limit}:{tipo or ''}:{fecha_desde or ''}:{fecha_hasta or ''}:{proyeccion}:{int(unificado)}"
+    resultado = lectura_compartida(
+        "tiquetes", clave, lambda: listar_tiquetes(limit, tipo, fecha_desde, fecha_hasta, consulta, unificado)
+    )
+    tiquetes = superponer_atenciones(resultado.get("tiquetes") or [], quitar_tramo=quitar_tramo)
+    return {**resultado, "tiquetes": tiquetes} if quitar_tramo else resultado
+
+def listar_tiquetes(limit: int, tipo: Optional[str], fecha_desde: date = None, fecha_hasta: date = None,
+                    campos: frozenset = None, unificado: bool = False) -> dict:
     try:
         with get_db_connection() as conn:
+            if ENRIQUECIMIENTO_HABILITADO:
+                enriquecimiento.crear_tabla(conn)
             cursor = conn.cursor()
 
-            # Base Sub-Queries
-            select_ida = """
-                SELECT 
-                    id_documento as cd_tiquete,
-                    ds_paxname,
-                    ds_paxprefix,
-                    ds_paxape,
-                    ds_itinerario,
-                    dt_salida,
-                    NULL as dt_llegada,
-                    'IDA' as tipo_vuelo,
-                    ds_records,
-                    ds_PNR,
-                    id_tiqueteador as nombre_tiqueteador, -- Maps to name directly based on user input
-                    id_asesor as cd_tiqueteador,
-                    iden_gds,
-                    id_observacion as ds_observaciones,
-                    id_asesor,
-                    id_observacion,
-                    id_estado,
-                    id_silla,
-                    id_cuenta,
-                    id_hora,
-                    id_atencion
-                FROM dbo.VueloIDA
-            """
-
-            select_reg = """
-                SELECT 
-                    id_documento as cd_tiquete,
-                    ds_paxname,
-                    ds_paxprefix,
-                    ds_paxape,
-                    ds_itinerario,
-                    NULL as dt_salida,
-                    dt_llegada,
-                    'REG' as tipo_vuelo,
-                    ds_records,
-                    ds_PNR,
-                    id_tiqueteador as nombre_tiqueteador,
-                    id_asesor as cd_tiqueteador,
-                    iden_gds,
-                    id_observacion as ds_observaciones,
-                    id_asesor,
-                    id_observacion,
-                    id_estado,
-                    id_silla,
-                    id_cuenta,
-                    id_hora,
-                    id_atencion
-                FROM dbo.VueloREG
-            """
-
-            # Determine query based on filter
-            inner_query = ""
-            if tipo_vuelo:
-                val = tipo_vuelo.upper()
-                if val == 'IDA':
-                    inner_query = select_ida
-                elif val == 'REG' or 'DEVUELTA' in val:
-                    inner_query = select_reg
+            # En la vista unificada un tiquete entra si cualquiera de sus tramos cae en el rango
+            columnas_fecha = ["fecha_ida", "fecha_regreso"] if unificado else ["fecha_vuelo"]
+            alternativas = []
+            params = []
+            for columna in columnas_fecha:
+                rango = []
+                if fecha_desde:
+                    rango.append(f"{columna} >= ?")
+                    params.append(fecha_desde)
+                if fecha_hasta:
+                    rango.append(f"{columna} <= ?")
+                    params.append(fecha_hasta)
+                if rango:
+                    alternativas.append(f"({' AND '.join(rango)})")
+            condiciones = [f"({' OR '.join(alternativas)})"] if alternativas else []
+            if unificado and tipo:
+                condiciones.append("estado_ida IS NOT NULL" if tipo == "IDA" else "estado_regreso IS NOT NULL")
+            where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+
+            def consultar(top: int, historico: bool) -> list:
+                if unificado:
+                    inner_query = sql_tiquetes_unificados(historico=historico, campos=campos, tramo=tipo or "IDA")
                 else:
-                    inner_query = f"{select_ida} UNION ALL {select_reg}"
-            else:
-                inner_query = f"{select_ida} UNION ALL {select_reg}"
-
-            query = f"""
-                SELECT TOP ({limit}) * FROM (
-                    {inner_query}
-                ) AS TiquetesUnificados
-                ORDER BY COALESCE(dt_salida, dt_llegada) DESC
-            """
-
-
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            
-            # Verify columns from description to map correctly if needed
-            # col_names = [column[0] for column in cursor.description]
-
-            tiquetes = []
-            for row in rows:
-                # row indexes based on SELECT list above:
-                # 0: cd_tiquete
-                # 1: ds_paxname
-                # 2: ds_paxprefix
-                # 3: ds_paxape
-                # 4: ds_itinerario
-                # 5: fecha_vuelo
-                # 6: tipo_vuelo
-                # 7: ds_records
-                # 8: ds_PNR
-                # 9: nombre_tiqueteador (id_tiqueteador)
-                # 10: cd_tiqueteador (id_asesor)
-                # 11: iden_gds
-                # 12: ds_observaciones (id_observacion)
-                # 13: id_asesor
-                # 14: id_observacion
-                # 15: id_estado
-                # 16: id_silla
-                # 17: id_cuenta
-                # 18: id_hora
-                # 19: id_atencion
-
-                ds_pnr_text = row[9]
-                aerolinea = extraer_aerolinea_pnr(ds_pnr_text)
-                telefono = extraer_telefono_pnr(ds_pnr_text)
-                tiqueteador_pnr = extraer_tiqueteador_pnr(ds_pnr_text)
-
-                # Get name directly from the table column `id_tiqueteador`
-                nombre_tiqueteador = row[10]
-
-                # Fallback logic (optional, keeping for robustness if column is empty)
-                if not nombre_tiqueteador:
-                     # Try looking up by id_asesor (row[10])
-                    if row[10]:
-                        try:
-                            cursor.execute("SELECT ds_nombre FROM Tiqueteadores WHERE cd_codigo = ?", (row[10],))
-                            tiq_result = cursor.fetchone()
-                            if tiq_result:
-                                nombre_tiqueteador = tiq_result[0]
-                        except:
-                            pass
-                
-                if not nombre_tiqueteador and tiqueteador_pnr:
-                    nombre_tiqueteador = tiqueteador_pnr
-
-                tipo_reserva = determinar_tipo_gds(int(row[11])) if row[11] and str(row[11]).isdigit() else None
-
-                # Logic for status
-                estado_bd = row[15]
-                id_asesor_val = row[13]
-                estado = 'Procesado' if (estado_bd == 'Procesado' or id_asesor_val) else 'Pendiente'
-
-                paxname_limpio = limpiar_nombre_pasajero(row[1]) if row[1] else row[1]
-                paxape_limpio = limpiar_nombre_pasajero(row[3]) if row[3] else row[3]
-
-                tiquete = {
-                    'cd_tiquete': row[0],
-                    'ds_paxname': paxname_limpio,
-                    'ds_paxprefix': row[2],
-                    'ds_paxape': paxape_limpio,
-                    'ds_itinerario': row[4],
-                    'dt_salida': normalize_date(row[5]),
-                    'dt_llegada': normalize_date(row[6]),
-                    'tipo_vuelo': row[7],
-                    'ds_records': row[8],
-                    'aerolinea': aerolinea,
-                    'telefono': telefono,
-                    'cd_tiqueteador': row[11],
-                    'nombre_tiqueteador': nombre_tiqueteador,
-                    'iden_gds': row[12],
-                    'tipo_reserva': tipo_reserva,
-                    'ds_observaciones': row[13],
-                    'id_asesor': row[14],
-                    'id_observacion': row[15],
-                    'id_estado': estado,
-                    'id_silla': row[17],
-                    'id_cuenta': row[18],
-                    'id_hora': row[19],
-                    'id_atencion': row[20]
-                }
-                tiquetes.append(tiquete)
+                    inner_query = " UNION ALL ".join(
+                        sql_tiquetes(t, historico=historico, campos=campos) for t in ([tipo] if tipo else ["IDA", "REG"])
+                    )
+                cursor.execute(f"""
+                    SELECT TOP ({top}) * FROM (
+                        {inner_query}
+                    ) AS TiquetesUnificados
+                    {where}
+                    ORDER BY COALESCE(dt_salida, dt_llegada) DESC
+                """, params)
+                return [tiquete for _, tiquete in filas_a_tiquetes(cursor, campos=campos)]
+
+            tiquetes = consultar(limit, historico=False)
+
+            # Las tablas históricas solo tienen vuelos más antiguos: se consultan
+            # si faltan filas y el rango pedido llega hasta el archivo
+            if len(tiquetes) < limit and archivo.alcanza_archivo(fecha_desde) and archivo.hay_historico(cursor):
+                tiquetes.extend(consultar(limit - len(tiquetes), historico=True))
+
+            if unificado:
+                # Un código repetido en la misma tabla (o ya movido al archivo) sale una sola vez
+                vistos = set()
+                tiquetes = [t for t in tiquetes if not (t['cd_tiquete'] in vistos or vistos.add(t['cd_tiquete']))]
 
             return {
                 "total": len(tiquetes),
                 "tiquetes": tiquetes
             }
+    except HTTPException:
+        raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error listando tiquetes")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/TiquetesDocumentos/buscar")
+def buscar_tiquetes(
+    q: str = Query(..., min_length=1, description="Código, pasajero, record o itinerario"),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """
+    Búsqueda libre sobre el índice de trigramas en memoria (tiquetes activos).
+    """
+    resultados = indice_busqueda.buscar(q, limit)
+    tiquetes = []
+    for puntaje, resumen in resultados:
+        resumen['puntaje'] = puntaje
+        tiquetes.append(resumen)
+    return {
+        "total": len(tiquetes),
+        "tiquetes": tiquetes,
+        "indexados": len(indice_busqueda)
+    }
+
 @app.get("/TiquetesDocumentos/estadisticas")
-def get_estadisticas():
+def get_estadisticas(
+    fecha_desde: Optional[date] = Query(None, description="Fecha de vuelo inicial (YYYY-MM-DD)"),
+    fecha_hasta: Optional[date] = Query(None, description="Fecha de vuelo final (YYYY-MM-DD)")
+):
+    if fecha_desde and fecha_hasta and conjunto_vigente(fecha_desde, fecha_hasta):
+        conjunto_activo.contar(acierto=True)
+        conteo = conjunto_activo.estadisticas(fecha_desde, fecha_hasta)
+        return {
+            "totalTiquetes": conteo["total"],
+            "tiquetesPendientes": conteo["pendientes"],
+            "tiquetesProcesados": conteo["procesados"],
+            "fechaActualizacion": datetime.now().isoformat()
+        }
+
+    if fecha_desde and fecha_hasta:
+        conjunto_activo.contar(acierto=False)
+    clave = f"estadisticas:{fecha_desde or ''}:{fecha_hasta or ''}"
+    return lectura_compartida("tiquetes", clave, lambda: calcular_estadisticas(fecha_desde, fecha_hasta))
+
+def contar_tiquetes(cursor, fecha_desde: date = None, fecha_hasta: date = None, historico: bool = False) -> tuple:
+    """(total, pendientes, procesados) sobre las tablas vivas o las históricas"""
+    tabla_ida = archivo.tabla_historica("dbo.VueloIDA") if historico else "dbo.VueloIDA"
+    tabla_reg = archivo.tabla_historica("dbo.VueloREG") if historico else "dbo.VueloREG"
+
+    # La fecha de vuelo solo se calcula si se filtra por ella
+    filtrar = fecha_desde is not None or fecha_hasta is not None
+    col_ida = ", TRY_CONVERT(date, dt_salida) as fecha_vuelo" if filtrar else ""
+    col_reg = ", TRY_CONVERT(date, dt_llegada) as fecha_vuelo" if filtrar else ""
+    where = "WHERE fecha_vuelo >= ? AND fecha_vuelo <= ?" if filtrar else ""
+    params = (fecha_desde or date(1900, 1, 1), fecha_hasta or date(9999, 12, 31)) if filtrar else ()
+
+    cursor.execute(f"""
+        SELECT
+            COUNT(*) as total,
+            SUM(CASE WHEN id_asesor IS NULL THEN 1 ELSE 0 END) as pendientes,
+            SUM(CASE WHEN id_asesor IS NOT NULL THEN 1 ELSE 0 END) as procesados
+        FROM (
+            SELECT id_asesor{col_ida} FROM {tabla_ida}
+            UNION ALL
+            SELECT id_asesor{col_reg} FROM {tabla_reg}
+        ) as Combined
+        {where}
+    """, params)
+    row = cursor.fetchone()
+    return row[0] or 0, row[1] or 0, row[2] or 0
+
+def calcular_estadisticas(fecha_desde: date = None, fecha_hasta: date = None) -> dict:
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-
-            cursor.execute("""
-                SELECT
-                    COUNT(*) as total,
-                    SUM(CASE WHEN id_asesor IS NULL THEN 1 ELSE 0 END) as pendientes,
-                    SUM(CASE WHEN id_asesor IS NOT NULL THEN 1 ELSE 0 END) as procesados
-                FROM (
-                    SELECT id_asesor FROM dbo.VueloIDA
-                    UNION ALL
-                    SELECT id_asesor FROM dbo.VueloREG
-                ) as Combined
-            """)
-
-            row = cursor.fetchone()
+            total, pendientes, procesados = contar_tiquetes(cursor, fecha_desde, fecha_hasta)
+
+            if archivo.alcanza_archivo(fecha_desde) and archivo.hay_historico(cursor):
+                # El archivo solo cambia cuando corre el job: su conteo se cachea aparte
+                clave = f"conteo:{fecha_desde or ''}:{fecha_hasta or ''}"
+                hist = cache_compartida.obtener(
+                    "archivo", clave,
+                    lambda: list(contar_tiquetes(cursor, fecha_desde, fecha_hasta, historico=True)),
+                    ttl=ARCHIVO_INTERVALO_MIN * 60
+                )
+                total, pendientes, procesados = total + hist[0], pendientes + hist[1], procesados + hist[2]
 
             return {
-                "totalTiquetes": row[0] or 0,
-                "tiquetesPendientes": row[1] or 0,
-                "tiquetesProcesados": row[2] or 0,
+                "totalTiquetes": total,
+                "tiquetesPendientes": pendientes,
+                "tiquetesProcesados": procesados,
                 "fechaActualizacion": datetime.now().isoformat()
             }
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error consultando estadísticas")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/TiquetesDocumentos/{cd_tiquete}")
-def get_tiquete_documento(cd_tiquete: str):
+def get_tiquete_documento(
+    cd_tiquete: str,
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (por defecto todos)")
+):
+    cd_tiquete = cd_tiquete.strip()
+    campos = parsear_campos(fields, CAMPOS_DETALLE)
+
+    if conjunto_vigente():
+        tiquete = conjunto_activo.obtener(cd_tiquete)
+        conjunto_activo.contar(acierto=tiquete is not None)
+        if tiquete is not None:
+            superponer_atenciones([tiquete])
+            return {"tiquete": proyectar(tiquete, campos) if campos else tiquete}
+
     try:
         with get_db_connection() as conn:
+            if ENRIQUECIMIENTO_HABILITADO:
+                enriquecimiento.crear_tabla(conn)
             cursor = conn.cursor()
 
-            # Helper to query a table
-            def query_table(table_name):
-                # Determinar columnas de fecha según la tabla
-                col_salida = "dt_salida" if table_name == "VueloIDA" else "NULL as dt_salida"
-                col_llegada = "dt_llegada" if table_name == "VueloREG" else "NULL as dt_llegada"
-
-                query = f"""
-                    SELECT
-                        id_documento as cd_tiquete,
-                        ds_paxname,
-                        ds_paxprefix,
-                        ds_paxape,
-                        ds_itinerario,
-                        {col_salida},
-                        {col_llegada},
-                        ds_records,
-                        ds_PNR,
-                        id_tiqueteador as nombre_tiqueteador,
-                        id_asesor as cd_tiqueteador,
-                        iden_gds,
-                        id_observacion as ds_observaciones,
-                        id_asesor,
-                        id_observacion,
-                        id_estado,
-                        id_silla,
-                        id_cuenta,
-                        id_hora,
-                        id_atencion
-                    FROM dbo.{table_name}
-                    WHERE id_documento = ?
-                """
-                cursor.execute(query, (cd_tiquete.strip(),))
-                return cursor.fetchone()
-
-            # Try IDA
-            row = query_table("VueloIDA")
-            table_source = "IDA"
-            
-            # If not found, try REG
-            if not row:
-                row = query_table("VueloREG")
-                table_source = "REG"
-
-            if not row:
-                raise HTTPException(status_code=404, detail=f"Tiquete {cd_tiquete} no encontrado")
-
-            ds_pnr_text = row[9]
-            aerolinea = extraer_aerolinea_pnr(ds_pnr_text)
-            telefono = extraer_telefono_pnr(ds_pnr_text)
-            tiqueteador_pnr = extraer_tiqueteador_pnr(ds_pnr_text)
-
-            nombre_tiqueteador = row[10]
-            
-            # Fallback logic
-            if not nombre_tiqueteador:
-                if row[10] and len(row) > 10: # Check just in case
-                    try:
-                        cursor.execute("SELECT ds_nombre FROM Tiqueteadores WHERE cd_codigo = ?", (row[10],))
-                        tiq_result = cursor.fetchone()
-                        if tiq_result:
-                            nombre_tiqueteador = tiq_result[0]
-                    except:
-                        pass
-
-            if not nombre_tiqueteador and tiqueteador_pnr:
-                nombre_tiqueteador = tiqueteador_pnr
-
-            tipo_reserva = determinar_tipo_gds(int(row[12])) if row[12] and str(row[12]).isdigit() else None
-            
-            estado_bd = row[16]
-            id_asesor_val = row[14]
-            estado = 'Procesado' if (estado_bd == 'Procesado' or id_asesor_val) else 'Pendiente'
-
-            paxname_limpio = limpiar_nombre_pasajero(row[1]) if row[1] else row[1]
-            paxape_limpio = limpiar_nombre_pasajero(row[3]) if row[3] else row[3]
-
-            tiquete = {
-                'cd_tiquete': row[0],
-                'ds_paxname': paxname_limpio,
-                'ds_paxprefix': row[2],
-                'ds_paxape': paxape_limpio,
-                'ds_itinerario': row[4],
-                'dt_salida': normalize_date(row[5]),
-                'dt_llegada': normalize_date(row[6]),
-                'tipo_vuelo': table_source,
-                'ds_records': row[7],
-                'ds_pnr_text': row[9],
-                'aerolinea': aerolinea,
-                'telefono': telefono,
-                'cd_tiqueteador': row[11],
-                'nombre_tiqueteador': nombre_tiqueteador,
-                'iden_gds': row[12],
-                'tipo_reserva': tipo_reserva,
-                'ds_observaciones': row[13],
-                'id_asesor': row[14],
-                'id_observacion': row[15],
-                'id_estado': estado,
-                'id_silla': row[17],
-                'id_cuenta': row[18],
-                'id_hora': row[19],
-                'id_atencion': row[20]
-            }
+            # IDA primero; si no existe, REG; y por último el archivo histórico
+            historicos = (False, True) if archivo.hay_historico(cursor) else (False,)
+            for historico in historicos:
+                for tipo in ("IDA", "REG"):
+                    encontrado = leer_tiquete(cursor, cd_tiquete, tipo, historico=historico, campos=campos)
+                    if encontrado is not None:
+                        return {"tiquete": superponer_atenciones([encontrado[1]], tipo)[0]}
 
-            return {"tiquete": tiquete}
+            raise HTTPException(status_code=404, detail=f"Tiquete {cd_tiquete} no encontrado")
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error consultando tiquete", extra={"cd_tiquete": cd_tiquete})
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/TiquetesDocumentos/{cd_tiquete}/estado")
@@ -848,71 +1800,100 @@ def update_tiquete_estado(cd_tiquete: str, data: TiqueteEstadoUpdate):
     try:
         cd_tiquete = cd_tiquete.strip()
 
-        print(f"\n📥 Actualizando tiquete: {cd_tiquete}")
-        
+        logger.info("Actualizando tiquete", extra={"cd_tiquete": cd_tiquete, "id_asesor": data.id_asesor})
+
         if not data.id_asesor.strip():
             return JSONResponse(status_code=400, content={"detail": "El campo 'id_asesor' no puede estar vacío"})
 
-        with get_db_connection() as conn:
+        with get_db_connection("escritura") as conn:
             cursor = conn.cursor()
 
+            # Con la cola de reclamos: procesar libera el reclamo y no pisa el vigente de otro asesor.
+            # REG solo si no hay IDA: si IDA no se actualizó por estar reclamada, no se toca el regreso
+            con_reclamo = reclamos.RECLAMOS_HABILITADO and reclamos.columnas_listas()
+            set_reclamo = f", {reclamos.SET_LIBERAR}" if con_reclamo else ""
+            filtro_reclamo = f" AND {reclamos.FILTRO_DISPONIBLE}" if con_reclamo else ""
+            filtro_reg = " AND NOT EXISTS (SELECT 1 FROM dbo.VueloIDA WHERE id_documento = ?)" if con_reclamo else ""
+            params_reclamo = (data.id_asesor.strip(),) if con_reclamo else ()
+
             # Try updating VueloIDA first
-            cursor.execute("""
+            cursor.execute(f"""
                 UPDATE dbo.VueloIDA
                 SET id_asesor = ?,
                     id_observacion = ?,
                     id_estado = 'Procesado',
                     id_silla = ?,
                     id_cuenta = ?,
-                    id_hora = ?
-                WHERE id_documento = ?
+                    id_hora = ?{set_reclamo}
+                WHERE id_documento = ?{filtro_reclamo}
             """, (
                 data.id_asesor.strip(),
                 data.id_observacion.strip() if data.id_observacion else None,
                 data.id_silla.strip() if data.id_silla else None,
                 data.id_cuenta.strip() if data.id_cuenta else None,
                 data.id_hora,
-                cd_tiquete
+                cd_tiquete,
+                *params_reclamo
             ))
             
             rows_affected = cursor.rowcount
+            tipo = "IDA"
             
             # If not found in IDA, try REG
             if rows_affected == 0:
-                cursor.execute("""
+                tipo = "REG"
+                cursor.execute(f"""
                     UPDATE dbo.VueloREG
                     SET id_asesor = ?,
                         id_observacion = ?,
                         id_estado = 'Procesado',
                         id_silla = ?,
                         id_cuenta = ?,
-                        id_hora = ?
-                    WHERE id_documento = ?
+                        id_hora = ?{set_reclamo}
+                    WHERE id_documento = ?{filtro_reclamo}{filtro_reg}
                 """, (
                     data.id_asesor.strip(),
                     data.id_observacion.strip() if data.id_observacion else None,
                     data.id_silla.strip() if data.id_silla else None,
                     data.id_cuenta.strip() if data.id_cuenta else None,
                     data.id_hora,
-                    cd_tiquete
+                    cd_tiquete,
+                    *params_reclamo,
+                    *((cd_tiquete,) if con_reclamo else ())
                 ))
                 rows_affected = cursor.rowcount
 
+            if rows_affected == 0 and con_reclamo:
+                titular = cola_reclamos.titular(cursor, cd_tiquete)
+                if titular is not None:
+                    cola_reclamos.contar_conflicto()
+                    return JSONResponse(status_code=409, content={
+                        "detail": f"Tiquete {cd_tiquete} reclamado por {titular[0]}",
+                        "reclamado_por": titular[0],
+                        "reclamo_expira_utc": normalize_date(titular[1]),
+                    })
+
             if rows_affected == 0:
                 return JSONResponse(status_code=404, content={"detail": f"Tiquete {cd_tiquete} no encontrado"})
 
-            print(f"🔢 Filas actualizadas: {rows_affected}")
             conn.commit()
-            print("✅ Commit realizado correctamente")
+            registrar_escritura(cursor, cd_tiquete, tipo)
+            logger.info("Tiquete actualizado", extra={"cd_tiquete": cd_tiquete, "filas": rows_affected})
+            actualizar_indices(
+                (cd_tiquete, tipo), id_estado='Procesado', id_asesor=data.id_asesor.strip(),
+                id_silla=data.id_silla.strip() if data.id_silla else None, id_hora=data.id_hora
+            )
+            analitica_asesores.procesar((cd_tiquete, tipo), data.id_asesor.strip(), data.id_hora)
 
             return {
                 "success": True,
                 "message": "Tiquete actualizado correctamente",
                 "cd_tiquete": cd_tiquete
             }
+    except HTTPException:
+        raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error actualizando estado", extra={"cd_tiquete": cd_tiquete})
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -929,7 +1910,22 @@ def update_tiquete_atencion(cd_tiquete: str, data: dict):
         if not id_atencion or id_atencion not in ['Presencial', 'Virtual']:
             return JSONResponse(status_code=400, content={"detail": "El campo 'id_atencion' debe ser 'Presencial' o 'Virtual'"})
 
-        with get_db_connection() as conn:
+        if ATENCION_DIFERIDA_HABILITADA:
+            # Se encola y se escribe en el próximo lote; los cambios repetidos se colapsan
+            tipo = tramo_de_atencion(cd_tiquete)
+            if tipo is None:
+                return JSONResponse(status_code=404, content={"detail": f"Tiquete {cd_tiquete} no encontrado"})
+            atenciones_pendientes.agregar((cd_tiquete, tipo), id_atencion)
+            actualizar_indices((cd_tiquete, tipo), id_atencion=id_atencion)
+            return {
+                "success": True,
+                "message": f"Tipo de atención actualizado a {id_atencion}",
+                "cd_tiquete": cd_tiquete,
+                "id_atencion": id_atencion,
+                "diferido": True
+            }
+
+        with get_db_connection("escritura") as conn:
             cursor = conn.cursor()
 
             # Try IDA
@@ -940,9 +1936,11 @@ def update_tiquete_atencion(cd_tiquete: str, data: dict):
             """, (id_atencion, cd_tiquete))
             
             rows_affected = cursor.rowcount
+            tipo = "IDA"
             
             # Try REG if not found
             if rows_affected == 0:
+                tipo = "REG"
                 cursor.execute("""
                     UPDATE dbo.VueloREG
                     SET id_atencion = ?
@@ -954,6 +1952,8 @@ def update_tiquete_atencion(cd_tiquete: str, data: dict):
                 return JSONResponse(status_code=404, content={"detail": f"Tiquete {cd_tiquete} no encontrado"})
 
             conn.commit()
+            registrar_escritura(cursor, cd_tiquete, tipo)
+            actualizar_indices((cd_tiquete, tipo), id_atencion=id_atencion)
 
             return {
                 "success": True,
@@ -961,11 +1961,254 @@ def update_tiquete_atencion(cd_tiquete: str, data: dict):
                 "cd_tiquete": cd_tiquete,
                 "id_atencion": id_atencion
             }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error actualizando atención", extra={"cd_tiquete": cd_tiquete})
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================
+# COLA DE RECLAMOS
+# ============================================
+
+class ReclamoRequest(BaseModel):
+    id_asesor: str
+    cantidad: int = 1
+    tipo_vuelo: Optional[str] = None
+    fecha: Optional[date] = None
+
+class AsesorReclamo(BaseModel):
+    id_asesor: str
+
+def cola_reclamos_deshabilitada():
+    return JSONResponse(status_code=404, content={"detail": "Cola de reclamos deshabilitada (RECLAMOS_HABILITADO)"})
+
+@app.post("/TiquetesDocumentos/reclamar")
+def reclamar_tiquetes(data: ReclamoRequest):
+    """
+    Toma los siguientes pendientes del día para el asesor por RECLAMO_LEASE_SEG segundos.
+    Dos asesores que reclaman a la vez nunca reciben el mismo tiquete.
+    """
+    if not reclamos.RECLAMOS_HABILITADO:
+        return cola_reclamos_deshabilitada()
+    asesor = data.id_asesor.strip()
+    try:
+        if not asesor:
+            return JSONResponse(status_code=400, content={"detail": "El campo 'id_asesor' no puede estar vacío"})
+        if not 1 <= data.cantidad <= reclamos.RECLAMO_MAX_CANTIDAD:
+            return JSONResponse(status_code=400, content={"detail": f"'cantidad' debe estar entre 1 y {reclamos.RECLAMO_MAX_CANTIDAD}"})
+
+        tipo = normalizar_tipo_vuelo(data.tipo_vuelo)
+        tipos = (tipo,) if tipo else ("IDA", "REG")
+        fecha = data.fecha or date.today()
+
+        with get_db_connection("escritura") as conn:
+            reclamos.crear_columnas(conn)
+            tomados = cola_reclamos.reclamar(conn, asesor, data.cantidad, fecha, fecha, tipos)
+
+        tiquetes = []
+        for tipo_vuelo, fila in tomados:
+            resumen = resumen_busqueda({**fila, 'cd_tiquete': fila['id_documento'], 'tipo_vuelo': tipo_vuelo})
+            resumen['reclamo_expira_utc'] = normalize_date(fila['dt_reclamo_expira'])
+            tiquetes.append(resumen)
+        logger.info("Tiquetes reclamados", extra={"id_asesor": asesor, "filas": len(tiquetes)})
+
+        return {
+            "id_asesor": asesor,
+            "lease_seg": cola_reclamos.lease_seg,
+            "total": len(tiquetes),
+            "tiquetes": superponer_atenciones(tiquetes),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error reclamando tiquetes", extra={"id_asesor": asesor})
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/TiquetesDocumentos/{cd_tiquete}/liberar")
+def liberar_reclamo(cd_tiquete: str, data: AsesorReclamo):
+    """Devuelve a la cola un tiquete reclamado sin procesarlo"""
+    if not reclamos.RECLAMOS_HABILITADO:
+        return cola_reclamos_deshabilitada()
+    cd_tiquete = cd_tiquete.strip()
+    try:
+        with get_db_connection("escritura") as conn:
+            reclamos.crear_columnas(conn)
+            filas = cola_reclamos.liberar(conn, cd_tiquete, data.id_asesor.strip())
+        if filas == 0:
+            cola_reclamos.contar_conflicto()
+            return JSONResponse(status_code=409, content={"detail": f"El asesor no tiene reclamado el tiquete {cd_tiquete}"})
+        return {"success": True, "cd_tiquete": cd_tiquete, "filas": filas}
+    except HTTPException:
+        raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error liberando reclamo", extra={"cd_tiquete": cd_tiquete})
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/TiquetesDocumentos/{cd_tiquete}/renovar")
+def renovar_reclamo(cd_tiquete: str, data: AsesorReclamo):
+    """Extiende el lease de un tiquete que el asesor sigue atendiendo"""
+    if not reclamos.RECLAMOS_HABILITADO:
+        return cola_reclamos_deshabilitada()
+    cd_tiquete = cd_tiquete.strip()
+    try:
+        with get_db_connection("escritura") as conn:
+            reclamos.crear_columnas(conn)
+            filas = cola_reclamos.renovar(conn, cd_tiquete, data.id_asesor.strip())
+        if filas == 0:
+            cola_reclamos.contar_conflicto()
+            return JSONResponse(status_code=409, content={"detail": "El reclamo expiró o lo tomó otro asesor"})
+        return {"success": True, "cd_tiquete": cd_tiquete, "filas": filas, "lease_seg": cola_reclamos.lease_seg}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error renovando reclamo", extra={"cd_tiquete": cd_tiquete})
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================
+# VUELOS
+# ============================================
+
+@app.get("/vuelos/{vuelo}/manifiesto")
+def get_manifiesto_vuelo(
+    vuelo: str,
+    fecha: Optional[date] = Query(None, description="Fecha del vuelo (YYYY-MM-DD, por defecto hoy)")
+):
+    """
+    Pasajeros de un vuelo (AV9350, 'AV 9350'...) con pendientes y procesados,
+    desde el índice en memoria. Las fechas anteriores a la ventana del índice se
+    arman con una consulta acotada a esa fecha.
+    """
+    codigo = normalizar_vuelo(vuelo)
+    if codigo is None:
+        raise HTTPException(status_code=400, detail=f"Vuelo inválido: {vuelo}")
+    fecha = fecha or date.today()
+
+    if indice_vuelos.cubre(fecha):
+        manifiesto = indice_vuelos.manifiesto(codigo, fecha)
+        manifiesto["fuente"] = "memoria"
+        return manifiesto
+
+    def cargar():
+        # Tramos de un día antes o después: la fecha del segmento no siempre coincide con la del tramo
+        with get_db_connection() as conn:
+            records = consultar_tiquetes_indice(conn.cursor(), fecha - timedelta(days=1), fecha + timedelta(days=1))
+        indice = IndiceVuelos()
+        for record in records:
+            indexar_vuelos(indice, record)
+        return indice.manifiesto(codigo, fecha)
+
+    try:
+        manifiesto = lectura_compartida("tiquetes", f"manifiesto:{codigo}:{fecha.isoformat()}", cargar)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error armando manifiesto", extra={"vuelo": codigo, "fecha": fecha.isoformat()})
+        raise HTTPException(status_code=500, detail=str(e))
+    superponer_atenciones(manifiesto["pasajeros"])
+    manifiesto["fuente"] = "sql"
+    return manifiesto
+
+
+# ============================================
+# ANALÍTICA
+# ============================================
+
+@app.get("/analitica/asesores")
+def get_analitica_asesores(
+    fecha: Optional[date] = Query(None, description="Fecha de vuelo (YYYY-MM-DD, por defecto hoy)")
+):
+    """
+    Tiquetes procesados por asesor y por hora (id_hora) y pendientes al cierre de
+    cada hora. Dentro de la ventana activa se responde desde memoria; otras
+    fechas se calculan con una consulta de ese día.
+    """
+    fecha = fecha or date.today()
+
+    if analitica_asesores.cubre(fecha):
+        reporte = analitica_asesores.reporte(fecha)
+        reporte["fuente"] = "memoria"
+        reporte["reconciliado_en"] = analitica_asesores.reconciliado_en
+        return reporte
+
+    def cargar():
+        with get_db_connection("reporte") as conn:
+            filas = consultar_analitica(conn.cursor(), fecha, fecha)
+        dia = AnaliticaAsesores()
+        dia.reemplazar(filas, fecha, fecha)
+        return dia.reporte(fecha)
+
+    try:
+        reporte = lectura_compartida("tiquetes", f"analitica:{fecha.isoformat()}", cargar)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error calculando analítica de asesores", extra={"fecha": fecha.isoformat()})
+        raise HTTPException(status_code=500, detail=str(e))
+    reporte["fuente"] = "sql"
+    return reporte
+
+
+# ============================================
+# ADMINISTRACIÓN
+# ============================================
+
+@app.get("/admin/consultas-lentas", dependencies=[Depends(verificar_admin)])
+def get_consultas_lentas(
+    top: int = Query(20, ge=1, le=200),
+    orden: str = Query("total_ms", description="total_ms, max_ms, promedio_ms, ejecuciones o lentas")
+):
+    """
+    Reporte de las sentencias SQL más costosas agrupadas por huella (literales removidos).
+    """
+    return {
+        "umbral_ms": SLOW_QUERY_MS,
+        "orden": orden,
+        "consultas": estadisticas_sql.top(top, orden)
+    }
+
+@app.get("/admin/metricas", dependencies=[Depends(verificar_admin)])
+def get_metricas():
+    """
+    Estado de los subsistemas en segundo plano.
+    """
+    return {
+        "enriquecimiento_pnr": cola_enriquecimiento.metricas(),
+        "pool_conexiones": pool_conexiones.metricas(),
+        "cache_compartida": cache_compartida.metricas(),
+        "coalescencia": lecturas_en_vuelo.metricas(),
+        "conjunto_activo": conjunto_activo.metricas(),
+        "indice_vuelos": indice_vuelos.metricas(),
+        "analitica_asesores": analitica_asesores.metricas(),
+        "proteccion_db": {
+            "circuito": circuito_db.metricas(),
+            "admision": admision_db.metricas(),
+            "timeouts_seg": TIMEOUTS_CONSULTA,
+            "timeouts_excedidos": dict(timeouts_excedidos),
+        },
+        "atencion_diferida": {
+            "habilitada": ATENCION_DIFERIDA_HABILITADA,
+            **atenciones_pendientes.metricas(),
+        },
+        "captura_trafico": captura.metricas() if captura is not None else {"habilitada": False},
+        "reclamos": {
+            "habilitado": reclamos.RECLAMOS_HABILITADO,
+            "columnas": reclamos.columnas_listas(),
+            **cola_reclamos.metricas(),
+        },
+        "archivo": {
+            "habilitado": ARCHIVO_HABILITADO,
+            "limite": archivo.limite_archivo().isoformat(),
+            "ejecuciones": tarea_archivo.ejecuciones,
+            "errores": tarea_archivo.errores,
+        },
+        "arranque": estado_arranque,
+        "chequeo_db": ultimo_chequeo_db,
+        "timestamp": datetime.now().isoformat()
+    }
+
 
 if __name__ == "__main__":
     import uvicorn
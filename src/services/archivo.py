@@ -0,0 +1,118 @@
+"""
+Archivo histórico de vuelos pasados.
+
+Mueve por lotes los tiquetes con fecha de vuelo anterior al límite desde
+VueloIDA/VueloREG hacia VueloIDA_Hist/VueloREG_Hist (DELETE TOP ... OUTPUT INTO,
+una transacción por lote) para que las tablas vivas se mantengan pequeñas. Las
+lecturas solo incluyen las tablas históricas cuando el rango pedido las alcanza.
+"""
+import logging
+import os
+import time
+from datetime import date, timedelta
+
+logger = logging.getLogger("kontrol.archivo")
+
+ARCHIVO_DIAS = int(os.getenv("ARCHIVO_DIAS", "90"))
+ARCHIVO_LOTE = int(os.getenv("ARCHIVO_LOTE", "2000"))
+ARCHIVO_PAUSA_SEG = float(os.getenv("ARCHIVO_PAUSA_SEG", "0.5"))
+
+# tipo de vuelo -> (tabla viva, columna de fecha de vuelo)
+TABLAS = {"IDA": ("dbo.VueloIDA", "dt_salida"), "REG": ("dbo.VueloREG", "dt_llegada")}
+
+_tablas_creadas = False
+_historico = None
+_historico_verificado = 0.0
+
+
+def tabla_historica(tabla: str) -> str:
+    return f"{tabla}_Hist"
+
+
+def crear_tablas(conn):
+    """
+    Crea las tablas históricas con la misma estructura que las vivas (una sola
+    vez por proceso). El orden de columnas idéntico permite OUTPUT deleted.* INTO.
+    """
+    global _tablas_creadas, _historico
+    if _tablas_creadas:
+        return
+    cursor = conn.cursor()
+    for tabla, _ in TABLAS.values():
+        hist = tabla_historica(tabla)
+        indice = f"IX_{hist.split('.')[-1]}_documento"
+        cursor.execute(f"""
+            IF OBJECT_ID('{hist}', 'U') IS NULL
+                SELECT TOP 0 * INTO {hist} FROM {tabla};
+            IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = '{indice}')
+                CREATE INDEX {indice} ON {hist} (id_documento);
+        """)
+    conn.commit()
+    _tablas_creadas = True
+    _historico = True
+
+
+def hay_historico(cursor) -> bool:
+    """True si existen las tablas históricas (se vuelve a verificar cada 5 minutos si no)"""
+    global _historico, _historico_verificado
+    if _historico or time.monotonic() - _historico_verificado < 300:
+        return bool(_historico)
+    cursor.execute("SELECT OBJECT_ID(?, 'U'), OBJECT_ID(?, 'U')", tuple(tabla_historica(t) for t, _ in TABLAS.values()))
+    row = cursor.fetchone()
+    _historico = bool(row and row[0] is not None and row[1] is not None)
+    _historico_verificado = time.monotonic()
+    return _historico
+
+
+def limite_archivo(hoy: date = None) -> date:
+    """Los vuelos con fecha anterior a este día son candidatos a archivo"""
+    return (hoy or date.today()) - timedelta(days=ARCHIVO_DIAS)
+
+
+def alcanza_archivo(fecha_desde: date = None) -> bool:
+    """True si un rango que empieza en fecha_desde (None = sin límite) puede tener filas archivadas"""
+    return fecha_desde is None or fecha_desde < limite_archivo()
+
+
+def archivar(conn, limite: date, lote: int = ARCHIVO_LOTE) -> dict:
+    """
+    Mueve a las tablas históricas las filas con fecha de vuelo < limite.
+    Usa sp_getapplock para que solo un worker archive a la vez y lotes cortos
+    para no bloquear las tablas vivas. Devuelve las filas movidas por tipo.
+    """
+    cursor = conn.cursor()
+    movidas = {}
+
+    for tipo, (tabla, columna_fecha) in TABLAS.items():
+        hist = tabla_historica(tabla)
+        movidas[tipo] = 0
+        while True:
+            cursor.execute("""
+                SET NOCOUNT ON;
+                DECLARE @r INT;
+                EXEC @r = sp_getapplock @Resource = 'ArchivoVuelos', @LockMode = 'Exclusive',
+                                        @LockOwner = 'Transaction', @LockTimeout = 0;
+                SELECT @r;
+            """)
+            if cursor.fetchone()[0] < 0:
+                conn.rollback()
+                logger.info("Archivo en proceso por otro worker; se omite")
+                return movidas
+
+            cursor.execute(f"""
+                SET NOCOUNT ON;
+                DELETE TOP ({lote}) FROM {tabla}
+                OUTPUT deleted.* INTO {hist}
+                WHERE TRY_CONVERT(date, {columna_fecha}) < ?;
+                SELECT @@ROWCOUNT;
+            """, (limite,))
+            filas = cursor.fetchone()[0]
+            conn.commit()
+
+            movidas[tipo] += filas
+            if filas < lote:
+                break
+            time.sleep(ARCHIVO_PAUSA_SEG)
+
+    logger.info("Archivo de vuelos completado", extra={"movidas": movidas, "limite": limite.isoformat()})
+    return movidas
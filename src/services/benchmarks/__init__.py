@@ -0,0 +1,10 @@
+"""
+Benchmarks del parsing de PNR, pruebas de carga y replay de tráfico capturado.
+
+    cd src/services
+    python -m benchmarks.bench_pnr                  # golden + throughput contra la línea base
+    python -m benchmarks.bench_pnr --guardar-base   # fija la línea base de esta máquina
+    python -m benchmarks.bench_pnr --regenerar-golden
+    python -m benchmarks.carga --usuarios 20        # carga sintética contra la base local
+    python -m benchmarks.replay captura_trafico_*.jsonl* --json build.json
+"""
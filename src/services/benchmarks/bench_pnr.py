@@ -0,0 +1,206 @@
+"""
+Benchmark del parsing de PNR, limpieza de nombres y normalización de fechas.
+
+1. Golden: compara la salida actual con golden_pnr.json (entradas y salidas
+   guardadas). Un parser más rápido tiene que dar exactamente lo mismo.
+2. Throughput: registros/seg por función y por formato (mejor de N corridas).
+3. Línea base: compara contra baseline_pnr.json y falla si alguna medición cae
+   más de --tolerancia. La línea base depende de la máquina: se guarda con
+   --guardar-base en el mismo equipo donde se compara.
+
+Código de salida 1 si hay diferencias con el golden o regresiones.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+from pnr import (
+    extraer_aerolinea_pnr,
+    extraer_campos_pnr,
+    extraer_telefono_pnr,
+    extraer_tiqueteador_pnr,
+    limpiar_nombre_pasajero,
+    normalize_date,
+)
+from benchmarks.corpus import generar_fechas, generar_nombres, generar_pnrs, GENERADORES
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_GOLDEN = os.path.join(DIRECTORIO, "golden_pnr.json")
+RUTA_BASE = os.path.join(DIRECTORIO, "baseline_pnr.json")
+
+FUNCIONES_PNR = {
+    "extraer_aerolinea_pnr": extraer_aerolinea_pnr,
+    "extraer_telefono_pnr": extraer_telefono_pnr,
+    "extraer_tiqueteador_pnr": extraer_tiqueteador_pnr,
+    "extraer_campos_pnr": extraer_campos_pnr,
+}
+
+GOLDEN_POR_FORMATO = 40
+GOLDEN_NOMBRES = 100
+GOLDEN_FECHAS = 100
+
+
+# ---------- golden
+
+def _fecha_a_json(valor):
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+
+def _fecha_desde_json(formato: str, valor):
+    return datetime.fromisoformat(valor) if formato == "datetime" else valor
+
+
+def generar_golden(semilla: int = 7) -> dict:
+    pnrs = []
+    for formato in GENERADORES:
+        for _, ds_pnr in generar_pnrs(GOLDEN_POR_FORMATO, semilla, {formato: 1}):
+            pnrs.append({"formato": formato, "entrada": ds_pnr, "salida": list(extraer_campos_pnr(ds_pnr))})
+    return {
+        "pnr": pnrs,
+        "nombres": [
+            {"entrada": nombre, "salida": limpiar_nombre_pasajero(nombre)}
+            for nombre in generar_nombres(GOLDEN_NOMBRES, semilla)
+        ],
+        "fechas": [
+            {"formato": formato, "entrada": _fecha_a_json(valor), "salida": normalize_date(valor)}
+            for formato, valor in generar_fechas(GOLDEN_FECHAS, semilla)
+        ],
+    }
+
+
+def verificar_golden(golden: dict) -> list:
+    """Lista de diferencias (vacía si todo coincide)"""
+    diferencias = []
+    for i, caso in enumerate(golden["pnr"]):
+        salida = list(extraer_campos_pnr(caso["entrada"]))
+        if salida != caso["salida"]:
+            diferencias.append(f"pnr[{i}] ({caso['formato']}): esperado {caso['salida']}, obtenido {salida}")
+    for i, caso in enumerate(golden["nombres"]):
+        salida = limpiar_nombre_pasajero(caso["entrada"])
+        if salida != caso["salida"]:
+            diferencias.append(f"nombres[{i}]: esperado {caso['salida']!r}, obtenido {salida!r}")
+    for i, caso in enumerate(golden["fechas"]):
+        salida = normalize_date(_fecha_desde_json(caso["formato"], caso["entrada"]))
+        if salida != caso["salida"]:
+            diferencias.append(f"fechas[{i}] ({caso['formato']}): esperado {caso['salida']!r}, obtenido {salida!r}")
+    return diferencias
+
+
+# ---------- throughput
+
+def medir(funcion, entradas: list, repeticiones: int) -> float:
+    """Registros por segundo (mejor corrida de `repeticiones`)"""
+    if not entradas:
+        return 0.0
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for entrada in entradas:
+            funcion(entrada)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return len(entradas) / mejor if mejor > 0 else float("inf")
+
+
+def medir_todo(registros: int, repeticiones: int, semilla: int) -> dict:
+    """{"funcion/formato": registros_por_seg}"""
+    pnrs = generar_pnrs(registros, semilla)
+    por_formato = {"todos": [p for _, p in pnrs]}
+    for formato, ds_pnr in pnrs:
+        por_formato.setdefault(formato, []).append(ds_pnr)
+
+    resultados = {}
+    for nombre, funcion in FUNCIONES_PNR.items():
+        for formato, entradas in por_formato.items():
+            resultados[f"{nombre}/{formato}"] = medir(funcion, entradas, repeticiones)
+
+    nombres = generar_nombres(registros, semilla)
+    resultados["limpiar_nombre_pasajero/todos"] = medir(limpiar_nombre_pasajero, nombres, repeticiones)
+
+    fechas = generar_fechas(registros, semilla)
+    por_formato = {"todos": [f for _, f in fechas]}
+    for formato, valor in fechas:
+        por_formato.setdefault(formato, []).append(valor)
+    for formato, entradas in por_formato.items():
+        resultados[f"normalize_date/{formato}"] = medir(normalize_date, entradas, repeticiones)
+    return resultados
+
+
+def comparar(actual: dict, base: dict, tolerancia: float) -> list:
+    """Mediciones que cayeron más de `tolerancia` respecto a la línea base"""
+    regresiones = []
+    for clave, valor in actual.items():
+        referencia = base.get(clave)
+        if referencia and valor < referencia * (1 - tolerancia):
+            regresiones.append((clave, referencia, valor))
+    return regresiones
+
+
+def imprimir(actual: dict, base: dict):
+    print(f"{'medición':<42}{'reg/s':>12}{'µs/reg':>10}{'base reg/s':>12}{'cambio':>9}")
+    for clave, valor in actual.items():
+        referencia = base.get(clave)
+        cambio = f"{(valor / referencia - 1) * 100:+.1f}%" if referencia else "-"
+        print(f"{clave:<42}{valor:>12,.0f}{1e6 / valor:>10.1f}{(referencia or 0):>12,.0f}{cambio:>9}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--registros", type=int, default=5000, help="tamaño del corpus sintético")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--tolerancia", type=float, default=0.15, help="caída permitida contra la base (0.15 = 15%%)")
+    parser.add_argument("--base", default=RUTA_BASE)
+    parser.add_argument("--guardar-base", action="store_true", help="guarda estas mediciones como línea base")
+    parser.add_argument("--regenerar-golden", action="store_true",
+                        help="reescribe golden_pnr.json con la salida actual (solo si el cambio de salida es intencional)")
+    parser.add_argument("--solo-golden", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.regenerar_golden:
+        with open(RUTA_GOLDEN, "w", encoding="utf-8") as f:
+            json.dump(generar_golden(), f, ensure_ascii=False, indent=1)
+        print(f"Golden regenerado: {RUTA_GOLDEN}")
+        return 0
+
+    with open(RUTA_GOLDEN, encoding="utf-8") as f:
+        diferencias = verificar_golden(json.load(f))
+    for diferencia in diferencias[:20]:
+        print(f"GOLDEN: {diferencia}")
+    print(f"Golden: {'OK' if not diferencias else f'{len(diferencias)} diferencias'}")
+    if args.solo_golden:
+        return 1 if diferencias else 0
+
+    actual = medir_todo(args.registros, args.repeticiones, args.semilla)
+    base = {}
+    if os.path.exists(args.base):
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)["registros_por_seg"]
+    imprimir(actual, base)
+
+    if args.guardar_base:
+        with open(args.base, "w", encoding="utf-8") as f:
+            json.dump({
+                "fecha": datetime.now().isoformat(timespec="seconds"),
+                "maquina": platform.node(),
+                "python": platform.python_version(),
+                "registros": args.registros,
+                "semilla": args.semilla,
+                "registros_por_seg": {clave: round(valor, 1) for clave, valor in actual.items()},
+            }, f, indent=1)
+        print(f"Línea base guardada: {args.base}")
+        return 1 if diferencias else 0
+
+    regresiones = comparar(actual, base, args.tolerancia)
+    for clave, referencia, valor in regresiones:
+        print(f"REGRESIÓN: {clave} {referencia:,.0f} -> {valor:,.0f} reg/s")
+    if not base:
+        print("Sin línea base: ejecute con --guardar-base para fijarla")
+    return 1 if diferencias or regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
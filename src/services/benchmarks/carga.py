@@ -0,0 +1,236 @@
+"""
+Prueba de carga de la API con la mezcla de acciones de los asesores de mostrador.
+
+Sin --url levanta uvicorn contra la base SQLite local (DB_BACKEND=sqlite), con
+los jobs que solo existen en SQL Server deshabilitados. Cada usuario virtual es
+un hilo con su propia conexión HTTP keep-alive que elige acciones según PESOS y
+espera --pausa segundos entre una y otra.
+
+    cd src/services
+    python -m benchmarks.generar_datos --reemplazar
+    python -m benchmarks.carga --usuarios 20 --duracion 30
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlparse
+
+from benchmarks.generar_datos import CLAVE_PRUEBA
+from benchmarks.medicion import imprimir_tabla, resumen_latencias
+
+# Mezcla de acciones de un turno de mostrador (peso relativo)
+PESOS = {
+    "listado_ventana": 30,
+    "detalle": 20,
+    "buscar": 15,
+    "estadisticas": 10,
+    "estado": 10,
+    "atencion": 8,
+    "listado_completo": 5,
+    "login": 2,
+}
+
+ENTORNO_LOCAL = {
+    "DB_BACKEND": "sqlite",
+    "ROLLUP_HABILITADO": "false",
+    "ENRIQUECIMIENTO_HABILITADO": "false",
+    "ARCHIVO_HABILITADO": "false",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+class Cliente:
+    """Conexión HTTP persistente de un usuario virtual"""
+
+    def __init__(self, url: str, timeout: float):
+        partes = urlparse(url)
+        self._host, self._puerto = partes.hostname, partes.port or 80
+        self._timeout = timeout
+        self._conn = None
+
+    def pedir(self, metodo: str, ruta: str, cuerpo: dict = None) -> tuple:
+        """(status, json o None)"""
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self._host, self._puerto, timeout=self._timeout)
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else None
+        encabezados = {"Content-Type": "application/json"} if datos else {}
+        try:
+            self._conn.request(metodo, ruta, body=datos, headers=encabezados)
+            respuesta = self._conn.getresponse()
+            contenido = respuesta.read()
+        except (OSError, http.client.HTTPException):
+            self._conn.close()
+            self._conn = None
+            raise
+        try:
+            return respuesta.status, json.loads(contenido) if contenido else None
+        except ValueError:
+            return respuesta.status, None
+
+
+class Escenario:
+    """Acciones del mostrador sobre una muestra de tiquetes reales de la API"""
+
+    def __init__(self, tiquetes: list, correos: list):
+        self.codigos = [t["cd_tiquete"] for t in tiquetes] or ["0"]
+        self.textos = [t.get("ds_paxname") or t["cd_tiquete"] for t in tiquetes] or ["A"]
+        self.correos = correos
+
+    def accion(self, nombre: str, rnd: random.Random) -> tuple:
+        """(método, ruta, cuerpo)"""
+        hoy = date.today()
+        if nombre == "listado_ventana":
+            query = {"fecha_desde": hoy - timedelta(days=rnd.choice([0, 1])), "fecha_hasta": hoy + timedelta(days=1),
+                     "limit": 1000, "unificado": "true"}
+            return "GET", f"/TiquetesDocumentos?{urlencode(query)}", None
+        if nombre == "listado_completo":
+            return "GET", "/TiquetesDocumentos?limit=1000", None
+        if nombre == "detalle":
+            return "GET", f"/TiquetesDocumentos/{rnd.choice(self.codigos)}", None
+        if nombre == "buscar":
+            texto = rnd.choice(self.textos)
+            return "GET", f"/TiquetesDocumentos/buscar?{urlencode({'q': texto[:rnd.randint(3, max(3, len(texto)))]})}", None
+        if nombre == "estadisticas":
+            return "GET", f"/TiquetesDocumentos/estadisticas?{urlencode({'fecha_desde': hoy, 'fecha_hasta': hoy})}", None
+        if nombre == "estado":
+            cuerpo = {"id_asesor": f"ASESOR{rnd.randint(1, 25)}", "id_hora": f"{rnd.randint(5, 22):02d}:{rnd.randint(0, 59):02d}",
+                      "id_silla": f"{rnd.randint(1, 40)}A", "id_observacion": "PRUEBA DE CARGA"}
+            return "PUT", f"/TiquetesDocumentos/{rnd.choice(self.codigos)}/estado", cuerpo
+        if nombre == "atencion":
+            return "PUT", f"/TiquetesDocumentos/{rnd.choice(self.codigos)}/atencion", {"id_atencion": rnd.choice(["Presencial", "Virtual"])}
+        if nombre == "login":
+            return "POST", "/auth/login", {"correo": rnd.choice(self.correos), "password": CLAVE_PRUEBA}
+        raise ValueError(nombre)
+
+
+def ejecutar_carga(url: str, escenario: Escenario, usuarios: int, duracion: float, pausa: float,
+                   semilla: int = 42, timeout: float = 30) -> dict:
+    """{"acciones": {nombre: [(ms, status)]}, "segundos": duración real}"""
+    resultados = {nombre: [] for nombre in PESOS}
+    lock = threading.Lock()
+    fin = time.monotonic() + duracion
+    nombres, pesos = list(PESOS), list(PESOS.values())
+
+    def usuario(indice: int):
+        rnd = random.Random(semilla + indice)
+        cliente = Cliente(url, timeout)
+        while time.monotonic() < fin:
+            nombre = rnd.choices(nombres, pesos)[0]
+            metodo, ruta, cuerpo = escenario.accion(nombre, rnd)
+            inicio = time.perf_counter()
+            try:
+                status, _ = cliente.pedir(metodo, ruta, cuerpo)
+            except (OSError, http.client.HTTPException):
+                status = 0
+            ms = (time.perf_counter() - inicio) * 1000
+            with lock:
+                resultados[nombre].append((ms, status))
+            if pausa:
+                time.sleep(rnd.uniform(0, 2 * pausa))
+
+    inicio = time.monotonic()
+    hilos = [threading.Thread(target=usuario, args=(i,), daemon=True) for i in range(usuarios)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return {"acciones": resultados, "segundos": time.monotonic() - inicio}
+
+
+def reporte(resultado: dict) -> dict:
+    filas, extra = {}, {}
+    todas = []
+    for nombre, muestras in resultado["acciones"].items():
+        if not muestras:
+            continue
+        latencias = [ms for ms, _ in muestras]
+        todas.extend(latencias)
+        filas[nombre] = resumen_latencias(latencias)
+        extra[nombre] = {"errores": sum(1 for _, status in muestras if status == 0 or status >= 500)}
+    filas["TOTAL"] = resumen_latencias(todas)
+    extra["TOTAL"] = {"errores": sum(e["errores"] for e in extra.values())}
+    return {
+        "acciones": filas,
+        "errores": extra,
+        "peticiones": len(todas),
+        "rps": len(todas) / resultado["segundos"] if resultado["segundos"] else 0.0,
+    }
+
+
+def levantar_api(puerto: int, ruta_db: str, entorno: dict = None) -> subprocess.Popen:
+    env = {**os.environ, **ENTORNO_LOCAL, "DB_SQLITE_RUTA": ruta_db,
+           "CACHE_COMPARTIDA_RUTA": os.path.join(tempfile.gettempdir(), f"kontrol_carga_{puerto}.sqlite3"),
+           **(entorno or {})}
+    directorio = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--port", str(puerto), "--log-level", "warning"],
+        cwd=directorio, env=env
+    )
+    cliente = Cliente(f"http://127.0.0.1:{puerto}", 5)
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError("La API terminó al arrancar")
+        try:
+            if cliente.pedir("GET", "/ready")[0] == 200:
+                return proceso
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.5)
+    proceso.terminate()
+    raise RuntimeError("La API no quedó lista en 60 s")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="API ya levantada (por defecto se levanta una contra la base local)")
+    parser.add_argument("--db", default=os.getenv("DB_SQLITE_RUTA", "kontrol_local.sqlite3"))
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--usuarios", type=int, default=20)
+    parser.add_argument("--duracion", type=float, default=30)
+    parser.add_argument("--pausa", type=float, default=0.2, help="tiempo medio entre acciones de un usuario (s)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--json", help="guarda el reporte en este archivo")
+    args = parser.parse_args(argv)
+
+    proceso = None
+    url = args.url
+    if url is None:
+        if not os.path.exists(args.db):
+            print(f"No existe {args.db}: genere los datos con python -m benchmarks.generar_datos")
+            return 1
+        proceso = levantar_api(args.puerto, os.path.abspath(args.db))
+        url = f"http://127.0.0.1:{args.puerto}"
+
+    try:
+        status, muestra = Cliente(url, 60).pedir("GET", "/TiquetesDocumentos?limit=1000&fields=ds_paxname")
+        if status != 200:
+            print(f"No se pudo leer la muestra de tiquetes (HTTP {status})")
+            return 1
+        correos = [f"asesor{i}@kontrol.local" for i in range(1, 26)]
+        escenario = Escenario(muestra["tiquetes"], correos)
+        resultado = ejecutar_carga(url, escenario, args.usuarios, args.duracion, args.pausa, args.semilla)
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait(10)
+
+    datos = reporte(resultado)
+    imprimir_tabla(datos["acciones"], datos["errores"])
+    print(f"\n{datos['peticiones']} peticiones en {resultado['segundos']:.1f} s: {datos['rps']:.1f} req/s")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
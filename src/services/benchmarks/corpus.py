@@ -0,0 +1,164 @@
+"""
+Corpus sintético de registros GDS para los benchmarks.
+
+Genera PNR con la forma de los que llegan a ds_PNR (segmentos separados por ';')
+en la mezcla habitual de formatos, más nombres de pasajero y fechas de vuelo.
+Es determinista para una semilla dada.
+"""
+import random
+from datetime import datetime, timedelta
+
+# Proporción aproximada de cada formato en producción
+MEZCLA = {"sabre": 0.45, "amadeus": 0.35, "xml": 0.12, "manual": 0.08}
+
+AEROLINEAS = ["AV", "LA", "CM", "JA", "P5", "UA", "AA", "IB", "CO", "4C"]
+NOMBRES_AEROLINEA = ["AVIANCA", "LATAM AIRLINES COLOMBIA", "COPA AIRLINES", "JETSMART", "WINGO"]
+CIUDADES = ["BOG", "MDE", "CLO", "CTG", "BAQ", "SMR", "ADZ", "PEI", "BGA", "MIA", "MAD", "PTY"]
+NOMBRES = ["JUAN", "MARIA", "CARLOS", "ANA", "LUIS", "PAULA", "ANDRES", "LAURA", "JORGE", "DIANA"]
+APELLIDOS = ["PEREZ", "GOMEZ", "RODRIGUEZ", "MARTINEZ", "LOPEZ", "GARCIA", "RAMIREZ", "TORRES"]
+PREFIJOS = ["MR", "MRS", "MS", "MISS", "DR", "MSTR", "CHD", "INF", "ADT"]
+DIAS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+MESES = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+
+
+def _telefono(rnd: random.Random) -> str:
+    return "57" * rnd.randint(0, 1) + "3" + "".join(str(rnd.randint(0, 9)) for _ in range(9))
+
+
+def _asesor(rnd: random.Random) -> str:
+    return f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}"
+
+
+def _pasajeros(rnd: random.Random) -> list:
+    return [
+        f"{i}.1{rnd.choice(APELLIDOS)}/{rnd.choice(NOMBRES)} {rnd.choice(PREFIJOS)}"
+        for i in range(1, rnd.choice([1, 1, 1, 2, 2, 3, 4]) + 1)
+    ]
+
+
+def _fecha_gds(rnd: random.Random) -> str:
+    return f"{rnd.randint(1, 28):02d}{rnd.choice(MESES)}"
+
+
+def pnr_sabre(rnd: random.Random) -> str:
+    partes = _pasajeros(rnd)
+    for i in range(1, rnd.randint(1, 6) + 1):
+        aerolinea = rnd.choice(AEROLINEAS)
+        origen, destino = rnd.sample(CIUDADES, 2)
+        partes.append(
+            f"{aerolinea} {rnd.randint(10, 9999)}{rnd.choice('YBMHKLQ')} {_fecha_gds(rnd)} "
+            f"{rnd.randint(1, 7)} {origen}{destino} HK{rnd.randint(1, 4)}  "
+            f"{rnd.randint(0, 23):02d}{rnd.choice(['00', '15', '30', '45'])}  /DC{aerolinea}*{rnd.randint(100000, 999999)} /E"
+        )
+        if rnd.random() < 0.15:
+            partes.append(f"OPERATED BY /{rnd.choice(NOMBRES_AEROLINEA)}")
+    if rnd.random() < 0.6:
+        partes.append(f"SSR CTCM {rnd.choice(AEROLINEAS)} HK1/{_telefono(rnd)}")
+    if rnd.random() < 0.3:
+        partes.append(f"{_telefono(rnd)}-M")
+    if rnd.random() < 0.2:
+        partes.append(f"{_telefono(rnd)} -B")
+    partes.append(f"TKT/TIME LIMIT 7T/{_fecha_gds(rnd)}")
+    # Remarks: volumen variable que domina el tamaño del registro
+    for _ in range(rnd.randint(2, 25)):
+        partes.append(f"RM *{rnd.choice(['FACT', 'CC', 'MKUP', 'DK', 'PCC'])}/{rnd.randint(0, 10 ** 8)}")
+    if rnd.random() < 0.7:
+        partes.append(f"RM ASESOR/{_asesor(rnd)}")
+    elif rnd.random() < 0.5:
+        partes.append(f"RM XNET-EMISOR/{_asesor(rnd)}")
+    return ";".join(partes)
+
+
+def pnr_amadeus(rnd: random.Random) -> str:
+    partes = [f"RP/BOG1S21{rnd.randint(10, 99)}/BOG1S21{rnd.randint(10, 99)}"]
+    partes += [f"  {p}" for p in _pasajeros(rnd)]
+    for i in range(1, rnd.randint(1, 5) + 1):
+        origen, destino = rnd.sample(CIUDADES, 2)
+        partes.append(
+            f"{rnd.choice(AEROLINEAS)} {rnd.randint(1000, 9999)} {rnd.choice('YBMHKLQ')} "
+            f"{rnd.choice(DIAS) if rnd.random() < 0.7 else ''}{_fecha_gds(rnd)} "
+            f"{rnd.randint(1, 7)} {origen}{destino} HK1 {rnd.randint(0, 2359):04d} {rnd.randint(0, 2359):04d}"
+        )
+    if rnd.random() < 0.7:
+        partes.append(f"AP BOG M-{_telefono(rnd)}")
+    if rnd.random() < 0.4:
+        partes.append(f"SSR CTCM {rnd.choice(AEROLINEAS)} HK1/{_telefono(rnd)}")
+    partes.append(f"TK OK{_fecha_gds(rnd)}/BOG1S21{rnd.randint(10, 99)}")
+    for _ in range(rnd.randint(1, 15)):
+        partes.append(f"RM {rnd.choice(['FP CASH', 'FE PAX NONREF', 'TKT CHG', 'FV AV'])} {rnd.randint(0, 10 ** 6)}")
+    if rnd.random() < 0.6:
+        partes.append(f"AITAN{rnd.choice(APELLIDOS)}{rnd.randint(1, 99)}")
+    return ";".join(partes)
+
+
+def pnr_xml(rnd: random.Random) -> str:
+    segmentos = "".join(
+        f"<segmento><ds_origen>{o}</ds_origen><ds_destino>{d}</ds_destino>"
+        f"<ds_vuelo>{rnd.randint(10, 9999)}</ds_vuelo></segmento>"
+        for o, d in (rnd.sample(CIUDADES, 2) for _ in range(rnd.randint(1, 4)))
+    )
+    telefono = f"<ds_pax_telefono>{_telefono(rnd)}</ds_pax_telefono>" if rnd.random() < 0.85 else ""
+    return (
+        f"<reserva><ds_aero_code>{rnd.choice(AEROLINEAS)}</ds_aero_code>{telefono}"
+        f"<ds_pax>{rnd.choice(APELLIDOS)}/{rnd.choice(NOMBRES)}</ds_pax>{segmentos}</reserva>"
+    )
+
+
+def pnr_manual(rnd: random.Random) -> str:
+    partes = ["REGISTRO MANUAL KONTROL", f"PAX {rnd.choice(APELLIDOS)} {rnd.choice(NOMBRES)}"]
+    if rnd.random() < 0.8:
+        partes.append(f"A-{rnd.choice(NOMBRES_AEROLINEA).split()[0]}")
+    if rnd.random() < 0.8:
+        partes.append(f"Telepax: {_telefono(rnd)}")
+    if rnd.random() < 0.5:
+        partes.append(f"OBS {rnd.choice(['SILLA DE RUEDAS', 'MENOR NO ACOMPAÑADO', 'SIN EQUIPAJE'])}")
+    if rnd.random() < 0.5:
+        partes.append(f"RM ASESOR/{_asesor(rnd)}")
+    return ";".join(partes)
+
+
+GENERADORES = {"sabre": pnr_sabre, "amadeus": pnr_amadeus, "xml": pnr_xml, "manual": pnr_manual}
+
+
+def generar_pnrs(total: int, semilla: int = 42, mezcla: dict = None) -> list:
+    """[(formato, ds_PNR)] con la mezcla de formatos indicada"""
+    rnd = random.Random(semilla)
+    mezcla = mezcla or MEZCLA
+    formatos = list(mezcla)
+    pesos = [mezcla[f] for f in formatos]
+    registros = []
+    for _ in range(total):
+        formato = rnd.choices(formatos, pesos)[0]
+        registros.append((formato, GENERADORES[formato](rnd)))
+    return registros
+
+
+def generar_nombres(total: int, semilla: int = 42) -> list:
+    rnd = random.Random(semilla)
+    nombres = []
+    for _ in range(total):
+        partes = [rnd.choice(NOMBRES) for _ in range(rnd.randint(1, 2))]
+        if rnd.random() < 0.6:
+            partes.append(rnd.choice(PREFIJOS))
+        if rnd.random() < 0.2:
+            partes.insert(0, rnd.choice(PREFIJOS).lower())
+        nombres.append("  ".join(partes) if rnd.random() < 0.3 else " ".join(partes))
+    return nombres
+
+
+def generar_fechas(total: int, semilla: int = 42) -> list:
+    """[(formato, valor)]: datetime de pyodbc, ISO, texto SQL Server ('Sep 30 2025 12:55PM') e inválidas"""
+    rnd = random.Random(semilla)
+    base = datetime(2025, 1, 1)
+    fechas = []
+    for _ in range(total):
+        valor = base + timedelta(minutes=rnd.randint(0, 60 * 24 * 365))
+        formato = rnd.choices(["datetime", "iso", "texto", "invalida"], [0.5, 0.25, 0.2, 0.05])[0]
+        if formato == "iso":
+            valor = valor.isoformat(sep=" ")
+        elif formato == "texto":
+            valor = valor.strftime("%b %d %Y %I:%M%p")
+        elif formato == "invalida":
+            valor = rnd.choice(["", "N/A", "31/02/2025", "PENDIENTE"])
+        fechas.append((formato, valor))
+    return fechas
@@ -0,0 +1,147 @@
+"""
+Generador de datos para la base local (db_local / DB_BACKEND=sqlite).
+
+Crea tiquetes IDA (y REG para los viajes de ida y regreso) con fechas
+concentradas alrededor de hoy, PNR del corpus sintético, tiqueteadores y
+usuarios de prueba.
+
+    cd src/services
+    python -m benchmarks.generar_datos --ruta kontrol_local.sqlite3 --tiquetes 20000
+"""
+import argparse
+import hashlib
+import os
+import random
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import db_local
+from benchmarks.corpus import AEROLINEAS, APELLIDOS, CIUDADES, MESES, NOMBRES, PREFIJOS, generar_pnrs
+
+SUCURSALES = ["I0W3", "NT3H", "MZ4C", "7C0A", "7OMF", "W5AA", "MANUAL"]
+IDEN_GDS = {"sabre": "1", "amadeus": "2", "xml": "1", "manual": "8"}
+CLAVE_PRUEBA = "kontrol123"
+
+COLUMNAS = [
+    "id_documento", "ds_records", "ds_paxname", "ds_paxprefix", "ds_paxape", "iden_gds", "ds_PNR",
+    "cd_sucursal", "id_tiqueteador", "ds_itinerario", "{fecha}", "id_asesor", "id_observacion",
+    "id_silla", "id_cuenta", "id_estado", "id_hora", "id_atencion",
+]
+
+
+def _fecha_vuelo(rnd: random.Random, hoy: date, dias_atras: int, dias_adelante: int) -> datetime:
+    # La mitad del volumen cae en la ventana de trabajo (ayer, hoy, mañana)
+    if rnd.random() < 0.5:
+        dias = rnd.randint(-1, 1)
+    else:
+        dias = rnd.randint(-dias_atras, dias_adelante)
+    return datetime.combine(hoy + timedelta(days=dias), datetime.min.time()) + timedelta(minutes=rnd.randint(300, 1380))
+
+
+def _itinerario(rnd: random.Random, salida: datetime, origen: str, destino: str) -> str:
+    """Segmentos 'AV9350 BOG-MDE 15OCT 06:00' separados por ' / ' (con escala a veces)"""
+    escalas = [origen, destino] if rnd.random() < 0.8 else [origen, rnd.choice([c for c in CIUDADES if c not in (origen, destino)]), destino]
+    segmentos = []
+    hora = salida
+    for desde, hasta in zip(escalas, escalas[1:]):
+        segmentos.append(
+            f"{rnd.choice(AEROLINEAS[:5])}{rnd.randint(10, 9999)} {desde}-{hasta} "
+            f"{hora.day:02d}{MESES[hora.month - 1]} {hora:%H:%M}"
+        )
+        hora += timedelta(hours=rnd.randint(2, 5))
+    return " / ".join(segmentos)
+
+
+def _fila(rnd, id_documento, pasajero, pnr, formato, salida, origen, destino, asesores, tiqueteadores, hoy):
+    nombre, apellido, prefijo = pasajero
+    procesado = salida.date() < hoy and rnd.random() < 0.9 or salida.date() == hoy and rnd.random() < 0.4
+    asesor = rnd.choice(asesores) if procesado else None
+    return (
+        id_documento,
+        "".join(rnd.choice("ABCDEFGHJKLMNPQRSTUVWXYZ") for _ in range(6)),
+        f"{nombre} {prefijo}",
+        prefijo,
+        apellido,
+        IDEN_GDS[formato],
+        pnr,
+        "MANUAL" if formato == "manual" else rnd.choice(SUCURSALES[:-1]),
+        rnd.choice(tiqueteadores),
+        _itinerario(rnd, salida, origen, destino),
+        salida.strftime("%Y-%m-%d %H:%M:%S"),
+        asesor,
+        rnd.choice([None, None, "SIN NOVEDAD", "CAMBIO DE SILLA", "EQUIPAJE ADICIONAL"]) if procesado else None,
+        f"{rnd.randint(1, 40)}{rnd.choice('ABCDEF')}" if procesado else None,
+        str(rnd.randint(1000, 9999)) if procesado else None,
+        "Procesado" if procesado else "Pendiente",
+        f"{rnd.randint(5, 22):02d}:{rnd.randint(0, 59):02d}" if procesado else None,
+        rnd.choice(["Presencial", "Presencial", "Virtual"]),
+    )
+
+
+def generar(ruta: str, tiquetes: int = 20000, semilla: int = 42, dias_atras: int = 120, dias_adelante: int = 30,
+            asesores: int = 25, hoy: date = None) -> dict:
+    rnd = random.Random(semilla)
+    hoy = hoy or date.today()
+    db_local.crear_esquema(ruta)
+    conn = sqlite3.connect(ruta)
+
+    tiqueteadores = [f"T{i:03d}" for i in range(1, 41)]
+    conn.executemany(
+        "INSERT OR REPLACE INTO Tiqueteadores (cd_codigo, ds_nombre) VALUES (?, ?)",
+        [(cd, f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}") for cd in tiqueteadores]
+    )
+
+    clave = hashlib.sha256(CLAVE_PRUEBA.encode("utf-8")).digest()
+    correos = ["admin@kontrol.local"] + [f"asesor{i}@kontrol.local" for i in range(1, asesores + 1)]
+    conn.executemany(
+        "INSERT OR REPLACE INTO usuarios (email, nombre_completo, rol, [contraseña]) VALUES (?, ?, ?, ?)",
+        [(correo, correo.split("@")[0].upper(), "admin" if i == 0 else "asesor", clave) for i, correo in enumerate(correos)]
+    )
+    nombres_asesor = [correo.split("@")[0].upper() for correo in correos[1:]]
+
+    columnas_ida = ", ".join(c.format(fecha="dt_salida") for c in COLUMNAS)
+    columnas_reg = ", ".join(c.format(fecha="dt_llegada") for c in COLUMNAS)
+    marcadores = ", ".join("?" for _ in COLUMNAS)
+    filas_ida, filas_reg = [], []
+
+    for i, (formato, pnr) in enumerate(generar_pnrs(tiquetes, semilla)):
+        id_documento = f"729{semilla % 100:02d}{i:08d}"
+        pasajero = (rnd.choice(NOMBRES), rnd.choice(APELLIDOS), rnd.choice(PREFIJOS[:4]))
+        origen, destino = rnd.sample(CIUDADES, 2)
+        salida = _fecha_vuelo(rnd, hoy, dias_atras, dias_adelante)
+        filas_ida.append(_fila(rnd, id_documento, pasajero, pnr, formato, salida, origen, destino,
+                               nombres_asesor, tiqueteadores, hoy))
+        if rnd.random() < 0.6:
+            regreso = salida + timedelta(days=rnd.randint(2, 15), hours=rnd.randint(-6, 6))
+            filas_reg.append(_fila(rnd, id_documento, pasajero, pnr, formato, regreso, destino, origen,
+                                   nombres_asesor, tiqueteadores, hoy))
+
+    conn.executemany(f"INSERT OR REPLACE INTO VueloIDA ({columnas_ida}) VALUES ({marcadores})", filas_ida)
+    conn.executemany(f"INSERT OR REPLACE INTO VueloREG ({columnas_reg}) VALUES ({marcadores})", filas_reg)
+    conn.commit()
+    conn.close()
+    return {"ida": len(filas_ida), "reg": len(filas_reg), "usuarios": len(correos), "tiqueteadores": len(tiqueteadores)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera la base SQLite local con datos de prueba")
+    parser.add_argument("--ruta", default=os.getenv("DB_SQLITE_RUTA", "kontrol_local.sqlite3"))
+    parser.add_argument("--tiquetes", type=int, default=20000)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--dias-atras", type=int, default=120)
+    parser.add_argument("--dias-adelante", type=int, default=30)
+    parser.add_argument("--asesores", type=int, default=25)
+    parser.add_argument("--reemplazar", action="store_true", help="borra la base existente antes de generar")
+    args = parser.parse_args(argv)
+
+    if args.reemplazar:
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(args.ruta + sufijo):
+                os.remove(args.ruta + sufijo)
+
+    resultado = generar(args.ruta, args.tiquetes, args.semilla, args.dias_atras, args.dias_adelante, args.asesores)
+    print(f"{args.ruta}: {resultado} (clave de los usuarios: {CLAVE_PRUEBA})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Percentiles y tablas de latencia compartidos por las herramientas de benchmarks.
+"""
+
+
+def percentil(ordenados: list, p: float) -> float:
+    """Percentil p (0-100) por interpolación lineal sobre una lista ya ordenada"""
+    if not ordenados:
+        return 0.0
+    posicion = (len(ordenados) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicion - inferior)
+
+
+def resumen_latencias(latencias_ms: list) -> dict:
+    ordenados = sorted(latencias_ms)
+    return {
+        "n": len(ordenados),
+        "promedio": sum(ordenados) / len(ordenados) if ordenados else 0.0,
+        "p50": percentil(ordenados, 50),
+        "p95": percentil(ordenados, 95),
+        "p99": percentil(ordenados, 99),
+        "max": ordenados[-1] if ordenados else 0.0,
+    }
+
+
+def imprimir_tabla(filas: dict, extra: dict = None):
+    """filas: {nombre: resumen_latencias(...)}; extra: {nombre: {columna: valor}} opcional"""
+    columnas_extra = sorted({c for valores in (extra or {}).values() for c in valores})
+    ancho = max([24] + [len(nombre) + 2 for nombre in filas])
+    encabezado = f"{'':<{ancho}}{'n':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(encabezado + "".join(f"{c:>10}" for c in columnas_extra))
+    for nombre, r in filas.items():
+        linea = f"{nombre:<{ancho}}{r['n']:>8}{r['p50']:>10.1f}{r['p95']:>10.1f}{r['p99']:>10.1f}{r['max']:>10.1f}"
+        print(linea + "".join(f"{(extra or {}).get(nombre, {}).get(c, ''):>10}" for c in columnas_extra))
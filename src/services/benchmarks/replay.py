@@ -0,0 +1,271 @@
+"""
+Reproduce una captura de tráfico real (CAPTURA_TRAFICO_HABILITADA, ver
+captura_trafico.py) contra una instancia y compara distribuciones de latencia
+entre builds.
+
+Las peticiones salen con los intervalos de la captura divididos por --velocidad
+(2 = el doble de rápido, 0 = sin esperas). La latencia se mide desde el momento
+programado, así un cliente atrasado no esconde la cola que se formó en el
+servidor. Los valores redactados de búsquedas se reemplazan por nombres de
+pasajero de la instancia destino con la misma longitud; el resto por "x". Los
+logins capturados responden 401 porque la clave no se guarda.
+
+Sin --url levanta uvicorn contra la base SQLite local, igual que carga.py.
+
+    cd src/services
+    python -m benchmarks.replay captura_trafico_*.jsonl* --url http://127.0.0.1:8000 --json build_a.json
+    python -m benchmarks.replay captura_trafico_*.jsonl* --url http://127.0.0.1:8000 --comparar build_a.json
+    python -m benchmarks.replay --reporte build_b.json --comparar build_a.json
+
+Código de salida 1 si algún p95 empeora más de --tolerancia contra --comparar.
+"""
+import argparse
+import glob
+import http.client
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from benchmarks.carga import Cliente, levantar_api
+from benchmarks.medicion import imprimir_tabla, resumen_latencias
+
+RE_REDACTADO = re.compile(r"^<redactado:(\d+)>$")
+METODOS_LECTURA = {"GET", "HEAD"}
+
+
+def cargar_trazas(patrones: list, solo_lectura: bool = False, limite: int = None) -> list:
+    """Trazas de uno o varios archivos (incluidos los rotados) ordenadas por ts"""
+    trazas = []
+    rutas = sorted({ruta for patron in patrones for ruta in (glob.glob(patron) or [patron])})
+    for ruta in rutas:
+        with open(ruta, encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    traza = json.loads(linea)
+                except ValueError:
+                    continue
+                if "ts" not in traza or "path" not in traza:
+                    continue
+                if solo_lectura and traza.get("metodo") not in METODOS_LECTURA:
+                    continue
+                trazas.append(traza)
+    trazas.sort(key=lambda t: t["ts"])
+    return trazas[:limite] if limite else trazas
+
+
+class Sustitutos:
+    """Reemplazo de valores redactados por textos de la misma longitud"""
+
+    def __init__(self, textos: list, semilla: int = 42):
+        self.textos = [t for t in textos if t] or ["x"]
+        self._rnd = random.Random(semilla)
+
+    def valor(self, clave: str, valor):
+        if isinstance(valor, list):
+            return [self.valor(clave, v) for v in valor]
+        if isinstance(valor, dict):
+            return {k: self.valor(k, v) for k, v in valor.items()}
+        redactado = RE_REDACTADO.match(valor) if isinstance(valor, str) else None
+        if redactado is None:
+            return valor
+        longitud = int(redactado.group(1))
+        if clave == "q":
+            texto = self._rnd.choice(self.textos)
+            return texto[:longitud] if len(texto) >= longitud else texto
+        return "x" * longitud
+
+    def peticion(self, traza: dict) -> tuple:
+        """(método, ruta con query, cuerpo, reproducible)"""
+        params = self.valor(None, traza.get("params") or {})
+        ruta = traza["path"]
+        if params:
+            ruta += "?" + urlencode(params, doseq=True)
+        cuerpo = traza.get("cuerpo")
+        if isinstance(cuerpo, dict) and "_omitido_bytes" in cuerpo:
+            # Cuerpo grande no capturado: se omite la petición
+            return traza["metodo"], ruta, None, False
+        return traza["metodo"], ruta, self.valor(None, cuerpo) if cuerpo is not None else None, True
+
+
+def reproducir(url: str, trazas: list, sustitutos: Sustitutos, velocidad: float = 1.0,
+               concurrencia: int = 64, timeout: float = 30) -> dict:
+    """{"muestras": {"MÉTODO ruta": [(ms, status, status_capturado, ms_capturado)]}, ...}"""
+    muestras = {}
+    lock = threading.Lock()
+    local = threading.local()
+    omitidas = 0
+    atraso_max = 0.0
+
+    def enviar(traza: dict, programado: float, metodo: str, ruta: str, cuerpo):
+        cliente = getattr(local, "cliente", None)
+        if cliente is None:
+            cliente = local.cliente = Cliente(url, timeout)
+        try:
+            status, _ = cliente.pedir(metodo, ruta, cuerpo)
+        except (OSError, http.client.HTTPException):
+            status = 0
+        ms = (time.perf_counter() - programado) * 1000
+        clave = f"{metodo} {traza.get('ruta') or traza['path']}"
+        with lock:
+            muestras.setdefault(clave, []).append((ms, status, traza.get("status"), traza.get("ms")))
+
+    if not trazas:
+        return {"muestras": muestras, "segundos": 0.0, "omitidas": 0, "atraso_max_ms": 0.0}
+
+    ts_inicial = trazas[0]["ts"]
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix="replay") as ejecutor:
+        for traza in trazas:
+            metodo, ruta, cuerpo, reproducible = sustitutos.peticion(traza)
+            if not reproducible:
+                omitidas += 1
+                continue
+            programado = inicio + (traza["ts"] - ts_inicial) / velocidad if velocidad > 0 else time.perf_counter()
+            espera = programado - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            else:
+                atraso_max = max(atraso_max, -espera * 1000)
+            ejecutor.submit(enviar, traza, programado, metodo, ruta, cuerpo)
+    return {
+        "muestras": muestras,
+        "segundos": time.perf_counter() - inicio,
+        "omitidas": omitidas,
+        "atraso_max_ms": atraso_max,
+    }
+
+
+def reporte(resultado: dict, velocidad: float) -> dict:
+    rutas, captura, extra = {}, {}, {}
+    todas, todas_captura = [], []
+    for clave, muestras in sorted(resultado["muestras"].items()):
+        latencias = [m[0] for m in muestras]
+        capturadas = [m[3] for m in muestras if m[3] is not None]
+        todas.extend(latencias)
+        todas_captura.extend(capturadas)
+        rutas[clave] = resumen_latencias(latencias)
+        captura[clave] = resumen_latencias(capturadas)
+        extra[clave] = {
+            "errores": sum(1 for m in muestras if m[1] == 0 or m[1] >= 500),
+            # Respuestas con otro status que en la captura (datos distintos, 401 de login...)
+            "distinto": sum(1 for m in muestras if m[2] is not None and m[1] != m[2]),
+        }
+    rutas["TOTAL"] = resumen_latencias(todas)
+    captura["TOTAL"] = resumen_latencias(todas_captura)
+    extra["TOTAL"] = {c: sum(e[c] for e in extra.values()) for c in ("errores", "distinto")}
+    return {
+        "rutas": rutas,
+        "captura": captura,
+        "errores": extra,
+        "peticiones": len(todas),
+        "omitidas": resultado["omitidas"],
+        "velocidad": velocidad,
+        "segundos": resultado["segundos"],
+        "rps": len(todas) / resultado["segundos"] if resultado["segundos"] else 0.0,
+        "atraso_max_ms": resultado["atraso_max_ms"],
+    }
+
+
+def comparar(actual: dict, base: dict, tolerancia: float) -> list:
+    """[(ruta, columna, base, actual)] de los p95 que empeoraron más de `tolerancia`"""
+    regresiones = []
+    for clave, resumen in actual["rutas"].items():
+        referencia = base["rutas"].get(clave)
+        if referencia and referencia["p95"] and resumen["p95"] > referencia["p95"] * (1 + tolerancia):
+            regresiones.append((clave, "p95", referencia["p95"], resumen["p95"]))
+    return regresiones
+
+
+def imprimir_comparacion(actual: dict, base: dict):
+    ancho = max([24] + [len(c) + 2 for c in actual["rutas"]])
+    print(f"{'':<{ancho}}" + "".join(f"{c:>18}" for c in ("p50 ms", "p95 ms", "p99 ms")))
+    for clave, resumen in actual["rutas"].items():
+        referencia = base["rutas"].get(clave)
+        if referencia is None:
+            continue
+        celdas = []
+        for columna in ("p50", "p95", "p99"):
+            cambio = (resumen[columna] / referencia[columna] - 1) * 100 if referencia[columna] else 0.0
+            celdas.append(f"{referencia[columna]:.0f}->{resumen[columna]:.0f} {cambio:+.0f}%")
+        print(f"{clave:<{ancho}}" + "".join(f"{c:>18}" for c in celdas))
+
+
+def textos_de_busqueda(url: str) -> list:
+    status, muestra = Cliente(url, 60).pedir("GET", "/TiquetesDocumentos?limit=1000&fields=ds_paxname")
+    if status != 200 or not muestra:
+        return []
+    return [t.get("ds_paxname") or t["cd_tiquete"] for t in muestra["tiquetes"]]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trazas", nargs="*", help="archivos de captura (acepta comodines y los rotados .1, .2...)")
+    parser.add_argument("--url", help="instancia destino (por defecto se levanta una contra la base local)")
+    parser.add_argument("--db", default=os.getenv("DB_SQLITE_RUTA", "kontrol_local.sqlite3"))
+    parser.add_argument("--puerto", type=int, default=8766)
+    parser.add_argument("--velocidad", type=float, default=1.0, help="factor sobre los intervalos capturados (0 = sin esperas)")
+    parser.add_argument("--concurrencia", type=int, default=64, help="peticiones simultáneas máximas del cliente")
+    parser.add_argument("--limite", type=int, help="reproduce solo las primeras N trazas")
+    parser.add_argument("--solo-lectura", action="store_true", help="omite POST/PUT (instancias con datos reales)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--json", help="guarda el reporte en este archivo")
+    parser.add_argument("--reporte", help="reporte ya guardado a comparar en lugar de reproducir")
+    parser.add_argument("--comparar", help="reporte de otro build contra el que se compara")
+    parser.add_argument("--tolerancia", type=float, default=0.10, help="aumento de p95 permitido (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    if args.reporte:
+        with open(args.reporte, encoding="utf-8") as f:
+            datos = json.load(f)
+    else:
+        trazas = cargar_trazas(args.trazas, args.solo_lectura, args.limite)
+        if not trazas:
+            print("No hay trazas para reproducir")
+            return 1
+        proceso = None
+        url = args.url
+        if url is None:
+            if not os.path.exists(args.db):
+                print(f"No existe {args.db}: genere los datos con python -m benchmarks.generar_datos")
+                return 1
+            proceso = levantar_api(args.puerto, os.path.abspath(args.db))
+            url = f"http://127.0.0.1:{args.puerto}"
+        try:
+            sustitutos = Sustitutos(textos_de_busqueda(url), args.semilla)
+            resultado = reproducir(url, trazas, sustitutos, args.velocidad, args.concurrencia)
+        finally:
+            if proceso is not None:
+                proceso.terminate()
+                proceso.wait(10)
+        datos = reporte(resultado, args.velocidad)
+
+    print("Replay")
+    imprimir_tabla(datos["rutas"], datos["errores"])
+    print("\nCaptura original")
+    imprimir_tabla(datos["captura"])
+    print(f"\n{datos['peticiones']} peticiones ({datos['omitidas']} omitidas) en {datos['segundos']:.1f} s "
+          f"a velocidad x{datos['velocidad']}: {datos['rps']:.1f} req/s, atraso máximo del cliente {datos['atraso_max_ms']:.0f} ms")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=1)
+
+    if not args.comparar:
+        return 0
+    with open(args.comparar, encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"\nContra {args.comparar}")
+    imprimir_comparacion(datos, base)
+    regresiones = comparar(datos, base, args.tolerancia)
+    for clave, columna, referencia, valor in regresiones:
+        print(f"REGRESIÓN: {clave} {columna} {referencia:.1f} -> {valor:.1f} ms")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
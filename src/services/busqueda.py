@@ -0,0 +1,112 @@
+"""
+Índice invertido de trigramas en memoria para la búsqueda libre de tiquetes.
+
+Indexa cd_tiquete, nombres, ds_records y ds_itinerario de los tiquetes activos y
+responde búsquedas por similitud sin tocar SQL Server (un LIKE '%x%' sería un
+full scan de ambas tablas).
+"""
+import threading
+import unicodedata
+from collections import Counter
+
+CAMPOS_INDEXADOS = ("cd_tiquete", "ds_paxname", "ds_paxape", "ds_records", "ds_itinerario")
+
+
+def normalizar(texto) -> str:
+    """Minúsculas, sin tildes y con espacios simples"""
+    if not texto:
+        return ""
+    texto = unicodedata.normalize("NFKD", str(texto).lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.split())
+
+
+def trigramas(texto: str) -> set:
+    grams = set()
+    for palabra in texto.split():
+        palabra = f"  {palabra} "
+        for i in range(len(palabra) - 2):
+            grams.add(palabra[i:i + 3])
+    return grams
+
+
+class IndiceTrigramas:
+    def __init__(self, similitud_minima: float = 0.5):
+        self.similitud_minima = similitud_minima
+        self._lock = threading.RLock()
+        self._docs = {}
+        self._postings = {}
+
+    def __len__(self):
+        return len(self._docs)
+
+    def agregar(self, clave, campos: dict, resumen: dict):
+        """Indexa (o reindexa) un documento; `resumen` es lo que se devuelve al buscar"""
+        texto = normalizar(" ".join(str(campos.get(c) or "") for c in CAMPOS_INDEXADOS))
+        grams = trigramas(texto)
+        with self._lock:
+            self.quitar(clave)
+            self._docs[clave] = {
+                "texto": texto,
+                "cd": normalizar(campos.get("cd_tiquete")),
+                "grams": grams,
+                "resumen": resumen,
+            }
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(clave)
+
+    def actualizar_resumen(self, clave, **cambios) -> bool:
+        """Actualiza campos no indexados (estado, asesor...) sin reindexar"""
+        with self._lock:
+            doc = self._docs.get(clave)
+            if doc is None:
+                return False
+            doc["resumen"].update(cambios)
+            return True
+
+    def quitar(self, clave):
+        with self._lock:
+            doc = self._docs.pop(clave, None)
+            if doc is None:
+                return
+            for gram in doc["grams"]:
+                claves = self._postings.get(gram)
+                if claves is not None:
+                    claves.discard(clave)
+                    if not claves:
+                        del self._postings[gram]
+
+    def buscar(self, consulta: str, limite: int = 20) -> list:
+        """Devuelve [(puntaje, resumen)] ordenado por relevancia"""
+        q = normalizar(consulta)
+        if not q:
+            return []
+        grams_q = trigramas(q)
+
+        with self._lock:
+            if len(q) < 3:
+                # Consultas muy cortas: coincidencia por prefijo del código o subcadena
+                candidatos = {clave: 1.0 for clave, doc in self._docs.items() if q in doc["texto"]}
+            else:
+                conteo = Counter()
+                for gram in grams_q:
+                    conteo.update(self._postings.get(gram, ()))
+                candidatos = {
+                    clave: n / len(grams_q)
+                    for clave, n in conteo.items()
+                    if n / len(grams_q) >= self.similitud_minima
+                }
+
+            resultados = []
+            for clave, puntaje in candidatos.items():
+                doc = self._docs[clave]
+                if q in doc["texto"]:
+                    puntaje += 1.0
+                if doc["cd"] == q:
+                    puntaje += 2.0
+                elif doc["cd"].startswith(q):
+                    puntaje += 1.0
+                resultados.append((round(puntaje, 3), clave))
+
+            resultados.sort(key=lambda r: r[0], reverse=True)
+            return [(puntaje, dict(self._docs[clave]["resumen"])) for puntaje, clave in resultados[:limite]]
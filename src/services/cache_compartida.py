@@ -0,0 +1,192 @@
+"""
+Caché compartida entre workers (uvicorn/gunicorn) sobre SQLite en modo WAL.
+
+Cada entrada pertenece a un espacio ("tiquetes", "catalogos"...) y se guarda con
+la versión del espacio vigente al momento de cargarla. Invalidar un espacio
+incrementa su versión en el archivo compartido, de modo que todos los workers
+dejan de usar las entradas anteriores sin necesidad de avisarse entre sí. Las
+entradas viejas no se borran al invalidar: quedan para obtener_vencido() hasta
+que llevan CACHE_COMPARTIDA_RETENCION_SEG vencidas.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger("kontrol.cache")
+
+
+def ruta_por_defecto() -> str:
+    """
+    Archivo de caché propio de la base configurada: dos instancias en la misma
+    máquina contra bases distintas no deben compartir (ni invalidarse) entradas.
+    """
+    if os.getenv("DB_BACKEND", "sqlserver").lower() == "sqlite":
+        origen = os.path.abspath(os.getenv("DB_SQLITE_RUTA", "kontrol_local.sqlite3"))
+    else:
+        origen = f"{os.getenv('DB_SERVER') or ''}/{os.getenv('DB_DATABASE') or ''}".lower()
+    sufijo = hashlib.sha256(origen.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"kontrol_cache_{sufijo}.sqlite3")
+
+
+CACHE_COMPARTIDA_RUTA = os.getenv("CACHE_COMPARTIDA_RUTA") or ruta_por_defecto()
+CACHE_COMPARTIDA_TTL_SEG = float(os.getenv("CACHE_COMPARTIDA_TTL_SEG", "30"))
+# Tiempo que una entrada vencida sigue disponible como respaldo (obtener_vencido)
+CACHE_COMPARTIDA_RETENCION_SEG = float(os.getenv("CACHE_COMPARTIDA_RETENCION_SEG", "3600"))
+CACHE_COMPARTIDA_HABILITADA = os.getenv("CACHE_COMPARTIDA_HABILITADA", "true").lower() == "true"
+
+SQL_ESQUEMA = """
+    CREATE TABLE IF NOT EXISTS versiones (
+        espacio TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS entradas (
+        clave TEXT PRIMARY KEY,
+        espacio TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        valor TEXT NOT NULL,
+        expira REAL NOT NULL
+    );
+"""
+
+
+class CacheCompartida:
+    def __init__(self, ruta: str = CACHE_COMPARTIDA_RUTA, ttl: float = CACHE_COMPARTIDA_TTL_SEG,
+                 habilitada: bool = CACHE_COMPARTIDA_HABILITADA, retencion: float = CACHE_COMPARTIDA_RETENCION_SEG):
+        self.ruta = ruta
+        self.ttl = ttl
+        self.retencion = retencion
+        self.habilitada = habilitada
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+        self.errores = 0
+
+    def _conexion(self) -> sqlite3.Connection:
+        # sqlite3 no comparte conexiones entre hilos: una por hilo
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SQL_ESQUEMA)
+            self._local.conn = conn
+        return conn
+
+    def version(self, espacio: str) -> int:
+        row = self._conexion().execute(
+            "SELECT version FROM versiones WHERE espacio = ?", (espacio,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def version_actual(self, espacio: str):
+        """Versión del espacio sin lanzar errores (None si la caché no responde)"""
+        if not self.habilitada:
+            return 0
+        try:
+            return self.version(espacio)
+        except sqlite3.Error:
+            self._contar("errores")
+            return None
+
+    def obtener(self, espacio: str, clave: str, cargar, ttl: float = None):
+        """
+        Devuelve el valor cacheado para (espacio, clave) si sigue vigente; si no,
+        llama a cargar() y lo guarda. Cualquier falla de la caché cae a cargar().
+        """
+        if not self.habilitada:
+            return cargar()
+
+        clave = f"{espacio}:{clave}"
+        try:
+            conn = self._conexion()
+            version = self.version(espacio)
+            row = conn.execute(
+                "SELECT valor, version, expira FROM entradas WHERE clave = ?", (clave,)
+            ).fetchone()
+            if row and row[1] == version and row[2] > time.time():
+                self._contar("aciertos")
+                return json.loads(row[0])
+        except sqlite3.Error:
+            self._contar("errores")
+            logger.warning("Caché compartida no disponible; se consulta la fuente", exc_info=True)
+            return cargar()
+
+        self._contar("fallos")
+        valor = cargar()
+        try:
+            # Se guarda con la versión leída ANTES de cargar: si hubo una escritura
+            # durante la carga, la entrada nace vieja y no se sirve
+            conn.execute(
+                "INSERT OR REPLACE INTO entradas (clave, espacio, version, valor, expira) VALUES (?, ?, ?, ?, ?)",
+                (clave, espacio, version, json.dumps(valor, default=str),
+                 time.time() + (self.ttl if ttl is None else ttl))
+            )
+        except sqlite3.Error:
+            self._contar("errores")
+            logger.warning("No se pudo guardar en la caché compartida", exc_info=True)
+        return valor
+
+    def obtener_vencido(self, espacio: str, clave: str):
+        """
+        Último valor guardado aunque esté vencido o sea de una versión anterior
+        (para responder algo mientras la BD no está disponible). None si no hay.
+        """
+        if not self.habilitada:
+            return None
+        try:
+            row = self._conexion().execute(
+                "SELECT valor FROM entradas WHERE clave = ?", (f"{espacio}:{clave}",)
+            ).fetchone()
+        except sqlite3.Error:
+            self._contar("errores")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def invalidar(self, espacio: str):
+        """
+        Incrementa la versión del espacio: todos los workers ven el cambio y
+        obtener() deja de servir las entradas anteriores, que se conservan como
+        respaldo. Solo se borran las que llevan más de `retencion` vencidas.
+        """
+        if not self.habilitada:
+            return
+        try:
+            conn = self._conexion()
+            conn.execute("""
+                INSERT INTO versiones (espacio, version) VALUES (?, 1)
+                ON CONFLICT(espacio) DO UPDATE SET version = version + 1
+            """, (espacio,))
+            conn.execute("DELETE FROM entradas WHERE expira < ?", (time.time() - self.retencion,))
+            self._contar("invalidaciones")
+        except sqlite3.Error:
+            self._contar("errores")
+            logger.warning("No se pudo invalidar la caché compartida", exc_info=True, extra={"espacio": espacio})
+
+    def metricas(self) -> dict:
+        datos = {
+            "habilitada": self.habilitada,
+            "ruta": self.ruta,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "invalidaciones": self.invalidaciones,
+            "errores": self.errores,
+        }
+        if self.habilitada:
+            try:
+                conn = self._conexion()
+                datos["entradas"] = conn.execute("SELECT COUNT(*) FROM entradas").fetchone()[0]
+                datos["versiones"] = dict(conn.execute("SELECT espacio, version FROM versiones").fetchall())
+            except sqlite3.Error:
+                pass
+        return datos
+
+    def _contar(self, contador: str):
+        with self._lock:
+            setattr(self, contador, getattr(self, contador) + 1)
@@ -0,0 +1,184 @@
+"""
+Captura de tráfico real para reproducirlo después (benchmarks/replay.py).
+
+Con CAPTURA_TRAFICO_HABILITADA=true cada petición deja una línea JSON en un
+archivo rotativo: ruta, plantilla de la ruta, parámetros, cuerpo, status,
+duración hasta el último byte y tamaño de la respuesta. No se guardan headers
+(tokens de sesión) y los campos con datos personales (nombres, correos, claves,
+usuarios y asesores, texto libre, búsquedas) o credenciales (Authorization,
+valores "Bearer ...") se reemplazan por "<redactado:N>", con N la longitud del
+valor original, para que el replay pueda sustituirlos por textos del mismo
+tamaño.
+
+La escritura va por una cola propia con un hilo QueueListener, igual que el
+logging: la petición solo serializa y encola.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+
+CAPTURA_TRAFICO_HABILITADA = os.getenv("CAPTURA_TRAFICO_HABILITADA", "false").lower() == "true"
+# {pid} permite un archivo por worker; el replay los mezcla por timestamp
+CAPTURA_TRAFICO_RUTA = os.getenv("CAPTURA_TRAFICO_RUTA", "captura_trafico_{pid}.jsonl")
+CAPTURA_TRAFICO_MAX_MB = float(os.getenv("CAPTURA_TRAFICO_MAX_MB", "50"))
+CAPTURA_TRAFICO_RESPALDOS = int(os.getenv("CAPTURA_TRAFICO_RESPALDOS", "5"))
+CAPTURA_TRAFICO_MUESTREO = float(os.getenv("CAPTURA_TRAFICO_MUESTREO", "1"))
+CAPTURA_TRAFICO_CUERPO_MAX_BYTES = int(os.getenv("CAPTURA_TRAFICO_CUERPO_MAX_BYTES", "4096"))
+CAPTURA_TRAFICO_EXCLUIR = [
+    prefijo.strip() for prefijo in os.getenv("CAPTURA_TRAFICO_EXCLUIR", "/health,/ready,/admin/,/docs,/openapi.json").split(",")
+    if prefijo.strip()
+]
+
+# Parámetros y campos del cuerpo que pueden llevar datos personales o secretos
+CAMPOS_REDACTADOS = {
+    "q", "correo", "email", "usuario", "username", "password", "contraseña", "token",
+    "access_token", "authorization", "ds_paxname", "ds_paxape", "ds_records", "ds_pnr",
+    "ds_pax", "nombre_tiqueteador", "id_asesor", "id_observacion", "telefono",
+} | {c.strip().lower() for c in os.getenv("CAPTURA_TRAFICO_REDACTAR", "").split(",") if c.strip()}
+
+
+def redactar_valor(valor) -> str:
+    return f"<redactado:{len(str(valor))}>"
+
+
+def redactar(datos, clave: str = None):
+    """Copia de params/cuerpo con los campos sensibles reemplazados (recursivo)"""
+    if clave is not None and clave.lower() in CAMPOS_REDACTADOS and datos is not None:
+        if isinstance(datos, list):
+            return [redactar_valor(v) for v in datos]
+        return redactar_valor(datos)
+    if isinstance(datos, dict):
+        return {k: redactar(v, k) for k, v in datos.items()}
+    if isinstance(datos, list):
+        return [redactar(v) for v in datos]
+    if isinstance(datos, str) and datos[:7].lower() == "bearer ":
+        # Un token de sesión copiado en cualquier campo
+        return redactar_valor(datos)
+    return datos
+
+
+def parametros(pares: list) -> dict:
+    """Query string como {nombre: valor} o {nombre: [valores]} si se repite"""
+    resultado = {}
+    for nombre, valor in pares:
+        if nombre in resultado:
+            anterior = resultado[nombre]
+            resultado[nombre] = (anterior if isinstance(anterior, list) else [anterior]) + [valor]
+        else:
+            resultado[nombre] = valor
+    return redactar(resultado)
+
+
+def cuerpo_redactado(contenido: bytes):
+    """Cuerpo JSON redactado; si es grande o no es JSON solo se guarda su tamaño"""
+    if not contenido:
+        return None
+    if len(contenido) > CAPTURA_TRAFICO_CUERPO_MAX_BYTES:
+        return {"_omitido_bytes": len(contenido)}
+    try:
+        return redactar(json.loads(contenido))
+    except ValueError:
+        return {"_omitido_bytes": len(contenido)}
+
+
+class CapturaTrafico:
+    def __init__(self, ruta: str = CAPTURA_TRAFICO_RUTA, max_mb: float = CAPTURA_TRAFICO_MAX_MB,
+                 respaldos: int = CAPTURA_TRAFICO_RESPALDOS, muestreo: float = CAPTURA_TRAFICO_MUESTREO,
+                 excluir: list = None):
+        self.ruta = ruta.format(pid=os.getpid())
+        self.muestreo = muestreo
+        self.excluir = tuple(CAPTURA_TRAFICO_EXCLUIR if excluir is None else excluir)
+        self._lock = threading.Lock()
+        self.registradas = 0
+        self.omitidas = 0
+        self.errores = 0
+
+        archivo = logging.handlers.RotatingFileHandler(
+            self.ruta, maxBytes=int(max_mb * 1024 * 1024), backupCount=respaldos, encoding="utf-8"
+        )
+        archivo.setFormatter(logging.Formatter("%(message)s"))
+        cola = queue.SimpleQueue()
+        # Logger propio sin propagación: las trazas no deben llegar a la consola
+        self._logger = logging.getLogger(f"kontrol.captura.{id(self)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._logger.handlers = [logging.handlers.QueueHandler(cola)]
+        self._listener = logging.handlers.QueueListener(cola, archivo)
+        self._listener.start()
+        atexit.register(self.cerrar)
+
+    def capturar(self, path: str, metodo: str) -> bool:
+        """Decide antes de atender la petición si se registra (exclusiones y muestreo)"""
+        if metodo == "OPTIONS" or path.startswith(self.excluir):
+            return False
+        if self.muestreo < 1 and random.random() >= self.muestreo:
+            with self._lock:
+                self.omitidas += 1
+            return False
+        return True
+
+    def registrar(self, evento: dict):
+        try:
+            linea = json.dumps(evento, ensure_ascii=False, default=str)
+        except (TypeError, ValueError):
+            with self._lock:
+                self.errores += 1
+            return
+        self._logger.info(linea)
+        with self._lock:
+            self.registradas += 1
+
+    def cerrar(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                "ruta": self.ruta,
+                "muestreo": self.muestreo,
+                "registradas": self.registradas,
+                "omitidas": self.omitidas,
+                "errores": self.errores,
+            }
+
+
+async def contar_bytes(iterador, al_terminar):
+    """Reenvía el cuerpo de la respuesta contando bytes; al final llama al_terminar(total)"""
+    total = 0
+    try:
+        async for bloque in iterador:
+            total += len(bloque)
+            yield bloque
+    finally:
+        al_terminar(total)
+
+
+def nueva_traza(request, inicio: float, cuerpo: bytes) -> dict:
+    return {
+        "ts": round(inicio, 4),
+        "metodo": request.method,
+        "path": request.url.path,
+        "params": parametros(request.query_params.multi_items()),
+        "cuerpo": cuerpo_redactado(cuerpo),
+    }
+
+
+def completar_traza(traza: dict, request, response, ms: float, bytes_respuesta: int) -> dict:
+    ruta = request.scope.get("route")
+    traza.update({
+        # Plantilla (/TiquetesDocumentos/{cd_tiquete}) para agrupar en el replay
+        "ruta": getattr(ruta, "path", None) or traza["path"],
+        "status": response.status_code,
+        "ms": round(ms, 2),
+        "bytes": bytes_respuesta,
+        "request_id": response.headers.get("X-Request-ID"),
+    })
+    return traza
@@ -0,0 +1,83 @@
+"""
+Coalescencia de lecturas idénticas concurrentes (single-flight).
+
+Si llega una lectura con la misma clave que otra que todavía está en curso, no
+se ejecuta de nuevo: espera y comparte el resultado (o la excepción) de la
+primera. Limita la carga sobre SQL Server en los picos de cambio de turno.
+
+Cuando el resultado se comparte, cada llamada recibe su propia copia (deepcopy):
+los endpoints modifican las filas que reciben (superponer atenciones, mapear
+sucursal) y no deben pisarse entre sí.
+"""
+import copy
+import threading
+
+
+class _EnVuelo:
+    __slots__ = ("listo", "resultado", "error", "esperando")
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+        self.esperando = 0
+
+
+class Coalescedor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_vuelo = {}
+        self.ejecuciones = 0
+        self.colapsadas = 0
+        self.por_clave = {}
+
+    def ejecutar(self, clave: str, funcion):
+        """Ejecuta funcion() una sola vez por clave entre las llamadas simultáneas"""
+        with self._lock:
+            vuelo = self._en_vuelo.get(clave)
+            if vuelo is not None:
+                vuelo.esperando += 1
+                self.colapsadas += 1
+                self._contar(clave, "colapsadas")
+                lider = False
+            else:
+                vuelo = self._en_vuelo[clave] = _EnVuelo()
+                self.ejecuciones += 1
+                self._contar(clave, "ejecuciones")
+                lider = True
+
+        if not lider:
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return copy.deepcopy(vuelo.resultado)
+
+        try:
+            vuelo.resultado = funcion()
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            # Se retira antes de avisar: una llamada posterior ejecuta de nuevo
+            with self._lock:
+                del self._en_vuelo[clave]
+                compartido = vuelo.esperando > 0
+            vuelo.listo.set()
+        # Con esperas el original queda intacto para que ellas lo copien
+        return copy.deepcopy(vuelo.resultado) if compartido else vuelo.resultado
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                "ejecuciones": self.ejecuciones,
+                "colapsadas": self.colapsadas,
+                "en_curso": len(self._en_vuelo),
+                "esperando": sum(v.esperando for v in self._en_vuelo.values()),
+                "por_clave": {clave: dict(c) for clave, c in self.por_clave.items()},
+            }
+
+    def _contar(self, clave: str, contador: str):
+        # Agrupa por tipo de lectura (listado, estadisticas...) y no por parámetros
+        grupo = clave.split(":")[1] if ":" in clave else clave
+        conteo = self.por_clave.setdefault(grupo, {"ejecuciones": 0, "colapsadas": 0})
+        conteo[contador] += 1
@@ -0,0 +1,124 @@
+"""
+Conjunto de trabajo en memoria con los tiquetes de vuelos cercanos a hoy.
+
+Los asesores trabajan casi solo con vuelos de hoy y mañana: esos tiquetes se
+mantienen en memoria (ventana configurable) y el listado, el detalle y las
+estadísticas dentro de la ventana se responden sin ir a SQL Server.
+"""
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+CONJUNTO_DIAS_ATRAS = int(os.getenv("CONJUNTO_DIAS_ATRAS", "1"))
+CONJUNTO_DIAS_ADELANTE = int(os.getenv("CONJUNTO_DIAS_ADELANTE", "1"))
+
+
+def ventana_actual(hoy: date = None) -> tuple:
+    hoy = hoy or date.today()
+    return hoy - timedelta(days=CONJUNTO_DIAS_ATRAS), hoy + timedelta(days=CONJUNTO_DIAS_ADELANTE)
+
+
+class ConjuntoActivo:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # (cd_tiquete, tipo_vuelo) -> (fecha_vuelo, tiquete)
+        self._tiquetes = {}
+        # Tiquetes con REG en memoria que no tienen tramo IDA: su detalle es el REG
+        self._sin_ida = set()
+        self.desde = None
+        self.hasta = None
+        self.version = None
+        self.cargado_en = None
+        self.aciertos = 0
+        self.fallos = 0
+
+    def __len__(self):
+        return len(self._tiquetes)
+
+    def reemplazar(self, tiquetes: list, desde: date, hasta: date, version=None, sin_ida=()):
+        """tiquetes: lista de (fecha_vuelo, tiquete); sin_ida: códigos sin tramo IDA. Reemplaza el conjunto completo"""
+        nuevo = {(t["cd_tiquete"], t["tipo_vuelo"]): (fecha, t) for fecha, t in tiquetes}
+        with self._lock:
+            self._tiquetes = nuevo
+            self._sin_ida = set(sin_ida)
+            self.desde, self.hasta = desde, hasta
+            self.version = version
+            self.cargado_en = time.time()
+
+    def cubre(self, desde: date, hasta: date) -> bool:
+        """True si el rango [desde, hasta] cae completo dentro de la ventana cargada"""
+        return (
+            self.cargado_en is not None
+            and desde is not None and hasta is not None
+            and self.desde <= desde and hasta <= self.hasta
+        )
+
+    def guardar(self, fecha: date, tiquete: dict):
+        """Agrega o actualiza un tiquete; si quedó fuera de la ventana se retira"""
+        clave = (tiquete["cd_tiquete"], tiquete["tipo_vuelo"])
+        with self._lock:
+            if self.cargado_en is None:
+                return
+            if fecha is not None and self.desde <= fecha <= self.hasta:
+                self._tiquetes[clave] = (fecha, tiquete)
+            else:
+                self._tiquetes.pop(clave, None)
+
+    def actualizar(self, cd_tiquete: str, tipo_vuelo: str = None, **cambios):
+        """Aplica cambios de campos al tramo indicado (o a ambos) si está en memoria"""
+        with self._lock:
+            for tipo in (tipo_vuelo,) if tipo_vuelo else ("IDA", "REG"):
+                item = self._tiquetes.get((cd_tiquete, tipo))
+                if item is not None:
+                    self._tiquetes[(cd_tiquete, tipo)] = (item[0], {**item[1], **cambios})
+
+    def obtener(self, cd_tiquete: str):
+        """
+        Detalle por código (IDA primero, como en SQL); None si no está en memoria.
+        Un REG solo se devuelve si se sabe que el tiquete no tiene IDA: si la ida
+        cae fuera de la ventana, SQL devolvería la ida.
+        """
+        with self._lock:
+            item = self._tiquetes.get((cd_tiquete, "IDA"))
+            if item is None and cd_tiquete in self._sin_ida:
+                item = self._tiquetes.get((cd_tiquete, "REG"))
+            return dict(item[1]) if item is not None else None
+
+    def listar(self, desde: date, hasta: date, tipo_vuelo: str = None, limite: int = None) -> list:
+        """Tiquetes del rango ordenados por fecha de vuelo descendente"""
+        with self._lock:
+            items = [
+                (fecha, t) for fecha, t in self._tiquetes.values()
+                if desde <= fecha <= hasta and (tipo_vuelo is None or t["tipo_vuelo"] == tipo_vuelo)
+            ]
+        items.sort(key=lambda item: (item[0], item[1]["dt_salida"] or item[1]["dt_llegada"] or ""), reverse=True)
+        return [t for _, t in items[:limite]]
+
+    def estadisticas(self, desde: date, hasta: date) -> dict:
+        total = procesados = 0
+        with self._lock:
+            for fecha, t in self._tiquetes.values():
+                if desde <= fecha <= hasta:
+                    total += 1
+                    if t["id_asesor"] is not None:
+                        procesados += 1
+        return {"total": total, "pendientes": total - procesados, "procesados": procesados}
+
+    def contar(self, acierto: bool):
+        with self._lock:
+            if acierto:
+                self.aciertos += 1
+            else:
+                self.fallos += 1
+
+    def metricas(self) -> dict:
+        return {
+            "tiquetes": len(self._tiquetes),
+            "desde": self.desde.isoformat() if self.desde else None,
+            "hasta": self.hasta.isoformat() if self.hasta else None,
+            "version": self.version,
+            "cargado_en": self.cargado_en,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+        }
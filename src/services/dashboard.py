@@ -3,8 +3,12 @@ import pandas as pd
 import requests
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
 import time
+from urllib.parse import urlencode
+from dashboard_cache import CacheConsultas
 
 st.set_page_config(
     page_title="Gestión Aeropuerto",
@@ -90,7 +94,292 @@ hide_streamlit_style = """
 """
 st.markdown(hide_streamlit_style, unsafe_allow_html=True)
 
-API_URL = "http://localhost:8000/ReservasGDS"
+# Base de la API para las consultas del servidor; los enlaces de descarga los abre
+# el navegador, así que usan la URL pública (por defecto la misma)
+KONTROL_API_URL = os.getenv("KONTROL_API_URL", "http://localhost:8000").rstrip("/")
+KONTROL_API_URL_PUBLICA = os.getenv("KONTROL_API_URL_PUBLICA", KONTROL_API_URL).rstrip("/")
+API_URL = f"{KONTROL_API_URL}/ReservasGDS"
+API_RESUMEN_URL = f"{API_URL}/resumen"
+API_EXPORTAR_URL = f"{KONTROL_API_URL_PUBLICA}/ReservasGDS/exportar"
+CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "300"))
+CACHE_STALE = float(os.getenv("DASHBOARD_CACHE_STALE", "1800"))
+CONSULTAS_PARALELAS = int(os.getenv("DASHBOARD_PARALELO", "4"))
+REINTENTOS_TRAMO = int(os.getenv("DASHBOARD_REINTENTOS", "2"))
+
+
+class ErrorAPI(Exception):
+    pass
+
+
+@st.cache_resource
+def obtener_cache():
+    """Caché compartida entre sesiones y reruns del dashboard"""
+    return CacheConsultas(ttl=CACHE_TTL, stale=CACHE_STALE)
+
+
+def cargar_reservas(url, payload, progreso=None):
+    """Consulta la API y devuelve el DataFrame (sin llamadas a st.*: corre también en segundo plano)"""
+    if progreso:
+        progreso(25, "🔄 Conectando con la API...")
+
+    response = requests.post(url, json=payload if payload else None, timeout=120)
+
+    if progreso:
+        progreso(50, "📊 Procesando datos...")
+
+    if response.status_code == 500:
+        error_detail = response.json().get('detail', 'Error desconocido')
+        raise ErrorAPI(f"❌ Error en el servidor: {error_detail}")
+    if response.status_code != 200:
+        raise ErrorAPI(f"❌ Error al conectar con la API. Código: {response.status_code}")
+
+    result = response.json()
+    if progreso:
+        progreso(75, "📊 Procesando datos...")
+
+    if "data" in result:
+        return pd.DataFrame(result["data"])
+    return pd.DataFrame(result)
+
+
+def dividir_por_meses(fecha_inicio, fecha_fin):
+    """Parte [fecha_inicio, fecha_fin] en tramos de mes calendario, ambos extremos inclusive"""
+    tramos = []
+    inicio = fecha_inicio
+    while inicio <= fecha_fin:
+        siguiente_mes = (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+        fin = min(siguiente_mes - timedelta(days=1), fecha_fin)
+        tramos.append((inicio, fin))
+        inicio = fin + timedelta(days=1)
+    return tramos
+
+
+def cargar_tramo(inicio, fin):
+    """Carga un tramo reintentando solo ese tramo ante timeouts o errores de la API"""
+    payload = {"fecha_inicio": inicio.isoformat(), "fecha_fin": fin.isoformat()}
+    for intento in range(REINTENTOS_TRAMO + 1):
+        try:
+            return cargar_reservas(API_URL, payload)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, ErrorAPI) as e:
+            if intento == REINTENTOS_TRAMO:
+                raise ErrorAPI(f"❌ No se pudo cargar el tramo {inicio:%d/%m/%Y} - {fin:%d/%m/%Y}: {e}")
+            time.sleep(2 ** intento)
+
+
+def cargar_reservas_por_tramos(fecha_inicio, fecha_fin, progreso=None):
+    """
+    Para rangos de más de un mes consulta cada mes en paralelo (máximo
+    DASHBOARD_PARALELO a la vez) y une los resultados en orden.
+    """
+    tramos = dividir_por_meses(fecha_inicio, fecha_fin)
+    if len(tramos) == 1:
+        payload = {"fecha_inicio": fecha_inicio.isoformat(), "fecha_fin": fecha_fin.isoformat()}
+        return cargar_reservas(API_URL, payload, progreso)
+
+    if progreso:
+        progreso(5, f"🔄 Consultando {len(tramos)} tramos mensuales...")
+
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=CONSULTAS_PARALELAS) as executor:
+        futuros = {executor.submit(cargar_tramo, inicio, fin): (inicio, fin) for inicio, fin in tramos}
+        for completados, futuro in enumerate(as_completed(futuros), start=1):
+            inicio, fin = futuros[futuro]
+            resultados[inicio] = futuro.result()
+            if progreso:
+                progreso(
+                    5 + int(completados / len(tramos) * 90),
+                    f"📦 Tramo {completados}/{len(tramos)} cargado ({inicio:%d/%m} - {fin:%d/%m/%Y})"
+                )
+
+    return pd.concat([resultados[inicio] for inicio, _ in tramos], ignore_index=True)
+
+
+def contar_por(df, columna):
+    """Conteo por columna; los datos del resumen diario ya traen el conteo en 'total'"""
+    if "total" in df.columns:
+        return df.groupby(columna)["total"].sum().sort_values(ascending=False)
+    return df[columna].value_counts()
+
+
+def mostrar_resultados(df, modo_consulta, fecha_inicio=None, fecha_fin=None):
+    total_procesados = int(df["total"].sum()) if "total" in df.columns else len(df)
+
+    if modo_consulta == "Con rango de fechas":
+        dias = (fecha_fin - fecha_inicio).days + 1
+        promedio = round(total_procesados / dias, 2) if dias > 0 else 0
+        rango_fechas = f"{fecha_inicio.strftime('%d')} al {fecha_fin.strftime('%d %B')}"
+    else:
+        columna_fecha = 'fecha' if 'fecha' in df.columns else 'id_hora'
+        df[columna_fecha] = pd.to_datetime(df[columna_fecha], errors='coerce')
+        df_con_fecha = df.dropna(subset=[columna_fecha])
+
+        if not df_con_fecha.empty:
+            fecha_min = df_con_fecha[columna_fecha].min()
+            fecha_max = df_con_fecha[columna_fecha].max()
+            dias = (fecha_max - fecha_min).days + 1
+            promedio = round(total_procesados / dias, 2) if dias > 0 else 0
+            rango_fechas = f"{fecha_min.strftime('%d')} al {fecha_max.strftime('%d %B')}"
+        else:
+            promedio = 0
+            rango_fechas = "Rango completo"
+
+    st.markdown(f"""
+    <div class="tabla-resumen">
+        <table>
+            <thead>
+                <tr>
+                    <th>CORTE</th>
+                    <th>N. ASISTENCIAS</th>
+                    <th>ASISTENCIAS PROMEDIO</th>
+                </tr>
+            </thead>
+            <tbody>
+                <tr>
+                    <td>{rango_fechas}</td>
+                    <td><strong>{total_procesados}</strong></td>
+                    <td><strong>{promedio}</strong></td>
+                </tr>
+            </tbody>
+        </table>
+    </div>
+    """, unsafe_allow_html=True)
+
+    st.markdown("---")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        if "Sucursal" in df.columns:
+            sucursal_count = contar_por(df[df["Sucursal"] != "SIN SUCURSAL"], "Sucursal").reset_index()
+            sucursal_count.columns = ["Sucursal", "Total"]
+
+            fig_sucursal = go.Figure(data=[
+                go.Bar(
+                    x=sucursal_count["Sucursal"],
+                    y=sucursal_count["Total"],
+                    text=sucursal_count["Total"],
+                    textposition='outside',
+                    marker=dict(
+                        color=['#1f77b4', '#2ca02c', '#ff7f0e', '#d62728', '#9467bd', '#8c564b']
+                    ),
+                    hovertemplate='<b>%{x}</b><br>Total: %{y}<extra></extra>'
+                )
+            ])
+
+            fig_sucursal.update_layout(
+                title={
+                    'text': "SOLICITUDES POR ÁREA",
+                    'x': 0.5,
+                    'xanchor': 'center',
+                    'font': {'size': 12, 'color': '#333', 'family': 'Arial, sans-serif'}
+                },
+                xaxis_title="",
+                yaxis_title="Cantidad de Reservas",
+                height=600,
+                showlegend=False,
+                plot_bgcolor='white',
+                paper_bgcolor='white',
+                xaxis=dict(showgrid=False),
+                yaxis=dict(showgrid=True, gridcolor='#e0e0e0')
+            )
+
+            st.plotly_chart(fig_sucursal, use_container_width=True)
+
+    with col2:
+        if "id_cuenta_str" in df.columns:
+            top_cuentas = contar_por(df[df["id_cuenta_str"] != "SIN CUENTA"], "id_cuenta_str").nlargest(5).reset_index()
+            top_cuentas.columns = ["Cuenta", "Total"]
+
+            fig_cuentas = go.Figure(data=[
+                go.Bar(
+                    x=top_cuentas["Cuenta"],
+                    y=top_cuentas["Total"],
+                    text=top_cuentas["Total"],
+                    textposition='outside',
+                    marker=dict(color='#20B2AA'),
+                    hovertemplate='<b>%{x}</b><br>Total: %{y}<extra></extra>'
+                )
+            ])
+
+            fig_cuentas.update_layout(
+                title={
+                    'text': "TOP 5 CLIENTES",
+                    'x': 0.5,
+                    'xanchor': 'center',
+                    'font': {'size': 16, 'color': '#333', 'family': 'Arial, sans-serif'}
+                },
+                xaxis_title="",
+                yaxis_title="Cantidad",
+                height=400,
+                showlegend=False,
+                plot_bgcolor='white',
+                paper_bgcolor='white',
+                xaxis=dict(showgrid=False),
+                yaxis=dict(showgrid=True, gridcolor='#e0e0e0')
+            )
+
+            st.plotly_chart(fig_cuentas, use_container_width=True)
+
+    st.markdown("---")
+
+    if "Sucursal" in df.columns:
+        sucursal_distrib = contar_por(df[df["Sucursal"] != "SIN SUCURSAL"], "Sucursal").reset_index()
+        sucursal_distrib.columns = ["Categoría", "Total"]
+
+        fig_tipo = px.pie(
+            sucursal_distrib,
+            values="Total",
+            names="Categoría",
+            title="SOLICITUDES POR TIPO DE SERVICIO",
+            color_discrete_sequence=px.colors.qualitative.Set3,
+            hole=0.4
+        )
+
+        fig_tipo.update_traces(
+            textposition='inside',
+            textinfo='percent+label',
+            hovertemplate='<b>%{label}</b><br>Total: %{value}<br>Porcentaje: %{percent}<extra></extra>'
+        )
+
+        fig_tipo.update_layout(
+            title={
+                'x': 0.5,
+                'xanchor': 'center',
+                'font': {'size': 16, 'color': '#333', 'family': 'Arial, sans-serif'}
+            },
+            height=500,
+            showlegend=True,
+            legend=dict(
+                orientation="v",
+                yanchor="middle",
+                y=0.5,
+                xanchor="left",
+                x=1.05
+            ),
+            plot_bgcolor='white',
+            paper_bgcolor='white'
+        )
+
+        st.plotly_chart(fig_tipo, use_container_width=True)
+
+    with st.expander("📋 Ver datos completos"):
+        st.dataframe(df, use_container_width=True)
+
+    # La exportación la genera la API en streaming: el dashboard no arma el archivo en memoria
+    params = {}
+    if modo_consulta == "Con rango de fechas":
+        params = {"fecha_inicio": fecha_inicio.isoformat(), "fecha_fin": fecha_fin.isoformat()}
+    col_csv, col_xlsx = st.columns(2)
+    col_csv.link_button(
+        "📥 Descargar datos en CSV",
+        f"{API_EXPORTAR_URL}?{urlencode({**params, 'formato': 'csv'})}"
+    )
+    col_xlsx.link_button(
+        "📊 Descargar datos en Excel",
+        f"{API_EXPORTAR_URL}?{urlencode({**params, 'formato': 'xlsx'})}",
+        help="Una hoja de Excel admite hasta 1.048.575 filas; para rangos mayores use CSV"
+    )
+
 
 st.markdown('<div class="titulo-principal">Gestión Aeropuerto</div>', unsafe_allow_html=True)
 
@@ -100,6 +389,7 @@ modo_consulta = st.radio(
     horizontal=True
 )
 
+fecha_inicio = fecha_fin = None
 if modo_consulta == "Con rango de fechas":
     col1, col2 = st.columns(2)
     fecha_inicio = col1.date_input("Desde", date(2025, 1, 1))
@@ -112,224 +402,62 @@ if modo_consulta == "Con rango de fechas":
         st.error("❌ La fecha de inicio debe ser menor a la fecha fin.")
         st.stop()
 
-if st.button("🔍 Consultar datos"):
+    payload = {
+        "fecha_inicio": fecha_inicio.isoformat(),
+        "fecha_fin": fecha_fin.isoformat()
+    }
+
+    def cargar(progreso):
+        return cargar_reservas_por_tramos(fecha_inicio, fecha_fin, progreso)
+else:
+    payload = {}
+
+    def cargar(progreso):
+        # El histórico completo se arma desde el resumen diario (conteos ya agregados)
+        return cargar_reservas(API_RESUMEN_URL, payload, progreso)
+
+cache = obtener_cache()
+clave = (modo_consulta, payload.get("fecha_inicio"), payload.get("fecha_fin"))
+
+col_consultar, col_invalidar = st.columns([1, 1])
+if col_consultar.button("🔍 Consultar datos"):
+    st.session_state["consulta_actual"] = clave
+if col_invalidar.button("♻️ Actualizar datos (ignorar caché)"):
+    cache.invalidar(clave)
+    st.session_state["consulta_actual"] = clave
+
+# Los reruns (expanders, descargas) vuelven a dibujar desde la caché sin consultar la API
+if st.session_state.get("consulta_actual") == clave:
     progress_bar = st.progress(0)
     status_text = st.empty()
 
+    def reportar_progreso(valor, mensaje):
+        progress_bar.progress(valor)
+        status_text.text(mensaje)
+
     try:
-        status_text.text("🔄 Conectando con la API...")
-        progress_bar.progress(25)
-
-        if modo_consulta == "Con rango de fechas":
-            payload = {
-                "fecha_inicio": fecha_inicio.isoformat(),
-                "fecha_fin": fecha_fin.isoformat()
-            }
-        else:
-            payload = {}
-
-        response = requests.post(API_URL, json=payload if payload else None, timeout=120)
-        progress_bar.progress(50)
-        status_text.text("📊 Procesando datos...")
-
-        if response.status_code == 200:
-            result = response.json()
-            progress_bar.progress(75)
-
-            if "data" in result:
-                df = pd.DataFrame(result["data"])
-            else:
-                df = pd.DataFrame(result)
-
-            progress_bar.progress(100)
-            status_text.text("✅ Datos cargados correctamente")
-            time.sleep(1)
-            progress_bar.empty()
-            status_text.empty()
-
-            if df.empty:
-                st.warning("⚠️ No hay registros procesados disponibles.")
-            else:
-                total_procesados = len(df)
-
-                if modo_consulta == "Con rango de fechas":
-                    dias = (fecha_fin - fecha_inicio).days + 1
-                    promedio = round(total_procesados / dias, 2) if dias > 0 else 0
-                    rango_fechas = f"{fecha_inicio.strftime('%d')} al {fecha_fin.strftime('%d %B')}"
-                else:
-                    df['id_hora'] = pd.to_datetime(df['id_hora'], errors='coerce')
-                    df_con_fecha = df.dropna(subset=['id_hora'])
-
-                    if not df_con_fecha.empty:
-                        fecha_min = df_con_fecha['id_hora'].min()
-                        fecha_max = df_con_fecha['id_hora'].max()
-                        dias = (fecha_max - fecha_min).days + 1
-                        promedio = round(total_procesados / dias, 2) if dias > 0 else 0
-                        rango_fechas = f"{fecha_min.strftime('%d')} al {fecha_max.strftime('%d %B')}"
-                    else:
-                        promedio = 0
-                        rango_fechas = "Rango completo"
-
-                st.markdown(f"""
-                <div class="tabla-resumen">
-                    <table>
-                        <thead>
-                            <tr>
-                                <th>CORTE</th>
-                                <th>N. ASISTENCIAS</th>
-                                <th>ASISTENCIAS PROMEDIO</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-                            <tr>
-                                <td>{rango_fechas}</td>
-                                <td><strong>{total_procesados}</strong></td>
-                                <td><strong>{promedio}</strong></td>
-                            </tr>
-                        </tbody>
-                    </table>
-                </div>
-                """, unsafe_allow_html=True)
-
-                st.markdown("---")
-
-                col1, col2 = st.columns(2)
-
-                with col1:
-                    if "Sucursal" in df.columns:
-                        sucursal_count = df[df["Sucursal"] != "SIN SUCURSAL"]["Sucursal"].value_counts().reset_index()
-                        sucursal_count.columns = ["Sucursal", "Total"]
-
-                        fig_sucursal = go.Figure(data=[
-                            go.Bar(
-                                x=sucursal_count["Sucursal"],
-                                y=sucursal_count["Total"],
-                                text=sucursal_count["Total"],
-                                textposition='outside',
-                                marker=dict(
-                                    color=['#1f77b4', '#2ca02c', '#ff7f0e', '#d62728', '#9467bd', '#8c564b']
-                                ),
-                                hovertemplate='<b>%{x}</b><br>Total: %{y}<extra></extra>'
-                            )
-                        ])
-
-                        fig_sucursal.update_layout(
-                            title={
-                                'text': "SOLICITUDES POR ÁREA",
-                                'x': 0.5,
-                                'xanchor': 'center',
-                                'font': {'size': 12, 'color': '#333', 'family': 'Arial, sans-serif'}
-                            },
-                            xaxis_title="",
-                            yaxis_title="Cantidad de Reservas",
-                            height=600,
-                            showlegend=False,
-                            plot_bgcolor='white',
-                            paper_bgcolor='white',
-                            xaxis=dict(showgrid=False),
-                            yaxis=dict(showgrid=True, gridcolor='#e0e0e0')
-                        )
-
-                        st.plotly_chart(fig_sucursal, use_container_width=True)
-
-                with col2:
-                    if "id_cuenta_str" in df.columns:
-                        top_cuentas = df[df["id_cuenta_str"] != "SIN CUENTA"]["id_cuenta_str"].value_counts().nlargest(5).reset_index()
-                        top_cuentas.columns = ["Cuenta", "Total"]
-
-                        fig_cuentas = go.Figure(data=[
-                            go.Bar(
-                                x=top_cuentas["Cuenta"],
-                                y=top_cuentas["Total"],
-                                text=top_cuentas["Total"],
-                                textposition='outside',
-                                marker=dict(color='#20B2AA'),
-                                hovertemplate='<b>%{x}</b><br>Total: %{y}<extra></extra>'
-                            )
-                        ])
-
-                        fig_cuentas.update_layout(
-                            title={
-                                'text': "TOP 5 CLIENTES",
-                                'x': 0.5,
-                                'xanchor': 'center',
-                                'font': {'size': 16, 'color': '#333', 'family': 'Arial, sans-serif'}
-                            },
-                            xaxis_title="",
-                            yaxis_title="Cantidad",
-                            height=400,
-                            showlegend=False,
-                            plot_bgcolor='white',
-                            paper_bgcolor='white',
-                            xaxis=dict(showgrid=False),
-                            yaxis=dict(showgrid=True, gridcolor='#e0e0e0')
-                        )
-
-                        st.plotly_chart(fig_cuentas, use_container_width=True)
-
-                st.markdown("---")
-
-                if "Sucursal" in df.columns:
-                    sucursal_distrib = df[df["Sucursal"] != "SIN SUCURSAL"]["Sucursal"].value_counts().reset_index()
-                    sucursal_distrib.columns = ["Categoría", "Total"]
-
-                    fig_tipo = px.pie(
-                        sucursal_distrib,
-                        values="Total",
-                        names="Categoría",
-                        title="SOLICITUDES POR TIPO DE SERVICIO",
-                        color_discrete_sequence=px.colors.qualitative.Set3,
-                        hole=0.4
-                    )
-
-                    fig_tipo.update_traces(
-                        textposition='inside',
-                        textinfo='percent+label',
-                        hovertemplate='<b>%{label}</b><br>Total: %{value}<br>Porcentaje: %{percent}<extra></extra>'
-                    )
-
-                    fig_tipo.update_layout(
-                        title={
-                            'x': 0.5,
-                            'xanchor': 'center',
-                            'font': {'size': 16, 'color': '#333', 'family': 'Arial, sans-serif'}
-                        },
-                        height=500,
-                        showlegend=True,
-                        legend=dict(
-                            orientation="v",
-                            yanchor="middle",
-                            y=0.5,
-                            xanchor="left",
-                            x=1.05
-                        ),
-                        plot_bgcolor='white',
-                        paper_bgcolor='white'
-                    )
-
-                    st.plotly_chart(fig_tipo, use_container_width=True)
-
-                with st.expander("📋 Ver datos completos"):
-                    st.dataframe(df, use_container_width=True)
-
-                csv = df.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="📥 Descargar datos en CSV",
-                    data=csv,
-                    file_name=f"dashboard_stats_{date.today().isoformat()}.csv",
-                    mime="text/csv"
-                )
+        df, edad, refrescando = cache.obtener(clave, cargar, reportar_progreso)
+
+        progress_bar.progress(100)
+        status_text.text("✅ Datos cargados correctamente")
+        progress_bar.empty()
+        status_text.empty()
 
-        elif response.status_code == 500:
-            progress_bar.empty()
-            status_text.empty()
-            error_detail = response.json().get('detail', 'Error desconocido')
-            st.error(f"❌ Error en el servidor: {error_detail}")
+        if edad > 0:
+            st.caption(
+                f"Datos en caché de hace {int(edad)} s"
+                + (" · actualizando en segundo plano" if refrescando else "")
+            )
+
+        if df.empty:
+            st.warning("⚠️ No hay registros procesados disponibles.")
         else:
-            progress_bar.empty()
-            status_text.empty()
-            st.error(f"❌ Error al conectar con la API. Código: {response.status_code}")
+            mostrar_resultados(df.copy(), modo_consulta, fecha_inicio, fecha_fin)
 
+    except ErrorAPI as e:
+        progress_bar.empty()
+        status_text.empty()
+        st.error(str(e))
     except requests.exceptions.Timeout:
         progress_bar.empty()
         status_text.empty()
@@ -337,7 +465,7 @@ if st.button("🔍 Consultar datos"):
     except requests.exceptions.ConnectionError:
         progress_bar.empty()
         status_text.empty()
-        st.error("❌ No se pudo conectar con la API. Verifica que esté corriendo en http://localhost:8000")
+        st.error(f"❌ No se pudo conectar con la API. Verifica que esté corriendo en {KONTROL_API_URL}")
     except Exception as e:
         progress_bar.empty()
         status_text.empty()
@@ -0,0 +1,71 @@
+"""
+Caché en memoria para las consultas del dashboard con refresco en segundo plano.
+
+Cada entrada vive `ttl` segundos como dato fresco; después, y hasta `ttl + stale`,
+se sigue entregando mientras un hilo la vuelve a cargar (stale-while-revalidate).
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("kontrol.dashboard")
+
+
+class CacheConsultas:
+    def __init__(self, ttl: float = 300, stale: float = 1800, hilos: int = 2):
+        self.ttl = ttl
+        self.stale = stale
+        self._lock = threading.Lock()
+        self._entradas = {}
+        self._refrescando = set()
+        self._executor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="dashboard-cache")
+
+    def obtener(self, clave, cargar, progreso=None):
+        """
+        Devuelve (datos, edad_segundos, refrescando). `cargar(progreso)` solo se
+        ejecuta en primer plano cuando no hay dato utilizable.
+        """
+        ahora = time.time()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+
+        if entrada is not None:
+            edad = ahora - entrada["cargado"]
+            if edad < self.ttl:
+                return entrada["datos"], edad, False
+            if edad < self.ttl + self.stale:
+                return entrada["datos"], edad, self._refrescar(clave, cargar)
+
+        datos = cargar(progreso)
+        self._guardar(clave, datos)
+        return datos, 0.0, False
+
+    def invalidar(self, clave=None):
+        with self._lock:
+            if clave is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(clave, None)
+
+    def _guardar(self, clave, datos):
+        with self._lock:
+            self._entradas[clave] = {"datos": datos, "cargado": time.time()}
+
+    def _refrescar(self, clave, cargar) -> bool:
+        with self._lock:
+            if clave in self._refrescando:
+                return True
+            self._refrescando.add(clave)
+
+        def tarea():
+            try:
+                self._guardar(clave, cargar(None))
+            except Exception:
+                logger.exception("Error refrescando caché del dashboard", extra={"clave": str(clave)})
+            finally:
+                with self._lock:
+                    self._refrescando.discard(clave)
+
+        self._executor.submit(tarea)
+        return True
@@ -0,0 +1,192 @@
+"""
+Base de datos local (SQLite) que reemplaza a SQL Server para desarrollo y
+pruebas de carga (DB_BACKEND=sqlite).
+
+Implementa el esquema de VueloIDA/VueloREG/Tiqueteadores/usuarios y traduce el
+subconjunto de T-SQL que usan las lecturas y escrituras del mostrador (TOP,
+TRY_CONVERT(date, ...), OBJECT_ID, COL_LENGTH, HASHBYTES, GETDATE, SYSUTCDATETIME...).
+Lo que solo existe en SQL Server (sp_getapplock, MERGE, OUTPUT) no se traduce: el
+archivo, el resumen diario y el enriquecimiento de PNR deben quedar deshabilitados
+con este backend. La cola de reclamos trae su propia variante con RETURNING.
+"""
+import hashlib
+import re
+import sqlite3
+from datetime import date, datetime
+
+COLUMNAS_VUELO = """
+    id_documento TEXT PRIMARY KEY,
+    ds_records TEXT,
+    ds_paxname TEXT,
+    ds_paxprefix TEXT,
+    ds_paxape TEXT,
+    iden_gds TEXT,
+    ds_PNR TEXT,
+    cd_sucursal TEXT,
+    id_tiqueteador TEXT,
+    ds_itinerario TEXT,
+    {columna_fecha} TEXT,
+    id_asesor TEXT,
+    id_observacion TEXT,
+    id_silla TEXT,
+    id_cuenta TEXT,
+    id_estado TEXT,
+    id_hora TEXT,
+    id_atencion TEXT
+"""
+
+SQL_ESQUEMA = f"""
+    CREATE TABLE IF NOT EXISTS VueloIDA ({COLUMNAS_VUELO.format(columna_fecha="dt_salida")});
+    CREATE TABLE IF NOT EXISTS VueloREG ({COLUMNAS_VUELO.format(columna_fecha="dt_llegada")});
+    CREATE INDEX IF NOT EXISTS IX_VueloIDA_salida ON VueloIDA (dt_salida);
+    CREATE INDEX IF NOT EXISTS IX_VueloREG_llegada ON VueloREG (dt_llegada);
+    CREATE TABLE IF NOT EXISTS Tiqueteadores (
+        cd_codigo TEXT PRIMARY KEY,
+        ds_nombre TEXT
+    );
+    CREATE TABLE IF NOT EXISTS usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE,
+        nombre_completo TEXT,
+        rol TEXT,
+        [contraseña] BLOB
+    );
+"""
+
+# (patrón T-SQL, reemplazo SQLite); se aplican en orden
+TRADUCCIONES = [
+    (re.compile(r"SET\s+NOCOUNT\s+ON\s*;", re.IGNORECASE), ""),
+    (re.compile(r"\bdbo\.", re.IGNORECASE), ""),
+    (re.compile(r"IF\s+OBJECT_ID\(\s*'[^']+'\s*,\s*'U'\s*\)\s+IS\s+NULL\s+CREATE\s+TABLE", re.IGNORECASE),
+     "CREATE TABLE IF NOT EXISTS"),
+    (re.compile(r"OBJECT_ID\(\s*\?\s*,\s*'U'\s*\)", re.IGNORECASE),
+     "(SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = replace(?, 'dbo.', ''))"),
+    (re.compile(r"TRY_CONVERT\(\s*date\s*,", re.IGNORECASE), "date("),
+    (re.compile(r"COL_LENGTH\(\s*\?\s*,\s*\?\s*\)", re.IGNORECASE),
+     "(SELECT 1 FROM pragma_table_info(replace(?, 'dbo.', '')) WHERE name = ?)"),
+    (re.compile(r"\bGETDATE\(\)", re.IGNORECASE), "CURRENT_TIMESTAMP"),
+    # Antes que SYSUTCDATETIME(): el lease se suma en segundos al instante UTC
+    (re.compile(r"DATEADD\(\s*second\s*,\s*\?\s*,\s*SYSUTCDATETIME\(\)\s*\)", re.IGNORECASE),
+     "datetime('now', ? || ' seconds')"),
+    (re.compile(r"\bSYSUTCDATETIME\(\)", re.IGNORECASE), "datetime('now')"),
+    (re.compile(r"\bISNULL\(", re.IGNORECASE), "IFNULL("),
+    (re.compile(r"\bLEN\(", re.IGNORECASE), "LENGTH("),
+    (re.compile(r"\bN?VARCHAR\(\d+\)", re.IGNORECASE), "TEXT"),
+    (re.compile(r"\bAS\s+N?VARCHAR\b", re.IGNORECASE), "AS TEXT"),
+    (re.compile(r"WITH\s*\(\s*(?:NOLOCK|ROWLOCK|UPDLOCK|READPAST|HOLDLOCK)(?:\s*,\s*(?:NOLOCK|ROWLOCK|UPDLOCK|READPAST|HOLDLOCK))*\s*\)",
+                re.IGNORECASE), ""),
+]
+RE_TOP = re.compile(r"^\s*SELECT\s+TOP\s*\(?\s*(\d+)\s*\)?", re.IGNORECASE)
+RE_NO_SOPORTADO = re.compile(r"\b(sp_getapplock|MERGE\s|OUTPUT\s+(?:deleted|inserted)|@@ROWCOUNT)", re.IGNORECASE)
+RE_FECHA = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+_traducciones = {}
+
+
+def traducir(sql: str) -> str:
+    """T-SQL -> SQLite (con caché: las sentencias de la API son pocas y se repiten)"""
+    traducida = _traducciones.get(sql)
+    if traducida is not None:
+        return traducida
+    if RE_NO_SOPORTADO.search(sql):
+        raise NotImplementedError(f"Sentencia solo disponible en SQL Server: {sql.strip()[:80]}")
+
+    traducida = sql
+    for patron, reemplazo in TRADUCCIONES:
+        traducida = patron.sub(reemplazo, traducida)
+    # SELECT TOP (n) exterior -> LIMIT n al final
+    top = RE_TOP.match(traducida)
+    if top:
+        cuerpo = traducida[top.end():].rstrip().rstrip(";")
+        traducida = f"SELECT{cuerpo} LIMIT {top.group(1)}"
+    _traducciones[sql] = traducida
+    return traducida
+
+
+def _hashbytes(algoritmo: str, valor):
+    if algoritmo.upper() != "SHA2_256":
+        raise ValueError(f"HASHBYTES: algoritmo no soportado {algoritmo}")
+    if valor is None:
+        return None
+    return hashlib.sha256(str(valor).encode("utf-8")).digest()
+
+
+def _a_python(valor):
+    # pyodbc devuelve date para columnas date: TRY_CONVERT(date, ...) traducido a date() vuelve como texto
+    if isinstance(valor, str) and RE_FECHA.match(valor):
+        try:
+            return date.fromisoformat(valor)
+        except ValueError:
+            return valor
+    return valor
+
+
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(sep=" "))
+
+
+class CursorLocal:
+    """Cursor con la interfaz de pyodbc que usa la API (execute, fetch*, description, rowcount)"""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def execute(self, sql: str, *params):
+        if len(params) == 1 and isinstance(params[0], (tuple, list)):
+            params = params[0]
+        self._cursor.execute(traducir(sql), tuple(params))
+        return self
+
+    def fetchone(self):
+        fila = self._cursor.fetchone()
+        return tuple(_a_python(v) for v in fila) if fila is not None else None
+
+    def fetchmany(self, cantidad: int = 1):
+        return [tuple(_a_python(v) for v in fila) for fila in self._cursor.fetchmany(cantidad)]
+
+    def fetchall(self):
+        return [tuple(_a_python(v) for v in fila) for fila in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class ConexionLocal:
+    def __init__(self, ruta: str):
+        self._conn = sqlite3.connect(ruta, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.create_function("HASHBYTES", 2, _hashbytes, deterministic=True)
+        # Timeout de consulta de pyodbc (segundos); SQLite no lo aplica
+        self.timeout = 0
+
+    def cursor(self) -> CursorLocal:
+        return CursorLocal(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+def conectar(ruta: str) -> ConexionLocal:
+    return ConexionLocal(ruta)
+
+
+def crear_esquema(ruta: str):
+    conn = sqlite3.connect(ruta)
+    conn.executescript(SQL_ESQUEMA)
+    conn.commit()
+    conn.close()
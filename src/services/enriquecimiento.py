@@ -0,0 +1,311 @@
+"""
+Enriquecimiento asíncrono de PNR: parsea ds_PNR fuera del request y guarda
+aerolínea, teléfono y tiqueteador en dbo.TiquetesPNR.
+
+La cola se alimenta desde create_tiquete y desde un escaneo periódico de filas
+sin enriquecer o cuyo ds_PNR cambió desde que se parseó (hash_pnr, revisado solo
+en los vuelos desde hace ENRIQUECIMIENTO_REVISION_DIAS para no hashear toda la
+tabla en cada escaneo). Los lotes con error se reintentan con backoff; una fila
+que falla ENRIQUECIMIENTO_MAX_INTENTOS veces se marca como ERROR (poison) y no
+se vuelve a tomar mientras su ds_PNR no cambie.
+"""
+import heapq
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import date, timedelta
+
+from pnr import extraer_campos_pnr
+
+logger = logging.getLogger("kontrol.enriquecimiento")
+
+TABLA_PNR = "dbo.TiquetesPNR"
+TABLAS_VUELO = {"IDA": "dbo.VueloIDA", "REG": "dbo.VueloREG"}
+
+ENRIQUECIMIENTO_HILOS = int(os.getenv("ENRIQUECIMIENTO_HILOS", "1"))
+ENRIQUECIMIENTO_LOTE = int(os.getenv("ENRIQUECIMIENTO_LOTE", "200"))
+ENRIQUECIMIENTO_MAX_INTENTOS = int(os.getenv("ENRIQUECIMIENTO_MAX_INTENTOS", "3"))
+ENRIQUECIMIENTO_ESCANEO = int(os.getenv("ENRIQUECIMIENTO_ESCANEO", "5000"))
+ENRIQUECIMIENTO_REVISION_DIAS = int(os.getenv("ENRIQUECIMIENTO_REVISION_DIAS", "7"))
+
+SQL_CREAR_TABLA = f"""
+    IF OBJECT_ID('{TABLA_PNR}', 'U') IS NULL
+    CREATE TABLE {TABLA_PNR} (
+        id_documento NVARCHAR(100) NOT NULL,
+        tipo_vuelo CHAR(3) NOT NULL,
+        aerolinea NVARCHAR(200) NULL,
+        telefono NVARCHAR(30) NULL,
+        tiqueteador NVARCHAR(200) NULL,
+        estado VARCHAR(10) NOT NULL,
+        intentos INT NOT NULL DEFAULT 0,
+        error NVARCHAR(500) NULL,
+        dt_procesado DATETIME NOT NULL DEFAULT GETDATE(),
+        hash_pnr VARBINARY(32) NULL,
+        CONSTRAINT PK_TiquetesPNR PRIMARY KEY (id_documento, tipo_vuelo)
+    )
+"""
+
+# Hash del texto parseado; el mismo CAST en el MERGE y en el escaneo para que comparen igual
+def sql_hash_pnr(expresion: str) -> str:
+    return f"ISNULL(HASHBYTES('SHA2_256', CAST({expresion} AS NVARCHAR(MAX))), 0x)"
+
+
+SQL_GUARDAR = f"""
+    MERGE {TABLA_PNR} AS t
+    USING (SELECT ? AS id_documento, ? AS tipo_vuelo, ? AS aerolinea, ? AS telefono,
+                  ? AS tiqueteador, ? AS estado, ? AS intentos, ? AS error,
+                  {sql_hash_pnr("?")} AS hash_pnr) AS s
+    ON t.id_documento = s.id_documento AND t.tipo_vuelo = s.tipo_vuelo
+    WHEN MATCHED THEN UPDATE SET
+        aerolinea = s.aerolinea, telefono = s.telefono, tiqueteador = s.tiqueteador,
+        estado = s.estado, intentos = s.intentos, error = s.error, hash_pnr = s.hash_pnr,
+        dt_procesado = GETDATE()
+    WHEN NOT MATCHED THEN INSERT (id_documento, tipo_vuelo, aerolinea, telefono, tiqueteador, estado, intentos, error, hash_pnr)
+        VALUES (s.id_documento, s.tipo_vuelo, s.aerolinea, s.telefono, s.tiqueteador, s.estado, s.intentos, s.error, s.hash_pnr);
+"""
+
+_tabla_creada = False
+
+
+def crear_tabla(conn):
+    """Crea la tabla de enriquecimiento si no existe (una sola vez por proceso)"""
+    global _tabla_creada
+    if _tabla_creada:
+        return
+    cursor = conn.cursor()
+    cursor.execute(SQL_CREAR_TABLA)
+    # Tablas creadas antes de que existiera hash_pnr
+    cursor.execute("SELECT COL_LENGTH(?, ?)", (TABLA_PNR, "hash_pnr"))
+    if cursor.fetchone()[0] is None:
+        cursor.execute(f"ALTER TABLE {TABLA_PNR} ADD hash_pnr VARBINARY(32) NULL")
+    conn.commit()
+    _tabla_creada = True
+
+
+def _recortar(valor, largo):
+    return valor[:largo] if valor else valor
+
+
+class ColaEnriquecimiento:
+    def __init__(self, conexion, extraer_lote=None, hilos: int = ENRIQUECIMIENTO_HILOS,
+                 lote: int = ENRIQUECIMIENTO_LOTE, max_intentos: int = ENRIQUECIMIENTO_MAX_INTENTOS):
+        """
+        conexion: context manager que entrega una conexión (get_db_connection).
+        extraer_lote: función lista de PNR -> lista de (aerolinea, telefono, tiqueteador).
+        """
+        self._conexion = conexion
+        self._extraer_lote = extraer_lote
+        self.hilos = hilos
+        self.lote = max(1, lote)
+        self.max_intentos = max_intentos
+
+        self._cola = queue.Queue()
+        self._pendientes = set()
+        self._reintentos = []
+        self._en_reintento = set()
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._trabajadores = []
+
+        self.procesados = 0
+        self.reintentados = 0
+        self.envenenados = 0
+        self.ultimo_escaneo = None
+
+    # ---------- alimentación ----------
+
+    def encolar(self, id_documento: str, tipo_vuelo: str, intentos: int = 0) -> bool:
+        clave = (id_documento, tipo_vuelo)
+        with self._lock:
+            if clave in self._pendientes:
+                return False
+            self._pendientes.add(clave)
+        self._cola.put((id_documento, tipo_vuelo, intentos))
+        return True
+
+    def escanear(self):
+        """
+        Encola filas de VueloIDA/VueloREG sin registro en TiquetesPNR y, en los
+        vuelos recientes, las que tienen un ds_PNR distinto al que se parseó
+        (hash_pnr NULL = registro anterior a la columna, también se reparsea).
+        """
+        revision = date.today() - timedelta(days=ENRIQUECIMIENTO_REVISION_DIAS)
+        consultas = []
+        for tipo_vuelo, tabla in TABLAS_VUELO.items():
+            columna_fecha = "dt_salida" if tipo_vuelo == "IDA" else "dt_llegada"
+            consultas.append(f"""
+                SELECT v.id_documento, '{tipo_vuelo}' AS tipo_vuelo FROM {tabla} v
+                LEFT JOIN {TABLA_PNR} p ON p.id_documento = v.id_documento AND p.tipo_vuelo = '{tipo_vuelo}'
+                WHERE p.id_documento IS NULL
+                   OR (TRY_CONVERT(date, v.{columna_fecha}) >= ?
+                       AND (p.hash_pnr IS NULL OR p.hash_pnr <> {sql_hash_pnr("v.ds_PNR")}))
+            """)
+        with self._conexion() as conn:
+            crear_tabla(conn)
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT TOP ({ENRIQUECIMIENTO_ESCANEO}) id_documento, tipo_vuelo FROM (
+                    {" UNION ALL ".join(consultas)}
+                ) AS SinEnriquecer
+            """, (revision,) * len(consultas))
+            filas = cursor.fetchall()
+
+        nuevos = sum(1 for id_documento, tipo_vuelo in filas if self.encolar(id_documento, tipo_vuelo))
+        self.ultimo_escaneo = time.time()
+        if nuevos:
+            logger.info("Filas encoladas para enriquecimiento PNR", extra={"filas": nuevos})
+
+    # ---------- ciclo de vida ----------
+
+    def iniciar(self):
+        self._detener.clear()
+        for i in range(self.hilos):
+            hilo = threading.Thread(target=self._trabajar, name=f"enriquecimiento-{i}", daemon=True)
+            hilo.start()
+            self._trabajadores.append(hilo)
+
+    def detener(self, timeout: float = 10):
+        """Termina el lote en curso y sale; lo pendiente lo retoma el próximo escaneo"""
+        self._detener.set()
+        for hilo in self._trabajadores:
+            hilo.join(timeout)
+        self._trabajadores = []
+
+    def metricas(self) -> dict:
+        with self._lock:
+            en_reintento = len(self._reintentos)
+        return {
+            "profundidad": self._cola.qsize(),
+            "en_reintento": en_reintento,
+            "procesados": self.procesados,
+            "reintentados": self.reintentados,
+            "envenenados": self.envenenados,
+            "hilos_activos": sum(1 for h in self._trabajadores if h.is_alive()),
+            "ultimo_escaneo": self.ultimo_escaneo,
+        }
+
+    # ---------- trabajo ----------
+
+    def _trabajar(self):
+        while not self._detener.is_set():
+            lote = self._tomar_lote()
+            if not lote:
+                continue
+            try:
+                self._procesar(lote)
+            except Exception as e:
+                logger.exception("Error procesando lote de enriquecimiento", extra={"filas": len(lote)})
+                for item in lote:
+                    if (item[0], item[1]) not in self._en_reintento:
+                        self._reintentar(item, str(e))
+            finally:
+                with self._lock:
+                    for id_documento, tipo_vuelo, _ in lote:
+                        if (id_documento, tipo_vuelo) not in self._en_reintento:
+                            self._pendientes.discard((id_documento, tipo_vuelo))
+
+    def _tomar_lote(self) -> list:
+        lote = self._reintentos_vencidos()
+        try:
+            if not lote:
+                lote.append(self._cola.get(timeout=0.5))
+            while len(lote) < self.lote:
+                lote.append(self._cola.get_nowait())
+        except queue.Empty:
+            pass
+        return lote
+
+    def _reintentos_vencidos(self) -> list:
+        ahora = time.time()
+        vencidos = []
+        with self._lock:
+            while self._reintentos and self._reintentos[0][0] <= ahora and len(vencidos) < self.lote:
+                item = heapq.heappop(self._reintentos)[1]
+                self._en_reintento.discard((item[0], item[1]))
+                vencidos.append(item)
+        return vencidos
+
+    def _reintentar(self, item, error: str):
+        id_documento, tipo_vuelo, intentos = item
+        intentos += 1
+        if intentos >= self.max_intentos:
+            self._envenenar(item, error)
+            return
+        self.reintentados += 1
+        with self._lock:
+            self._en_reintento.add((id_documento, tipo_vuelo))
+            heapq.heappush(self._reintentos, (time.time() + 2 ** intentos, (id_documento, tipo_vuelo, intentos)))
+
+    def _envenenar(self, item, error: str):
+        id_documento, tipo_vuelo, intentos = item
+        self.envenenados += 1
+        logger.warning("Fila descartada del enriquecimiento PNR", extra={
+            "cd_tiquete": id_documento, "tipo_vuelo": tipo_vuelo, "error": error
+        })
+        try:
+            with self._conexion() as conn:
+                cursor = conn.cursor()
+                # Con el hash del texto actual: si ds_PNR cambia, el escaneo la vuelve a tomar
+                cursor.execute(f"SELECT ds_PNR FROM {TABLAS_VUELO[tipo_vuelo]} WHERE id_documento = ?", (id_documento,))
+                fila = cursor.fetchone()
+                cursor.execute(SQL_GUARDAR, (
+                    id_documento, tipo_vuelo, None, None, None, "ERROR", intentos + 1, _recortar(error, 500),
+                    fila[0] if fila else None
+                ))
+                conn.commit()
+        except Exception:
+            logger.exception("No se pudo marcar la fila como ERROR", extra={"cd_tiquete": id_documento})
+
+    def _procesar(self, lote: list):
+        with self._conexion() as conn:
+            crear_tabla(conn)
+            cursor = conn.cursor()
+
+            textos = {}
+            for tipo_vuelo, tabla in TABLAS_VUELO.items():
+                ids = [id_documento for id_documento, tipo, _ in lote if tipo == tipo_vuelo]
+                if not ids:
+                    continue
+                marcadores = ", ".join("?" for _ in ids)
+                cursor.execute(f"SELECT id_documento, ds_PNR FROM {tabla} WHERE id_documento IN ({marcadores})", ids)
+                for id_documento, ds_pnr in cursor.fetchall():
+                    textos[(id_documento, tipo_vuelo)] = ds_pnr
+
+            # Filas que ya no existen en la tabla de vuelo se descartan sin registro
+            vigentes = [item for item in lote if (item[0], item[1]) in textos]
+            campos = self._parsear(vigentes, textos)
+
+            registros = []
+            for (id_documento, tipo_vuelo, intentos), resultado in zip(vigentes, campos):
+                if isinstance(resultado, Exception):
+                    self._reintentar((id_documento, tipo_vuelo, intentos), str(resultado))
+                    continue
+                aerolinea, telefono, tiqueteador = resultado
+                registros.append((
+                    id_documento, tipo_vuelo,
+                    _recortar(aerolinea, 200), _recortar(telefono, 30), _recortar(tiqueteador, 200),
+                    "OK", intentos + 1, None, textos[(id_documento, tipo_vuelo)]
+                ))
+
+            if registros:
+                cursor.executemany(SQL_GUARDAR, registros)
+                conn.commit()
+            self.procesados += len(registros)
+
+    def _parsear(self, items: list, textos: dict) -> list:
+        pnrs = [textos[(id_documento, tipo_vuelo)] for id_documento, tipo_vuelo, _ in items]
+        if self._extraer_lote is not None:
+            try:
+                return self._extraer_lote(pnrs)
+            except Exception:
+                logger.exception("Error en parsing por lote; se aísla fila por fila")
+
+        resultados = []
+        for ds_pnr in pnrs:
+            try:
+                resultados.append(extraer_campos_pnr(ds_pnr))
+            except Exception as e:
+                resultados.append(e)
+        return resultados
@@ -0,0 +1,75 @@
+"""
+Buffer de escritura diferida (write-behind) para cambios pequeños y repetidos.
+
+Guarda solo el último valor por clave; un job lo vacía cada pocos segundos con
+una sola sentencia por lote en lugar de una transacción por cambio. Mientras el
+valor está en el buffer, las lecturas lo superponen sobre lo que devuelve SQL.
+"""
+import threading
+import time
+
+
+class BufferEscritura:
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        # clave -> (valor, momento en que se encoló)
+        self._pendientes = {}
+        # Lote tomado por el job que todavía no confirma su commit
+        self._en_escritura = {}
+        self.encolados = 0
+        self.reemplazados = 0
+        self.escritos = 0
+        self.lotes = 0
+        self.errores = 0
+
+    def __len__(self):
+        return len(self._pendientes) + len(self._en_escritura)
+
+    def agregar(self, clave, valor):
+        with self._lock:
+            if clave in self._pendientes:
+                self.reemplazados += 1
+            self._pendientes[clave] = (valor, time.monotonic())
+            self.encolados += 1
+
+    def pendiente(self, clave, defecto=None):
+        """Valor encolado y todavía no escrito para la clave"""
+        # Con el lock: entre las dos asignaciones de tomar() la clave no está en ninguno
+        with self._lock:
+            item = self._pendientes.get(clave) or self._en_escritura.get(clave)
+        return item[0] if item is not None else defecto
+
+    def tomar(self) -> dict:
+        """Retira todo lo pendiente: {clave: (valor, encolado)}"""
+        with self._lock:
+            lote, self._pendientes = self._pendientes, {}
+            self._en_escritura = lote
+        return lote
+
+    def confirmar(self, lote: dict):
+        with self._lock:
+            self._en_escritura = {}
+            self.escritos += len(lote)
+            self.lotes += 1
+
+    def devolver(self, lote: dict):
+        """Reencola un lote que no se pudo escribir sin pisar valores más nuevos"""
+        with self._lock:
+            self._en_escritura = {}
+            self.errores += 1
+            for clave, item in lote.items():
+                self._pendientes.setdefault(clave, item)
+
+    def metricas(self) -> dict:
+        with self._lock:
+            mas_antiguo = min((t for _, t in self._pendientes.values()), default=None)
+            return {
+                "pendientes": len(self._pendientes),
+                "antiguedad_seg": round(time.monotonic() - mas_antiguo, 1) if mas_antiguo is not None else 0,
+                "encolados": self.encolados,
+                "reemplazados": self.reemplazados,
+                "escritos": self.escritos,
+                "lotes": self.lotes,
+                "errores": self.errores,
+            }
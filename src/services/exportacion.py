@@ -0,0 +1,112 @@
+"""
+Exportación de reservas en streaming (CSV y XLSX).
+
+Las filas se leen con fetchmany por lotes y se escriben a medida que llegan:
+la memoria usada no depende del tamaño del rango exportado.
+"""
+import csv
+import io
+import logging
+import os
+import tempfile
+
+try:
+    import xlsxwriter
+    XLSX_DISPONIBLE = True
+except ImportError:  # dependencia opcional
+    xlsxwriter = None
+    XLSX_DISPONIBLE = False
+
+logger = logging.getLogger("kontrol.exportacion")
+
+EXPORT_LOTE = int(os.getenv("EXPORT_LOTE", "2000"))
+# Filas de datos que caben en una hoja de Excel (1.048.576 menos el encabezado)
+XLSX_MAX_FILAS = 1048576 - 1
+# Columnas que agrega mapear_sucursal a cada fila
+COLUMNAS_SUCURSAL = ["CodigoSucursal", "NombreSucursal", "Sucursal", "id_cuenta_str"]
+
+TIPOS_MIME = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _filas(cursor, mapear, lote: int):
+    """Recorre el cursor por lotes y entrega (encabezados, filas mapeadas)"""
+    columnas = [col[0] for col in cursor.description]
+    encabezados = columnas + [c for c in COLUMNAS_SUCURSAL if c not in columnas]
+    yield encabezados
+    while True:
+        filas = cursor.fetchmany(lote)
+        if not filas:
+            break
+        yield [mapear(dict(zip(columnas, fila))) for fila in filas]
+
+
+def _valor(valor):
+    if valor is None:
+        return ""
+    if hasattr(valor, "isoformat"):
+        return valor.isoformat()
+    return valor
+
+
+def generar_csv(cursor, mapear, al_terminar=None, lote: int = EXPORT_LOTE):
+    """Genera el CSV en bloques (uno por lote de filas)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    try:
+        filas = _filas(cursor, mapear, lote)
+        encabezados = next(filas)
+        # BOM para que Excel abra el archivo como UTF-8 (tildes, ñ)
+        buffer.write("\ufeff")
+        writer.writerow(encabezados)
+        for bloque in filas:
+            for registro in bloque:
+                writer.writerow([_valor(registro.get(c)) for c in encabezados])
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+    finally:
+        if al_terminar is not None:
+            al_terminar()
+
+
+def generar_xlsx(cursor, mapear, al_terminar=None, lote: int = EXPORT_LOTE, bloque: int = 64 * 1024):
+    """
+    Escribe el XLSX en un archivo temporal con constant_memory (fila a fila, sin
+    retener la hoja) y lo envía por bloques. El formato zip no permite enviar
+    bytes antes de cerrar el libro.
+    """
+    archivo = tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False)
+    archivo.close()
+    try:
+        libro = xlsxwriter.Workbook(archivo.name, {"constant_memory": True})
+        hoja = libro.add_worksheet("Reservas")
+        try:
+            filas = _filas(cursor, mapear, lote)
+            encabezados = next(filas)
+            hoja.write_row(0, 0, encabezados)
+            n = 1
+            for registros in filas:
+                for registro in registros:
+                    hoja.write_row(n, 0, [_valor(registro.get(c)) for c in encabezados])
+                    n += 1
+        finally:
+            libro.close()
+            if al_terminar is not None:
+                al_terminar()
+
+        with open(archivo.name, "rb") as f:
+            while True:
+                datos = f.read(bloque)
+                if not datos:
+                    break
+                yield datos
+    finally:
+        try:
+            os.unlink(archivo.name)
+        except OSError:
+            logger.warning("No se pudo borrar el temporal de exportación", extra={"archivo": archivo.name})
@@ -31,6 +31,12 @@ export interface TiquetesDocumentos {
   id_cuenta?: string;
   id_hora?: string;
   id_atencion?: string;
+  tipo_vuelo?: string;
+  puntaje?: number;
+  // Solo con unificado=true: tramos del tiquete y estado de cada uno
+  tramos?: ('IDA' | 'REG')[];
+  estado_ida?: 'Pendiente' | 'Procesado' | null;
+  estado_regreso?: 'Pendiente' | 'Procesado' | null;
 }
 
 export interface TiquetesDocumentosResponse {
@@ -47,6 +53,38 @@ export interface TiqueteEstadoUpdate {
   id_hora: string;
 }
 
+export interface ManifiestoVuelo {
+  vuelo: string;
+  fecha: string;
+  origen: string | null;
+  destino: string | null;
+  hora: string | null;
+  total: number;
+  pendientes: number;
+  procesados: number;
+  pasajeros: TiquetesDocumentos[];
+  fuente: 'memoria' | 'sql';
+}
+
+export interface AnaliticaAsesores {
+  fecha: string;
+  tiquetes: number;
+  procesados: number;
+  pendientes: number;
+  // por_hora: { '06': 12, '07': 30, sin_hora: 1 }
+  asesores: { id_asesor: string; procesados: number; por_hora: Record<string, number> }[];
+  cola: { hora: string; procesados: number; pendientes: number }[];
+  fuente: 'memoria' | 'sql';
+  reconciliado_en?: number;
+}
+
+export interface ReclamoTiquetes {
+  id_asesor: string;
+  lease_seg: number;
+  total: number;
+  tiquetes: (TiquetesDocumentos & { reclamo_expira_utc: string })[];
+}
+
 export interface TiquetesEstadisticas {
   totalTiquetes: number;
   tiquetesPendientes: number;
@@ -55,6 +93,8 @@ export interface TiquetesEstadisticas {
 }
 
 // ==================== CLASE API ====================
+const SESSION_TOKEN_KEY = 'kontrol_token';
+
 class KontrolApi {
   private baseURL: string;
 
@@ -62,6 +102,26 @@ class KontrolApi {
     this.baseURL = API_BASE_URL;
   }
 
+  // ==================== TOKEN DE SESIÓN ====================
+  setSessionToken(token: string | null): void {
+    if (token) {
+      localStorage.setItem(SESSION_TOKEN_KEY, token);
+    } else {
+      localStorage.removeItem(SESSION_TOKEN_KEY);
+    }
+  }
+
+  getSessionToken(): string | null {
+    return localStorage.getItem(SESSION_TOKEN_KEY);
+  }
+
+  private authHeaders(): Record<string, string> {
+    const token = this.getSessionToken();
+    return token
+      ? { 'Content-Type': 'application/json', Authorization: `Bearer ${token}` }
+      : { 'Content-Type': 'application/json' };
+  }
+
   private async handleResponse<T>(response: Response): Promise<T> {
     if (!response.ok) {
       const error = await response.json().catch(() => ({ detail: 'Error desconocido' }));
@@ -81,31 +141,60 @@ class KontrolApi {
   async login(username: string, password: string): Promise<{
     success: boolean;
     message: string;
-    user: { username: string };
+    user: { id: number; email: string; nombre: string; rol: string };
+    token: string;
+    expira: string;
   }> {
     const response = await fetch(`${this.baseURL}/auth/login`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ correo: username, password }),
     });
-    return this.handleResponse(response);
+    const result = await this.handleResponse<{
+      success: boolean;
+      message: string;
+      user: { id: number; email: string; nombre: string; rol: string };
+      token: string;
+      expira: string;
+    }>(response);
+    this.setSessionToken(result.token);
+    return result;
   }
 
-  async verifySession(username: string): Promise<{ valid: boolean; username: string }> {
+  async verifySession(username: string): Promise<{ valid: boolean; username: string; rol?: string; expira?: string }> {
     const response = await fetch(`${this.baseURL}/auth/verify?username=${encodeURIComponent(username)}`, {
       method: 'GET',
-      headers: { 'Content-Type': 'application/json' },
+      headers: this.authHeaders(),
     });
+    if (response.status === 401) {
+      return { valid: false, username };
+    }
     return this.handleResponse(response);
   }
 
+  async logout(): Promise<void> {
+    if (this.getSessionToken()) {
+      await fetch(`${this.baseURL}/auth/logout`, {
+        method: 'POST',
+        headers: this.authHeaders(),
+      }).catch(() => undefined);
+    }
+    this.setSessionToken(null);
+  }
+
   // ==================== ENDPOINTS DE TIQUETES DOCUMENTOS ====================
   async getTiquetesDocumentos(params?: {
     limit?: number;
     estado?: 'Pendiente' | 'Procesado';
     tipo_vuelo?: string;
+    fecha_desde?: string;
+    fecha_hasta?: string;
+    fields?: (keyof TiquetesDocumentos)[];
+    unificado?: boolean;
   }): Promise<TiquetesDocumentosResponse> {
-    const queryString = params ? this.buildQueryString(params) : '';
+    const queryString = params
+      ? this.buildQueryString({ ...params, fields: params.fields?.join(',') })
+      : '';
     const response = await fetch(`${this.baseURL}/TiquetesDocumentos${queryString}`, {
       method: 'GET',
       headers: { 'Content-Type': 'application/json' },
@@ -113,6 +202,15 @@ class KontrolApi {
     return this.handleResponse<TiquetesDocumentosResponse>(response);
   }
 
+  async buscarTiquetes(q: string, limit: number = 20): Promise<TiquetesDocumentosResponse & { indexados: number }> {
+    const queryString = this.buildQueryString({ q, limit });
+    const response = await fetch(`${this.baseURL}/TiquetesDocumentos/buscar${queryString}`, {
+      method: 'GET',
+      headers: { 'Content-Type': 'application/json' },
+    });
+    return this.handleResponse<TiquetesDocumentosResponse & { indexados: number }>(response);
+  }
+
   async createTiquete(tiquete: Partial<TiquetesDocumentos>, tipo_vuelo: string): Promise<{ success: boolean; message: string; cd_tiquete: string }> {
     const body = {
       ...tiquete,
@@ -151,8 +249,12 @@ class KontrolApi {
     return this.handleResponse(response);
   }
 
-  async getTiqueteDocumento(cd_tiquete: string): Promise<{ tiquete: TiquetesDocumentos }> {
-    const response = await fetch(`${this.baseURL}/TiquetesDocumentos/${cd_tiquete}`, {
+  async getTiqueteDocumento(
+    cd_tiquete: string,
+    fields?: (keyof TiquetesDocumentos | 'ds_pnr_text')[]
+  ): Promise<{ tiquete: TiquetesDocumentos }> {
+    const queryString = this.buildQueryString({ fields: fields?.join(',') });
+    const response = await fetch(`${this.baseURL}/TiquetesDocumentos/${cd_tiquete}${queryString}`, {
       method: 'GET',
       headers: { 'Content-Type': 'application/json' },
     });
@@ -218,6 +320,54 @@ class KontrolApi {
     return this.handleResponse<TiquetesEstadisticas>(response);
   }
 
+  // ==================== COLA DE RECLAMOS ====================
+  async reclamarTiquetes(id_asesor: string, cantidad: number = 1, tipo_vuelo?: string): Promise<ReclamoTiquetes> {
+    const response = await fetch(`${this.baseURL}/TiquetesDocumentos/reclamar`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ id_asesor: id_asesor.trim(), cantidad, tipo_vuelo }),
+    });
+    return this.handleResponse<ReclamoTiquetes>(response);
+  }
+
+  async liberarReclamo(cd_tiquete: string, id_asesor: string): Promise<{ success: boolean; cd_tiquete: string; filas: number }> {
+    const response = await fetch(`${this.baseURL}/TiquetesDocumentos/${encodeURIComponent(cd_tiquete.trim())}/liberar`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ id_asesor: id_asesor.trim() }),
+    });
+    return this.handleResponse(response);
+  }
+
+  async renovarReclamo(cd_tiquete: string, id_asesor: string): Promise<{ success: boolean; cd_tiquete: string; filas: number; lease_seg: number }> {
+    const response = await fetch(`${this.baseURL}/TiquetesDocumentos/${encodeURIComponent(cd_tiquete.trim())}/renovar`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ id_asesor: id_asesor.trim() }),
+    });
+    return this.handleResponse(response);
+  }
+
+  // ==================== VUELOS ====================
+  async getManifiestoVuelo(vuelo: string, fecha?: string): Promise<ManifiestoVuelo> {
+    const queryString = this.buildQueryString({ fecha });
+    const response = await fetch(`${this.baseURL}/vuelos/${encodeURIComponent(vuelo.trim())}/manifiesto${queryString}`, {
+      method: 'GET',
+      headers: { 'Content-Type': 'application/json' },
+    });
+    return this.handleResponse<ManifiestoVuelo>(response);
+  }
+
+  // ==================== ANALÍTICA ====================
+  async getAnaliticaAsesores(fecha?: string): Promise<AnaliticaAsesores> {
+    const queryString = this.buildQueryString({ fecha });
+    const response = await fetch(`${this.baseURL}/analitica/asesores${queryString}`, {
+      method: 'GET',
+      headers: { 'Content-Type': 'application/json' },
+    });
+    return this.handleResponse<AnaliticaAsesores>(response);
+  }
+
   // ==================== ENDPOINTS DE SALUD ====================
   async checkHealth(): Promise<{
     status: string;
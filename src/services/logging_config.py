@@ -0,0 +1,83 @@
+"""
+Logging estructurado en JSON con escritura en segundo plano.
+
+Los handlers de los endpoints solo encolan el registro (QueueHandler); un hilo
+QueueListener hace la escritura a consola, así la E/S nunca bloquea la petición.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+# Atributos propios de LogRecord; lo demás llega por extra={...} y se serializa como campo
+_ATRIBUTOS_ESTANDAR = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener = None
+
+
+class FiltroRequestId(logging.Filter):
+    """Agrega el request_id de la petición en curso a cada registro"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class FormateadorJSON(logging.Formatter):
+    def format(self, record):
+        evento = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_ESTANDAR and not clave.startswith("_"):
+                evento[clave] = valor
+        if record.exc_info:
+            evento["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+def configurar_logging(nivel: str = LOG_LEVEL) -> logging.handlers.QueueListener:
+    """Instala la cola de logging en el logger raíz (idempotente)"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    cola = queue.SimpleQueue()
+
+    manejador_cola = logging.handlers.QueueHandler(cola)
+    manejador_cola.addFilter(FiltroRequestId())
+    manejador_cola.setFormatter(FormateadorJSON())
+
+    # El registro llega ya serializado desde el QueueHandler
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(logging.Formatter("%(message)s"))
+
+    raiz = logging.getLogger()
+    raiz.handlers = [manejador_cola]
+    raiz.setLevel(nivel)
+
+    _listener = logging.handlers.QueueListener(cola, salida, respect_handler_level=False)
+    _listener.start()
+    atexit.register(detener_logging)
+    return _listener
+
+
+def detener_logging():
+    """Vacía la cola y detiene el hilo de escritura"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
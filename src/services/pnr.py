@@ -0,0 +1,225 @@
+"""
+Extracción de campos desde el texto PNR (Sabre, Amadeus, XML y registros manuales)
+y normalización de las fechas de vuelo.
+
+Vive separado de api.py para que los procesos del pool de parsing lo importen sin
+cargar la aplicación ni pyodbc.
+"""
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+logger = logging.getLogger("kontrol.pnr")
+
+# Pocos procesos por defecto: cada worker de uvicorn levanta su propio pool
+PNR_POOL_PROCESOS = int(os.getenv("PNR_POOL_PROCESOS", "2"))
+PNR_POOL_UMBRAL = int(os.getenv("PNR_POOL_UMBRAL", "500"))
+PNR_POOL_LOTE = int(os.getenv("PNR_POOL_LOTE", "200"))
+
+# Patrones compilados una sola vez al importar el módulo
+RE_OPERATED_BY = re.compile(r'OPERATED BY[:/\s]+/?([A-Z][A-Z0-9\s]+?)(?:\s{2,}|$)', re.IGNORECASE)
+RE_ESPACIOS = re.compile(r'\s+')
+RE_AEROLINEA_A = re.compile(r'A-([A-Z][A-Z0-9]+)')
+RE_AEROLINEA_AMADEUS = re.compile(r';([A-Z]{2})\s+\d{4}\s+[A-Z]\s+[A-Z]')
+RE_AEROLINEA_SABRE = re.compile(r';([A-Z]{2})\s+\d+[A-Z]\s+')
+
+RE_TELEPAX = re.compile(r'Telepax[:/\s]+(\d+)', re.IGNORECASE)
+RE_TELEFONO_M = re.compile(r'(\d{10,12})\s*-\s*M', re.IGNORECASE)
+RE_TELEFONO_B = re.compile(r'(\d{10,12})\s+-B')
+RE_SSR_CTCM = re.compile(r'SSR\s+CTCM\s+[A-Z]{2}\s+HK\d+/(\d+)')
+RE_TELEFONO_AMADEUS = re.compile(r'M-(\d{10,12})')
+
+RE_RM_ASESOR = re.compile(r'RM\s+ASESOR/([A-Z\s]+?)(?:\s+RM|\n|$)', re.IGNORECASE)
+RE_RM_EMISOR = re.compile(r'RM\s+XNET-EMISOR/([A-Z\s]+?)(?:\s+RM|\n|$)', re.IGNORECASE)
+RE_AITAN = re.compile(r'AITAN([A-Z0-9]+)')
+
+RE_PREFIJOS_NOMBRE = re.compile(r'\b(?:MR|MRS|MS|MISS|DR|MSTR|CHD|INF|ADT)\b', re.IGNORECASE)
+
+
+def extraer_aerolinea_pnr(ds_pnr: str) -> Optional[str]:
+    if not ds_pnr:
+        return None
+
+    match_operated = RE_OPERATED_BY.search(ds_pnr)
+    if match_operated:
+        aerolinea = match_operated.group(1).strip()
+        aerolinea = RE_ESPACIOS.sub(' ', aerolinea)
+        return aerolinea
+
+    match_a = RE_AEROLINEA_A.search(ds_pnr)
+    if match_a:
+        return match_a.group(1).strip()
+
+    match_amadeus = RE_AEROLINEA_AMADEUS.search(ds_pnr)
+    if match_amadeus:
+        return match_amadeus.group(1).strip()
+
+    match_sabre_airline = RE_AEROLINEA_SABRE.search(ds_pnr)
+    if match_sabre_airline:
+        return match_sabre_airline.group(1).strip()
+
+    try:
+        root = ET.fromstring(ds_pnr)
+        ds_aero_code = root.find('.//ds_aero_code')
+        if ds_aero_code is not None and ds_aero_code.text:
+            return ds_aero_code.text.strip()
+    except:
+        pass
+
+    return None
+
+
+def extraer_telefono_pnr(ds_pnr: str) -> Optional[str]:
+    if not ds_pnr:
+        return None
+
+    match_telepax = RE_TELEPAX.search(ds_pnr)
+    if match_telepax:
+        return match_telepax.group(1).strip()
+
+    match_digits_m = RE_TELEFONO_M.search(ds_pnr)
+    if match_digits_m:
+        return match_digits_m.group(1).strip()
+
+    match_phone = RE_TELEFONO_B.search(ds_pnr)
+    if match_phone:
+        return match_phone.group(1).strip()
+
+    match_ssrctcm = RE_SSR_CTCM.search(ds_pnr)
+    if match_ssrctcm:
+        return match_ssrctcm.group(1).strip()
+
+    match_amadeus_phone = RE_TELEFONO_AMADEUS.search(ds_pnr)
+    if match_amadeus_phone:
+        return match_amadeus_phone.group(1).strip()
+
+    try:
+        root = ET.fromstring(ds_pnr)
+        ds_pax_telefono = root.find('.//ds_pax_telefono')
+        if ds_pax_telefono is not None and ds_pax_telefono.text:
+            return ds_pax_telefono.text.strip()
+    except:
+        pass
+
+    return None
+
+
+def extraer_tiqueteador_pnr(ds_pnr: str) -> Optional[str]:
+    if not ds_pnr:
+        return None
+
+    match_rm_asesor = RE_RM_ASESOR.search(ds_pnr)
+    if match_rm_asesor:
+        return match_rm_asesor.group(1).strip()
+
+    match_emisor = RE_RM_EMISOR.search(ds_pnr)
+    if match_emisor:
+        return match_emisor.group(1).strip()
+
+    match_aitan = RE_AITAN.search(ds_pnr)
+    if match_aitan:
+        return match_aitan.group(1).strip()
+
+    return None
+
+
+def limpiar_nombre_pasajero(nombre: str) -> str:
+    if not nombre:
+        return nombre
+
+    nombre_limpio = RE_PREFIJOS_NOMBRE.sub('', nombre)
+
+    nombre_limpio = ' '.join(nombre_limpio.split())
+
+    return nombre_limpio.strip()
+
+
+def normalize_date(date_val):
+    if not date_val:
+        return None
+    if isinstance(date_val, datetime):
+        return date_val.isoformat()
+    # Try parsing custom format "Sep 30 2025 12:55PM"
+    try:
+        # Check if matches standard ISO first
+        try:
+             return datetime.fromisoformat(str(date_val)).isoformat()
+        except:
+             pass
+        
+        # Parse custom format
+        # Example: Sep 30 2025 12:55PM
+        dt = datetime.strptime(str(date_val).strip(), "%b %d %Y %I:%M%p")
+        return dt.isoformat()
+    except Exception:
+        # Return original if parsing fails (fallback)
+        return date_val
+
+
+def extraer_campos_pnr(ds_pnr: str) -> tuple:
+    """(aerolinea, telefono, tiqueteador) de un PNR"""
+    return (
+        extraer_aerolinea_pnr(ds_pnr),
+        extraer_telefono_pnr(ds_pnr),
+        extraer_tiqueteador_pnr(ds_pnr),
+    )
+
+
+def extraer_campos_lote(pnrs: list) -> list:
+    return [extraer_campos_pnr(ds_pnr) for ds_pnr in pnrs]
+
+
+class PoolPNR:
+    """
+    Reparte el parsing de lotes grandes entre procesos (el regex/XML retiene el GIL).
+    Por debajo de `umbral` filas, o con un solo proceso, se parsea en línea.
+    """
+
+    def __init__(self, procesos: int = PNR_POOL_PROCESOS, umbral: int = PNR_POOL_UMBRAL, lote: int = PNR_POOL_LOTE):
+        self.procesos = procesos
+        self.umbral = umbral
+        self.lote = max(1, lote)
+        self._executor = None
+        # Varias peticiones pueden pedir el pool a la vez: se crea (y se cierra) una sola vez
+        self._lock = threading.Lock()
+
+    def extraer(self, pnrs: list) -> list:
+        if self.procesos <= 1 or len(pnrs) < self.umbral:
+            return extraer_campos_lote(pnrs)
+
+        lotes = [pnrs[i:i + self.lote] for i in range(0, len(pnrs), self.lote)]
+        try:
+            resultados = []
+            for parcial in self._obtener_executor().map(extraer_campos_lote, lotes):
+                resultados.extend(parcial)
+            return resultados
+        except BrokenProcessPool:
+            logger.exception("Pool de parsing PNR caído; se parsea en línea")
+            self.cerrar()
+            return extraer_campos_lote(pnrs)
+
+    def calentar(self):
+        """Arranca los procesos del pool para que el primer lote grande no pague el spawn"""
+        if self.procesos > 1:
+            list(self._obtener_executor().map(extraer_campos_lote, [[] for _ in range(self.procesos)]))
+
+    def cerrar(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _obtener_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: el proceso de la API ya tiene hilos (logging, caché, tareas) y
+                # conexiones pyodbc abiertas, y hacer fork desde ese estado no es seguro
+                self._executor = ProcessPoolExecutor(max_workers=self.procesos, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
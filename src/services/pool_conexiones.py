@@ -0,0 +1,105 @@
+"""
+Pool de conexiones pyodbc reutilizables.
+
+Evita abrir una conexión nueva (handshake TDS + autenticación) por cada request.
+Las conexiones inactivas por más de `validar_despues` segundos se validan con
+SELECT 1 antes de entregarse.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger("kontrol.pool")
+
+
+class PoolConexiones:
+    def __init__(self, conectar, tamano: int = 10, validar_despues: float = 60):
+        """conectar: función sin argumentos que abre una conexión nueva"""
+        self._conectar = conectar
+        self.tamano = tamano
+        self.validar_despues = validar_despues
+        self._lock = threading.Lock()
+        self._libres = []
+        self.abiertas = 0
+        self.creadas = 0
+        self.descartadas = 0
+
+    def obtener(self):
+        while True:
+            with self._lock:
+                if not self._libres:
+                    break
+                conn, devuelta = self._libres.pop()
+            if time.monotonic() - devuelta < self.validar_despues or self._es_valida(conn):
+                return conn
+            self._cerrar(conn)
+
+        conn = self._conectar()
+        with self._lock:
+            self.abiertas += 1
+            self.creadas += 1
+        return conn
+
+    def devolver(self, conn, descartar: bool = False):
+        if not descartar:
+            try:
+                conn.rollback()
+            except Exception:
+                descartar = True
+
+        with self._lock:
+            if not descartar and len(self._libres) < self.tamano:
+                self._libres.append((conn, time.monotonic()))
+                return
+        self._cerrar(conn, contar_descarte=descartar)
+
+    def calentar(self, cantidad: int = None) -> int:
+        """Abre conexiones hasta tener `cantidad` libres (por defecto el tamaño del pool)"""
+        cantidad = self.tamano if cantidad is None else min(cantidad, self.tamano)
+        nuevas = []
+        with self._lock:
+            faltantes = cantidad - len(self._libres)
+        for _ in range(max(0, faltantes)):
+            nuevas.append(self.obtener())
+        for conn in nuevas:
+            self.devolver(conn)
+        return len(nuevas)
+
+    def cerrar(self):
+        with self._lock:
+            libres, self._libres = self._libres, []
+        for conn, _ in libres:
+            self._cerrar(conn, contar_descarte=False)
+
+    def metricas(self) -> dict:
+        with self._lock:
+            libres = len(self._libres)
+        return {
+            "tamano": self.tamano,
+            "libres": libres,
+            "abiertas": self.abiertas,
+            "en_uso": self.abiertas - libres,
+            "creadas": self.creadas,
+            "descartadas": self.descartadas,
+        }
+
+    def _es_valida(self, conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception:
+            logger.info("Conexión inactiva inválida; se descarta")
+            return False
+
+    def _cerrar(self, conn, contar_descarte: bool = True):
+        with self._lock:
+            self.abiertas -= 1
+            if contar_descarte:
+                self.descartadas += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
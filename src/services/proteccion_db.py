@@ -0,0 +1,129 @@
+"""
+Protección de SQL Server ante lentitud o caídas.
+
+- LimiteConcurrencia: máximo de requests usando la BD a la vez; los que no
+  consiguen lugar en poco tiempo se rechazan con 503 en vez de acumularse en el
+  threadpool.
+- CircuitoDB: tras varios errores de conexión/timeout seguidos se abre y falla
+  rápido durante un tiempo; luego deja pasar una prueba (semiabierto) y se
+  cierra si responde.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger("kontrol.proteccion")
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+
+class LimiteConcurrencia:
+    def __init__(self, maximo: int, espera_seg: float = 0.5):
+        self.maximo = maximo
+        self.espera_seg = espera_seg
+        self._semaforo = threading.BoundedSemaphore(maximo)
+        self._lock = threading.Lock()
+        self.en_uso = 0
+        self.max_en_uso = 0
+        self.admitidas = 0
+        self.rechazadas = 0
+
+    def adquirir(self) -> bool:
+        if not self._semaforo.acquire(timeout=self.espera_seg):
+            with self._lock:
+                self.rechazadas += 1
+            return False
+        with self._lock:
+            self.en_uso += 1
+            self.admitidas += 1
+            self.max_en_uso = max(self.max_en_uso, self.en_uso)
+        return True
+
+    def liberar(self):
+        with self._lock:
+            self.en_uso -= 1
+        self._semaforo.release()
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                "maximo": self.maximo,
+                "espera_seg": self.espera_seg,
+                "en_uso": self.en_uso,
+                "max_en_uso": self.max_en_uso,
+                "admitidas": self.admitidas,
+                "rechazadas": self.rechazadas,
+            }
+
+
+class CircuitoDB:
+    def __init__(self, umbral_fallos: int = 5, reapertura_seg: float = 30):
+        self.umbral_fallos = umbral_fallos
+        self.reapertura_seg = reapertura_seg
+        self._lock = threading.Lock()
+        self.estado = CERRADO
+        self.fallos_seguidos = 0
+        self.abierto_desde = None
+        self._prueba_en_curso = False
+        self.aperturas = 0
+        self.rechazadas = 0
+        self.servidas_cache = 0
+
+    def permitir(self) -> bool:
+        """False si el circuito está abierto (o ya hay una prueba en curso)"""
+        with self._lock:
+            if self.estado == CERRADO:
+                return True
+            if self.estado == ABIERTO and time.monotonic() - self.abierto_desde >= self.reapertura_seg:
+                self.estado = SEMIABIERTO
+            if self.estado == SEMIABIERTO and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+            self.rechazadas += 1
+            return False
+
+    def exito(self):
+        with self._lock:
+            if self.estado != CERRADO:
+                logger.info("Circuito de BD cerrado: SQL Server responde de nuevo")
+            self.estado = CERRADO
+            self.fallos_seguidos = 0
+            self.abierto_desde = None
+            self._prueba_en_curso = False
+
+    def fallo(self):
+        with self._lock:
+            self.fallos_seguidos += 1
+            self._prueba_en_curso = False
+            if self.estado == SEMIABIERTO or (self.estado == CERRADO and self.fallos_seguidos >= self.umbral_fallos):
+                if self.estado == CERRADO:
+                    self.aperturas += 1
+                    logger.warning("Circuito de BD abierto", extra={"fallos_seguidos": self.fallos_seguidos})
+                self.estado = ABIERTO
+                self.abierto_desde = time.monotonic()
+
+    def contar_servida_cache(self):
+        with self._lock:
+            self.servidas_cache += 1
+
+    def reintentar_en(self) -> int:
+        """Segundos sugeridos para Retry-After"""
+        with self._lock:
+            if self.abierto_desde is None:
+                return 1
+            return max(1, int(self.reapertura_seg - (time.monotonic() - self.abierto_desde)))
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                "estado": self.estado,
+                "fallos_seguidos": self.fallos_seguidos,
+                "umbral_fallos": self.umbral_fallos,
+                "reapertura_seg": self.reapertura_seg,
+                "abierto_seg": round(time.monotonic() - self.abierto_desde, 1) if self.abierto_desde else None,
+                "aperturas": self.aperturas,
+                "rechazadas": self.rechazadas,
+                "servidas_cache": self.servidas_cache,
+            }
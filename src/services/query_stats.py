@@ -0,0 +1,195 @@
+"""
+Estadísticas de ejecución SQL por huella (fingerprint) y registro de consultas lentas.
+
+Envuelve la conexión y el cursor de pyodbc para medir cada sentencia sin tocar
+los puntos donde se llama a cursor.execute.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger("kontrol.sql")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+
+_RE_COMENTARIOS = re.compile(r"--[^\n]*")
+_RE_CADENAS = re.compile(r"N?'(?:[^']|'')*'")
+_RE_NUMEROS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTAS = re.compile(r"\((?:\?\s*,\s*)*\?\)(?:\s*,\s*\((?:\?\s*,\s*)*\?\))+")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+
+def huella_sql(sql: str) -> str:
+    """Normaliza una sentencia quitando literales, comentarios y espacios repetidos"""
+    texto = _RE_COMENTARIOS.sub(" ", sql)
+    texto = _RE_CADENAS.sub("?", texto)
+    texto = _RE_NUMEROS.sub("?", texto)
+    texto = _RE_LISTAS.sub("(...)+", texto)
+    return _RE_ESPACIOS.sub(" ", texto).strip()
+
+
+def redactar_parametros(params) -> list:
+    """Reemplaza los valores de los parámetros por su tipo (nunca se registran datos)"""
+    if not params:
+        return []
+    if len(params) == 1 and isinstance(params[0], (list, tuple)):
+        params = params[0]
+    return [type(p).__name__ for p in params]
+
+
+class EstadisticasConsultas:
+    """Acumulado en memoria de tiempos y filas por huella de sentencia"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._datos = {}
+
+    def registrar(self, huella: str, ms: float, filas: int):
+        clave = hashlib.md5(huella.encode("utf-8")).hexdigest()[:12]
+        with self._lock:
+            item = self._datos.get(clave)
+            if item is None:
+                item = self._datos[clave] = {
+                    "id": clave,
+                    "sentencia": huella,
+                    "ejecuciones": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "filas": 0,
+                    "lentas": 0,
+                }
+            item["ejecuciones"] += 1
+            item["total_ms"] += ms
+            item["max_ms"] = max(item["max_ms"], ms)
+            item["filas"] += filas
+            if ms >= SLOW_QUERY_MS:
+                item["lentas"] += 1
+
+    def top(self, n: int = 20, orden: str = "total_ms") -> list:
+        with self._lock:
+            items = [dict(item) for item in self._datos.values()]
+        for item in items:
+            item["promedio_ms"] = round(item["total_ms"] / item["ejecuciones"], 2)
+            item["total_ms"] = round(item["total_ms"], 2)
+            item["max_ms"] = round(item["max_ms"], 2)
+        return sorted(items, key=lambda i: i.get(orden, 0), reverse=True)[:n]
+
+    def reiniciar(self):
+        with self._lock:
+            self._datos.clear()
+
+
+estadisticas = EstadisticasConsultas()
+
+
+class CursorMedido:
+    """Cursor que mide execute + fetch de cada sentencia y la registra al terminar"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._actual = None
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def execute(self, sql, *params):
+        self._finalizar()
+        inicio = time.perf_counter()
+        self._cursor.execute(sql, *params)
+        ms = (time.perf_counter() - inicio) * 1000
+        filas = self._cursor.rowcount if self._cursor.rowcount and self._cursor.rowcount > 0 else 0
+        self._actual = {"sql": sql, "params": params, "ms": ms, "filas": filas}
+        return self
+
+    def executemany(self, sql, params):
+        self._finalizar()
+        inicio = time.perf_counter()
+        self._cursor.executemany(sql, params)
+        ms = (time.perf_counter() - inicio) * 1000
+        self._actual = {"sql": sql, "params": (params[0],) if params else (), "ms": ms, "filas": len(params)}
+        return self
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._acumular(inicio, 1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, size=None):
+        inicio = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._acumular(inicio, len(rows))
+        return rows
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._acumular(inicio, len(rows))
+        self._finalizar()
+        return rows
+
+    def close(self):
+        self._finalizar()
+        self._cursor.close()
+
+    def _acumular(self, inicio, filas):
+        if self._actual is not None:
+            self._actual["ms"] += (time.perf_counter() - inicio) * 1000
+            self._actual["filas"] += filas
+
+    def _finalizar(self):
+        actual, self._actual = self._actual, None
+        if actual is None:
+            return
+        huella = huella_sql(actual["sql"])
+        estadisticas.registrar(huella, actual["ms"], actual["filas"])
+        if actual["ms"] >= SLOW_QUERY_MS:
+            logger.warning("Consulta lenta", extra={
+                "duracion_ms": round(actual["ms"], 1),
+                "filas": actual["filas"],
+                "sentencia": huella,
+                "parametros": redactar_parametros(actual["params"]),
+            })
+
+
+class ConexionMedida:
+    """Conexión que entrega cursores medidos y cierra sus mediciones al hacer commit/close"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursores = []
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+    def cursor(self):
+        cursor = CursorMedido(self._conn.cursor())
+        self._cursores.append(cursor)
+        return cursor
+
+    def commit(self):
+        self._finalizar_cursores()
+        self._conn.commit()
+
+    def close(self):
+        self.finalizar()
+        self._conn.close()
+
+    def finalizar(self):
+        """Registra las sentencias pendientes sin cerrar la conexión (p. ej. al devolverla al pool)"""
+        self._finalizar_cursores()
+        self._cursores = []
+
+    def _finalizar_cursores(self):
+        for cursor in self._cursores:
+            cursor._finalizar()
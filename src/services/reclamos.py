@@ -0,0 +1,205 @@
+"""
+Cola de reclamo de tiquetes pendientes para los asesores.
+
+Un asesor pide los siguientes N pendientes del día (por hora de vuelo) y quedan
+a su nombre por RECLAMO_LEASE_SEG segundos: id_reclamado_por y
+dt_reclamo_expira (UTC) en VueloIDA/VueloREG. La toma es un solo UPDATE sobre
+TOP (N) ... WITH (ROWLOCK, READPAST, UPDLOCK) con OUTPUT: dos asesores que
+reclaman a la vez saltan las filas que el otro tiene bloqueadas en lugar de
+esperarlo, y nunca reciben el mismo tiquete. Un reclamo vencido vuelve a estar
+disponible; marcar el tiquete como procesado lo libera.
+
+Se reclama el tiquete completo por el tramo que escribe PUT .../estado: IDA si
+existe y REG solo para tiquetes sin IDA. Así nadie recibe el regreso de un
+tiquete cuya ida tiene otro asesor.
+
+Las columnas se agregan también a las tablas _Hist: el archivo mueve filas con
+OUTPUT deleted.* INTO, que exige la misma estructura en ambas.
+"""
+import logging
+import os
+import threading
+
+from archivo import TABLAS, tabla_historica
+
+logger = logging.getLogger("kontrol.reclamos")
+
+RECLAMOS_HABILITADO = os.getenv("RECLAMOS_HABILITADO", "false").lower() == "true"
+RECLAMO_LEASE_SEG = int(os.getenv("RECLAMO_LEASE_SEG", "300"))
+RECLAMO_MAX_CANTIDAD = int(os.getenv("RECLAMO_MAX_CANTIDAD", "20"))
+
+# Mismo orden en la tabla viva y en la histórica
+COLUMNAS_RECLAMO = [("id_reclamado_por", "NVARCHAR(100)"), ("dt_reclamo_expira", "DATETIME2")]
+
+# Fragmentos para el UPDATE de estado: procesar libera el reclamo y solo lo puede
+# hacer quien lo tiene (o cualquiera si no hay reclamo vigente)
+SET_LIBERAR = "id_reclamado_por = NULL, dt_reclamo_expira = NULL"
+FILTRO_DISPONIBLE = "(id_reclamado_por IS NULL OR id_reclamado_por = ? OR dt_reclamo_expira < SYSUTCDATETIME())"
+FILTRO_PENDIENTE = "id_asesor IS NULL AND ISNULL(id_estado, 'Pendiente') <> 'Procesado'"
+
+_columnas_creadas = False
+
+
+def crear_columnas(conn):
+    """Agrega las columnas de reclamo a las tablas vivas e históricas (una sola vez por proceso)"""
+    global _columnas_creadas
+    if _columnas_creadas:
+        return
+    cursor = conn.cursor()
+    for tabla, _ in TABLAS.values():
+        hist = tabla_historica(tabla)
+        cursor.execute("SELECT OBJECT_ID(?, 'U')", (hist,))
+        tablas = [tabla, hist] if cursor.fetchone()[0] is not None else [tabla]
+        for destino in tablas:
+            for columna, tipo in COLUMNAS_RECLAMO:
+                cursor.execute("SELECT COL_LENGTH(?, ?)", (destino, columna))
+                if cursor.fetchone()[0] is None:
+                    cursor.execute(f"ALTER TABLE {destino} ADD {columna} {tipo} NULL")
+                    logger.info("Columna de reclamo agregada", extra={"tabla": destino, "columna": columna})
+    conn.commit()
+    _columnas_creadas = True
+
+
+def columnas_listas() -> bool:
+    """True si este proceso ya verificó/creó las columnas (el UPDATE de estado las usa solo entonces)"""
+    return _columnas_creadas
+
+
+def sql_reclamar(tabla: str, columna_fecha: str, sqlite: bool = False) -> str:
+    """
+    UPDATE atómico de los siguientes pendientes libres. Parámetros: (cantidad,
+    desde, hasta, asesor, lease_seg) en SQL Server; SQLite no tiene UPDATE sobre
+    CTE ni OUTPUT, pero serializa las escrituras: subconsulta + RETURNING con
+    (asesor, lease_seg, desde, hasta, cantidad).
+    """
+    columnas = f"id_documento, ds_paxname, ds_paxape, ds_itinerario, ds_records, {columna_fecha}, id_atencion, dt_reclamo_expira"
+    ida, _ = TABLAS["IDA"]
+    # El regreso de un tiquete con ida se procesa (y se reclama) por la ida
+    sin_ida = "" if tabla == ida else f"AND NOT EXISTS (SELECT 1 FROM {ida} i WHERE i.id_documento = v.id_documento)"
+    condiciones = f"""
+        {FILTRO_PENDIENTE}
+        AND TRY_CONVERT(date, {columna_fecha}) >= ? AND TRY_CONVERT(date, {columna_fecha}) <= ?
+        AND (id_reclamado_por IS NULL OR dt_reclamo_expira < SYSUTCDATETIME())
+        {sin_ida}
+    """
+    if sqlite:
+        return f"""
+            UPDATE {tabla}
+            SET id_reclamado_por = ?, dt_reclamo_expira = DATEADD(second, ?, SYSUTCDATETIME())
+            WHERE id_documento IN (
+                SELECT v.id_documento FROM {tabla} v
+                WHERE {condiciones}
+                ORDER BY {columna_fecha}
+                LIMIT ?
+            )
+            RETURNING {columnas}
+        """
+    salida = ", ".join(f"inserted.{c.strip()}" for c in columnas.split(","))
+    return f"""
+        WITH siguientes AS (
+            SELECT TOP (?) *
+            FROM {tabla} v WITH (ROWLOCK, READPAST, UPDLOCK)
+            WHERE {condiciones}
+            ORDER BY {columna_fecha}
+        )
+        UPDATE siguientes
+        SET id_reclamado_por = ?, dt_reclamo_expira = DATEADD(second, ?, SYSUTCDATETIME())
+        OUTPUT {salida}
+    """
+
+
+class ColaReclamos:
+    def __init__(self, sqlite: bool = False, lease_seg: int = RECLAMO_LEASE_SEG):
+        self.sqlite = sqlite
+        self.lease_seg = lease_seg
+        self._lock = threading.Lock()
+        self.reclamados = 0
+        self.vacios = 0
+        self.liberados = 0
+        self.renovados = 0
+        self.conflictos = 0
+
+    def reclamar(self, conn, asesor: str, cantidad: int, desde, hasta, tipos=("IDA", "REG")) -> list:
+        """[(tipo_vuelo, fila)] reclamados para el asesor; IDA primero y REG completa lo que falte"""
+        cursor = conn.cursor()
+        tomados = []
+        for tipo in tipos:
+            faltan = cantidad - len(tomados)
+            if faltan <= 0:
+                break
+            tabla, columna_fecha = TABLAS[tipo]
+            if self.sqlite:
+                parametros = (asesor, self.lease_seg, desde, hasta, faltan)
+            else:
+                parametros = (faltan, desde, hasta, asesor, self.lease_seg)
+            cursor.execute(sql_reclamar(tabla, columna_fecha, self.sqlite), parametros)
+            columnas = [col[0] for col in cursor.description]
+            filas = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+            # OUTPUT no garantiza el orden del TOP
+            filas.sort(key=lambda f: str(f.get(columna_fecha) or ""))
+            tomados.extend((tipo, fila) for fila in filas)
+        conn.commit()
+        with self._lock:
+            self.reclamados += len(tomados)
+            if not tomados:
+                self.vacios += 1
+        return tomados
+
+    def liberar(self, conn, cd_tiquete: str, asesor: str) -> int:
+        """Suelta los tramos del tiquete reclamados por el asesor; devuelve las filas liberadas"""
+        cursor = conn.cursor()
+        filas = 0
+        for tabla, _ in TABLAS.values():
+            cursor.execute(f"""
+                UPDATE {tabla}
+                SET {SET_LIBERAR}
+                WHERE id_documento = ? AND id_reclamado_por = ?
+            """, (cd_tiquete, asesor))
+            filas += cursor.rowcount
+        conn.commit()
+        with self._lock:
+            self.liberados += filas
+        return filas
+
+    def renovar(self, conn, cd_tiquete: str, asesor: str) -> int:
+        """Extiende el lease de los tramos pendientes que el asesor sigue teniendo"""
+        cursor = conn.cursor()
+        filas = 0
+        for tabla, _ in TABLAS.values():
+            cursor.execute(f"""
+                UPDATE {tabla}
+                SET dt_reclamo_expira = DATEADD(second, ?, SYSUTCDATETIME())
+                WHERE id_documento = ? AND id_reclamado_por = ? AND {FILTRO_PENDIENTE}
+            """, (self.lease_seg, cd_tiquete, asesor))
+            filas += cursor.rowcount
+        conn.commit()
+        with self._lock:
+            self.renovados += filas
+        return filas
+
+    def titular(self, cursor, cd_tiquete: str):
+        """(asesor, expira) del reclamo vigente del tiquete o None"""
+        for tabla, _ in TABLAS.values():
+            cursor.execute(f"""
+                SELECT id_reclamado_por, dt_reclamo_expira FROM {tabla}
+                WHERE id_documento = ? AND id_reclamado_por IS NOT NULL AND dt_reclamo_expira >= SYSUTCDATETIME()
+            """, (cd_tiquete,))
+            fila = cursor.fetchone()
+            if fila is not None:
+                return fila[0], fila[1]
+        return None
+
+    def contar_conflicto(self):
+        with self._lock:
+            self.conflictos += 1
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                "lease_seg": self.lease_seg,
+                "reclamados": self.reclamados,
+                "vacios": self.vacios,
+                "liberados": self.liberados,
+                "renovados": self.renovados,
+                "conflictos": self.conflictos,
+            }
@@ -0,0 +1,205 @@
+"""
+Tabla resumen diaria de reservas (fecha x sucursal x cuenta x tipo de vuelo).
+
+Los días cerrados (anteriores a hoy) se consolidan de forma incremental en
+dbo.ReservasResumenDiario; las consultas agregadas leen de ahí y solo van a las
+tablas de vuelos para los días posteriores al corte (incluidas las históricas
+cuando el rango alcanza el límite de archivo).
+
+Los tramos sin fecha de vuelo (NULL o no convertible) no caben en ningún día:
+no se consolidan y consultar_resumen los devuelve aparte, con fecha None, cuando
+la consulta no filtra por fechas.
+"""
+import logging
+import os
+from datetime import date, timedelta
+
+import archivo
+
+logger = logging.getLogger("kontrol.rollup")
+
+TABLA_RESUMEN = "dbo.ReservasResumenDiario"
+ROLLUP_REPROCESO_DIAS = int(os.getenv("ROLLUP_REPROCESO_DIAS", "3"))
+
+SQL_CREAR_TABLA = f"""
+    IF OBJECT_ID('{TABLA_RESUMEN}', 'U') IS NULL
+    CREATE TABLE {TABLA_RESUMEN} (
+        fecha DATE NOT NULL,
+        cd_sucursal VARCHAR(20) NOT NULL,
+        id_cuenta VARCHAR(100) NOT NULL,
+        tipo_vuelo CHAR(3) NOT NULL,
+        total INT NOT NULL,
+        dt_actualizado DATETIME NOT NULL DEFAULT GETDATE(),
+        CONSTRAINT PK_ReservasResumenDiario PRIMARY KEY (fecha, cd_sucursal, id_cuenta, tipo_vuelo)
+    )
+"""
+
+_SQL_TRAMO_IDA = """
+        SELECT
+            TRY_CONVERT(date, dt_salida) AS fecha,
+            UPPER(LTRIM(RTRIM(ISNULL(cd_sucursal, '')))) AS cd_sucursal,
+            CAST(ISNULL(id_cuenta, '') AS VARCHAR(100)) AS id_cuenta,
+            'IDA' AS tipo_vuelo
+        FROM dbo.VueloIDA
+"""
+
+_SQL_TRAMO_REG = """
+        SELECT
+            TRY_CONVERT(date, dt_llegada) AS fecha,
+            UPPER(LTRIM(RTRIM(ISNULL(cd_sucursal, '')))) AS cd_sucursal,
+            CAST(ISNULL(id_cuenta, '') AS VARCHAR(100)) AS id_cuenta,
+            'REG' AS tipo_vuelo
+        FROM dbo.VueloREG
+"""
+
+
+def _sql_tramos(historico: bool = False) -> str:
+    """Tramos de las tablas vivas, más las históricas si historico es True"""
+    partes = [_SQL_TRAMO_IDA, _SQL_TRAMO_REG]
+    if historico:
+        partes += [
+            _SQL_TRAMO_IDA.replace("dbo.VueloIDA", archivo.tabla_historica("dbo.VueloIDA")),
+            _SQL_TRAMO_REG.replace("dbo.VueloREG", archivo.tabla_historica("dbo.VueloREG")),
+        ]
+    return " UNION ALL ".join(partes)
+
+
+def sql_agregado(historico: bool = False) -> str:
+    """Agregado para un rango [?, ?] de fechas de vuelo"""
+    return f"""
+    SELECT fecha, cd_sucursal, id_cuenta, tipo_vuelo, COUNT(*) AS total
+    FROM ({_sql_tramos(historico)}) AS Combined
+    WHERE fecha >= ? AND fecha <= ?
+    GROUP BY fecha, cd_sucursal, id_cuenta, tipo_vuelo
+"""
+
+
+def sql_agregado_sin_fecha(historico: bool = False) -> str:
+    """Tramos sin fecha de vuelo válida, que el filtro por rango deja afuera"""
+    return f"""
+    SELECT NULL AS fecha, cd_sucursal, id_cuenta, tipo_vuelo, COUNT(*) AS total
+    FROM ({_sql_tramos(historico)}) AS Combined
+    WHERE fecha IS NULL
+    GROUP BY cd_sucursal, id_cuenta, tipo_vuelo
+"""
+
+
+_tabla_creada = False
+
+
+def crear_tabla(conn):
+    """Crea la tabla resumen si no existe (una sola vez por proceso)"""
+    global _tabla_creada
+    if _tabla_creada:
+        return
+    cursor = conn.cursor()
+    cursor.execute(SQL_CREAR_TABLA)
+    conn.commit()
+    _tabla_creada = True
+
+
+def fecha_corte(cursor):
+    """Último día consolidado en la tabla resumen (None si está vacía)"""
+    cursor.execute(f"SELECT MAX(fecha) FROM {TABLA_RESUMEN}")
+    row = cursor.fetchone()
+    return _como_fecha(row[0]) if row and row[0] else None
+
+
+def actualizar_resumen(conn, hasta: date = None):
+    """
+    Consolida los días cerrados desde el último corte (menos un margen de
+    reproceso por actualizaciones tardías) hasta ayer, mes a mes.
+    Usa sp_getapplock para que solo un worker ejecute el job a la vez.
+    """
+    hasta = hasta or date.today() - timedelta(days=1)
+    cursor = conn.cursor()
+
+    corte = fecha_corte(cursor)
+    if corte is None:
+        tablas = [(tabla, columna) for tabla, columna in archivo.TABLAS.values()]
+        if archivo.hay_historico(cursor):
+            tablas += [(archivo.tabla_historica(tabla), columna) for tabla, columna in archivo.TABLAS.values()]
+        minimos = " UNION ALL ".join(
+            f"SELECT MIN(TRY_CONVERT(date, {columna})) AS fecha FROM {tabla}" for tabla, columna in tablas
+        )
+        cursor.execute(f"SELECT MIN(fecha) FROM ({minimos}) AS Minimos")
+        row = cursor.fetchone()
+        if not row or not row[0]:
+            return 0
+        desde = _como_fecha(row[0])
+    else:
+        desde = corte - timedelta(days=ROLLUP_REPROCESO_DIAS)
+
+    dias = 0
+    while desde <= hasta:
+        fin_lote = min(_fin_de_mes(desde), hasta)
+
+        cursor.execute("""
+            SET NOCOUNT ON;
+            DECLARE @r INT;
+            EXEC @r = sp_getapplock @Resource = 'ReservasResumenDiario', @LockMode = 'Exclusive',
+                                    @LockOwner = 'Transaction', @LockTimeout = 0;
+            SELECT @r;
+        """)
+        if cursor.fetchone()[0] < 0:
+            conn.rollback()
+            logger.info("Resumen diario en proceso por otro worker; se omite")
+            return dias
+
+        cursor.execute(f"DELETE FROM {TABLA_RESUMEN} WHERE fecha >= ? AND fecha <= ?", (desde, fin_lote))
+        cursor.execute(f"""
+            INSERT INTO {TABLA_RESUMEN} (fecha, cd_sucursal, id_cuenta, tipo_vuelo, total)
+            {sql_agregado(archivo.alcanza_archivo(desde) and archivo.hay_historico(cursor))}
+        """, (desde, fin_lote))
+        conn.commit()
+
+        dias += (fin_lote - desde).days + 1
+        desde = fin_lote + timedelta(days=1)
+
+    logger.info("Resumen diario actualizado", extra={"dias": dias, "hasta": hasta.isoformat()})
+    return dias
+
+
+def consultar_resumen(cursor, fecha_inicio: date = None, fecha_fin: date = None, con_resumen: bool = True) -> tuple:
+    """
+    Devuelve (filas, corte): días <= corte desde la tabla resumen y días
+    posteriores desde las tablas de vuelos (todo desde ahí si con_resumen es
+    False). Cada fila es (fecha, cd_sucursal, id_cuenta, tipo_vuelo, total); sin
+    filtro de fechas se agregan los tramos sin fecha con fecha None.
+    """
+    inicio = fecha_inicio or date(1900, 1, 1)
+    fin = fecha_fin or date(9999, 12, 31)
+
+    corte = fecha_corte(cursor) if con_resumen else None
+    filas = []
+
+    if corte is not None and inicio <= corte:
+        cursor.execute(f"""
+            SELECT fecha, cd_sucursal, id_cuenta, tipo_vuelo, total
+            FROM {TABLA_RESUMEN}
+            WHERE fecha >= ? AND fecha <= ?
+        """, (inicio, min(fin, corte)))
+        filas.extend(cursor.fetchall())
+
+    inicio_vivo = max(inicio, corte + timedelta(days=1)) if corte is not None else inicio
+    if inicio_vivo <= fin:
+        historico = archivo.alcanza_archivo(inicio_vivo) and archivo.hay_historico(cursor)
+        cursor.execute(sql_agregado(historico), (inicio_vivo, fin))
+        filas.extend(cursor.fetchall())
+
+    if fecha_inicio is None and fecha_fin is None:
+        cursor.execute(sql_agregado_sin_fecha(archivo.hay_historico(cursor)))
+        filas.extend(cursor.fetchall())
+
+    return filas, corte
+
+
+def _fin_de_mes(dia: date) -> date:
+    siguiente = (dia.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return siguiente - timedelta(days=1)
+
+
+def _como_fecha(valor) -> date:
+    if isinstance(valor, date):
+        return valor if type(valor) is date else valor.date()
+    return date.fromisoformat(str(valor)[:10])
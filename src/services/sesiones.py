@@ -0,0 +1,115 @@
+"""
+Tokens de sesión firmados (HMAC-SHA256) con expiración.
+
+La verificación no consulta la base de datos: basta con la firma, la fecha de
+expiración y, opcionalmente, la lista de revocación en memoria (logouts).
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+
+logger = logging.getLogger("kontrol.sesiones")
+
+SESSION_TTL_HORAS = float(os.getenv("SESSION_TTL_HORAS", "12"))
+SESSION_SECRET = os.getenv("SESSION_SECRET", "")
+
+if not SESSION_SECRET:
+    # Sin secreto compartido cada proceso firma con su propia clave: los tokens no
+    # sobreviven a un reinicio ni son válidos entre workers
+    SESSION_SECRET = secrets.token_urlsafe(32)
+    logger.warning("SESSION_SECRET no configurado; se usa una clave temporal por proceso")
+
+_CLAVE = SESSION_SECRET.encode("utf-8")
+
+
+class TokenInvalido(Exception):
+    pass
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64_decode(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def _firmar(contenido: str) -> str:
+    return _b64(hmac.new(_CLAVE, contenido.encode("ascii"), hashlib.sha256).digest())
+
+
+def emitir_token(usuario: dict, ttl_horas: float = SESSION_TTL_HORAS) -> tuple:
+    """Devuelve (token, payload) para el usuario autenticado"""
+    ahora = int(time.time())
+    payload = {
+        "sub": usuario["email"],
+        "uid": usuario.get("id"),
+        "rol": usuario.get("rol"),
+        "iat": ahora,
+        "exp": ahora + int(ttl_horas * 3600),
+        "jti": secrets.token_hex(8),
+    }
+    contenido = _b64(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    return f"{contenido}.{_firmar(contenido)}", payload
+
+
+def verificar_token(token: str) -> dict:
+    """Valida firma, expiración y revocación; devuelve el payload o lanza TokenInvalido"""
+    try:
+        contenido, firma = token.split(".")
+    except (AttributeError, ValueError):
+        raise TokenInvalido("Token mal formado")
+
+    # Como bytes: compare_digest no acepta str con caracteres no ASCII
+    try:
+        valida = hmac.compare_digest(firma.encode("ascii"), _firmar(contenido).encode("ascii"))
+    except (UnicodeEncodeError, TypeError):
+        raise TokenInvalido("Token mal formado")
+    if not valida:
+        raise TokenInvalido("Firma inválida")
+
+    try:
+        payload = json.loads(_b64_decode(contenido))
+    except ValueError:
+        raise TokenInvalido("Token mal formado")
+    if not isinstance(payload, dict):
+        raise TokenInvalido("Token mal formado")
+
+    if payload.get("exp", 0) < time.time():
+        raise TokenInvalido("Sesión expirada")
+    if revocados.contiene(payload.get("jti")):
+        raise TokenInvalido("Sesión cerrada")
+    return payload
+
+
+class ListaRevocacion:
+    """jti revocados hasta su expiración natural (en memoria, por proceso)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jtis = {}
+
+    def revocar(self, jti: str, exp: float):
+        with self._lock:
+            self._jtis[jti] = exp
+            self._purgar()
+
+    def contiene(self, jti: str) -> bool:
+        if not self._jtis:
+            return False
+        with self._lock:
+            return jti in self._jtis
+
+    def _purgar(self):
+        ahora = time.time()
+        for jti in [j for j, exp in self._jtis.items() if exp < ahora]:
+            del self._jtis[jti]
+
+
+revocados = ListaRevocacion()
@@ -0,0 +1,48 @@
+"""
+Tareas periódicas en hilos de fondo para el servicio (jobs programados).
+"""
+import logging
+import threading
+
+logger = logging.getLogger("kontrol.tareas")
+
+
+class TareaPeriodica:
+    """Ejecuta `funcion` cada `intervalo` segundos en un hilo daemon hasta detener()"""
+
+    def __init__(self, nombre: str, funcion, intervalo: float, inmediata: bool = True):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.intervalo = intervalo
+        self.inmediata = inmediata
+        self.ejecuciones = 0
+        self.errores = 0
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ciclo, name=f"tarea-{self.nombre}", daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout: float = 10):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+            self._hilo = None
+
+    def ejecutar_ahora(self):
+        try:
+            self.funcion()
+            self.ejecuciones += 1
+        except Exception:
+            self.errores += 1
+            logger.exception("Error en tarea periódica", extra={"tarea": self.nombre})
+
+    def _ciclo(self):
+        if self.inmediata:
+            self.ejecutar_ahora()
+        while not self._detener.wait(self.intervalo):
+            self.ejecutar_ahora()
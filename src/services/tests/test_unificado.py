@@ -0,0 +1,74 @@
+"""
+Vista unificada (unificado=true) con filtro tipo_vuelo: los campos de gestión
+salen del tramo filtrado, en memoria y en SQL.
+
+    cd src/services
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_BACKEND", "sqlite")
+
+import pytest
+
+import api
+import db_local
+
+
+def tramo(tipo, id_estado, id_asesor=None, id_silla=None):
+    return {
+        "cd_tiquete": "T1", "tipo_vuelo": tipo, "ds_paxname": "ANA",
+        "dt_salida": "2026-10-01T08:00:00" if tipo == "IDA" else None,
+        "dt_llegada": "2026-10-18T20:00:00" if tipo == "REG" else None,
+        "id_estado": id_estado, "id_asesor": id_asesor, "id_silla": id_silla,
+    }
+
+
+def test_memoria_regreso_pendiente_con_ida_procesada():
+    tramos = [tramo("IDA", "Procesado", "asesor@kontrol", "3C"), tramo("REG", "Pendiente")]
+
+    (regreso,) = api.unificar_tramos(tramos, "REG")
+    assert regreso["tipo_vuelo"] == "REG"
+    assert regreso["id_estado"] == "Pendiente"
+    assert regreso["id_asesor"] is None and regreso["id_silla"] is None
+    assert (regreso["estado_ida"], regreso["estado_regreso"]) == ("Procesado", "Pendiente")
+
+    (ida,) = api.unificar_tramos(tramos)
+    assert ida["tipo_vuelo"] == "IDA" and ida["id_estado"] == "Procesado"
+
+
+@pytest.fixture
+def conexion(tmp_path):
+    ruta = str(tmp_path / "kontrol.sqlite3")
+    db_local.crear_esquema(ruta)
+    conn = db_local.conectar(ruta)
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO VueloIDA (id_documento, ds_paxname, dt_salida, id_estado, id_asesor, id_silla) VALUES (?, ?, ?, ?, ?, ?)",
+        ("T1", "ANA", "2026-10-01 08:00:00", "Procesado", "asesor@kontrol", "3C"),
+    )
+    cursor.execute(
+        "INSERT INTO VueloREG (id_documento, ds_paxname, dt_llegada, id_estado) VALUES (?, ?, ?, ?)",
+        ("T1", "ANA", "2026-10-18 20:00:00", "Pendiente"),
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("tramo_filtrado, estado, asesor", [("REG", "Pendiente", None), ("IDA", "Procesado", "asesor@kontrol")])
+def test_sql_toma_el_tramo_filtrado(conexion, tramo_filtrado, estado, asesor):
+    cursor = conexion.cursor()
+    # SQLite no tiene FULL OUTER JOIN antes de 3.39; basta con el LEFT JOIN para un tiquete con ambos tramos
+    consulta = api.sql_tiquetes_unificados(tramo=tramo_filtrado)
+    if db_local.sqlite3.sqlite_version_info < (3, 39):
+        consulta = consulta.replace("FULL OUTER JOIN", "LEFT JOIN")
+    cursor.execute(f"SELECT * FROM ({consulta}) AS u")
+    (_, tiquete), = api.filas_a_tiquetes(cursor)
+
+    assert tiquete["tipo_vuelo"] == tramo_filtrado
+    assert tiquete["id_estado"] == estado
+    assert tiquete["id_asesor"] == asesor
+    assert (tiquete["estado_ida"], tiquete["estado_regreso"]) == ("Procesado", "Pendiente")
@@ -0,0 +1,186 @@
+"""
+Manifiesto de vuelos: segmentos estructurados a partir de ds_itinerario e índice
+en memoria vuelo -> tiquetes.
+
+ds_itinerario es texto libre del GDS o del registro manual
+('AV9350 BOG-MDE 15OCT 06:00 / AV9351 MDE-BOG 20OCT 18:00', 'AV 9350 BOGMDE'...).
+Cada segmento con aerolínea + número de vuelo se indexa por (vuelo, fecha). La
+fecha DDMMM se ubica en el año más cercano a la fecha de vuelo del tramo; si el
+segmento no trae fecha se usa la del tramo.
+"""
+import re
+import threading
+import time
+from datetime import date, datetime
+
+MESES = {m: i for i, m in enumerate(
+    ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"], start=1
+)}
+# Abreviaturas en español que aparecen en los registros manuales
+MESES.update({"ENE": 1, "ABR": 4, "AGO": 8, "DIC": 12})
+
+# Segmentos: ' / ', ';', '|', saltos de línea o comas
+RE_SEPARADOR = re.compile(r"\s+/\s+|[;|\n,]")
+# Código IATA de aerolínea (2 caracteres, al menos una letra) + número de 1 a 4 dígitos
+RE_VUELO = re.compile(r"\b((?:[A-Z][A-Z0-9]|[0-9][A-Z]))\s?0*(\d{1,4})[A-Z]?\b")
+RE_RUTA = re.compile(r"\b([A-Z]{3})\s?[-/]?\s?([A-Z]{3})\b")
+RE_FECHA = re.compile(r"\b(\d{1,2})\s?(" + "|".join(MESES) + r")\b")
+RE_HORA = re.compile(r"\b([01]?\d|2[0-3]):?([0-5]\d)\b")
+
+
+def normalizar_vuelo(texto) -> str:
+    """'av 0935' -> 'AV935'; None si no parece un vuelo"""
+    encontrado = RE_VUELO.search(str(texto or "").upper())
+    if encontrado is None:
+        return None
+    return f"{encontrado.group(1)}{int(encontrado.group(2))}"
+
+
+def fecha_de(valor):
+    """date a partir de date, datetime o texto 'YYYY-MM-DD...'"""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    if isinstance(valor, str) and len(valor) >= 10:
+        try:
+            return date.fromisoformat(valor[:10])
+        except ValueError:
+            return None
+    return None
+
+
+def _fecha_segmento(dia: int, mes: int, referencia: date):
+    candidatas = []
+    for anio in (referencia.year - 1, referencia.year, referencia.year + 1):
+        try:
+            candidatas.append(date(anio, mes, dia))
+        except ValueError:
+            continue
+    return min(candidatas, key=lambda f: abs((f - referencia).days), default=None)
+
+
+def parsear_itinerario(texto, fecha_vuelo: date = None) -> list:
+    """[{vuelo, aerolinea, numero, fecha, origen, destino, hora}] de los segmentos con número de vuelo"""
+    if not texto:
+        return []
+    referencia = fecha_vuelo or date.today()
+    segmentos = []
+    for parte in RE_SEPARADOR.split(str(texto).upper()):
+        vuelo = RE_VUELO.search(parte)
+        if vuelo is None:
+            continue
+        # Lo que sigue al número: evita tomar el código de aerolínea como origen
+        resto = parte[vuelo.end():]
+        ruta = RE_RUTA.search(resto)
+        fecha = RE_FECHA.search(resto)
+        hora = RE_HORA.search(RE_FECHA.sub(" ", resto))
+        fecha_segmento = _fecha_segmento(int(fecha.group(1)), MESES[fecha.group(2)], referencia) if fecha else None
+        segmentos.append({
+            "vuelo": f"{vuelo.group(1)}{int(vuelo.group(2))}",
+            "aerolinea": vuelo.group(1),
+            "numero": str(int(vuelo.group(2))),
+            "fecha": fecha_segmento or fecha_vuelo,
+            "origen": ruta.group(1) if ruta else None,
+            "destino": ruta.group(2) if ruta else None,
+            "hora": f"{int(hora.group(1)):02d}:{hora.group(2)}" if hora else None,
+        })
+    return segmentos
+
+
+def procesado(resumen: dict) -> bool:
+    return resumen.get("id_estado") == "Procesado" or bool(resumen.get("id_asesor"))
+
+
+class IndiceVuelos:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # (cd_tiquete, tipo_vuelo) -> {"fecha", "segmentos", "resumen"}
+        self._tramos = {}
+        # (vuelo, fecha) -> {(cd_tiquete, tipo_vuelo)}
+        self._vuelos = {}
+        # Primer día de vuelo cubierto por la carga; antes de esa fecha el índice está incompleto
+        self.desde = None
+        self.cargado_en = None
+
+    def __len__(self):
+        return len(self._vuelos)
+
+    def agregar(self, clave, itinerario, fecha_vuelo, resumen: dict):
+        """Indexa (o reindexa) un tramo; `resumen` es lo que devuelve el manifiesto"""
+        fecha = fecha_de(fecha_vuelo)
+        segmentos = parsear_itinerario(itinerario, fecha)
+        with self._lock:
+            self.quitar(clave)
+            self._tramos[clave] = {"fecha": fecha, "segmentos": segmentos, "resumen": resumen}
+            for segmento in segmentos:
+                if segmento["fecha"] is not None:
+                    self._vuelos.setdefault((segmento["vuelo"], segmento["fecha"]), set()).add(clave)
+
+    def quitar(self, clave):
+        with self._lock:
+            tramo = self._tramos.pop(clave, None)
+            if tramo is None:
+                return
+            for segmento in tramo["segmentos"]:
+                claves = self._vuelos.get((segmento["vuelo"], segmento["fecha"]))
+                if claves is not None:
+                    claves.discard(clave)
+                    if not claves:
+                        del self._vuelos[(segmento["vuelo"], segmento["fecha"])]
+
+    def actualizar_resumen(self, clave, **cambios) -> bool:
+        with self._lock:
+            tramo = self._tramos.get(clave)
+            if tramo is None:
+                return False
+            tramo["resumen"].update(cambios)
+            return True
+
+    def marcar_cargado(self, desde: date):
+        self.desde = desde
+        self.cargado_en = time.time()
+
+    def cubre(self, fecha: date) -> bool:
+        return self.cargado_en is not None and fecha >= self.desde
+
+    def manifiesto(self, vuelo: str, fecha: date) -> dict:
+        """Pasajeros del vuelo en la fecha (un registro por tiquete) con conteo de pendientes"""
+        with self._lock:
+            claves = self._vuelos.get((vuelo, fecha), ())
+            por_tiquete = {}
+            segmento_vuelo = None
+            for cd_tiquete, tipo in claves:
+                tramo = self._tramos[(cd_tiquete, tipo)]
+                # Si el itinerario completo está en IDA y REG, manda el tramo que vuela ese día
+                anterior = por_tiquete.get(cd_tiquete)
+                if anterior is None or (tramo["fecha"] == fecha and anterior[0]["fecha"] != fecha):
+                    por_tiquete[cd_tiquete] = (tramo, tipo)
+                if segmento_vuelo is None:
+                    segmento_vuelo = next(s for s in tramo["segmentos"] if s["vuelo"] == vuelo and s["fecha"] == fecha)
+            pasajeros = [dict(tramo["resumen"]) for tramo, _ in por_tiquete.values()]
+
+        pasajeros.sort(key=lambda p: (procesado(p), p.get("ds_paxape") or "", p.get("ds_paxname") or ""))
+        procesados = sum(1 for p in pasajeros if procesado(p))
+        return {
+            "vuelo": vuelo,
+            "fecha": fecha.isoformat(),
+            "origen": segmento_vuelo["origen"] if segmento_vuelo else None,
+            "destino": segmento_vuelo["destino"] if segmento_vuelo else None,
+            "hora": segmento_vuelo["hora"] if segmento_vuelo else None,
+            "total": len(pasajeros),
+            "pendientes": len(pasajeros) - procesados,
+            "procesados": procesados,
+            "pasajeros": pasajeros,
+        }
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                "tramos": len(self._tramos),
+                "vuelos": len(self._vuelos),
+                # Itinerarios sin número de vuelo reconocible (registros manuales incompletos)
+                "sin_segmentos": sum(1 for t in self._tramos.values() if not t["segmentos"]),
+                "desde": self.desde.isoformat() if self.desde else None,
+                "cargado_en": self.cargado_en,
+            }